@@ -0,0 +1,43 @@
+# bench_spot_http.py
+# ------------------------------------------------------------
+# 현물 클라이언트 HTTP 지연 비교: bare requests(매 호출 새 TCP+TLS) vs 풀링 세션(keep-alive)
+#   python bench_spot_http.py [N] [SYMBOL]
+# 공개 엔드포인트만 사용(키 불필요). 결과는 호출당 ms 의 p50/p95/max
+# ------------------------------------------------------------
+import sys
+import time
+
+import requests
+
+import bitget_api_spot as api
+
+
+def _run(label: str, call, n: int):
+    xs = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            print(f"{label}: error {e}")
+            continue
+        xs.append((time.perf_counter() - t0) * 1000.0)
+    xs.sort()
+    if not xs:
+        print(f"{label:>8}: no successful calls")
+        return
+    print(f"{label:>8}: n={len(xs)} p50={xs[len(xs) // 2]:.1f}ms "
+          f"p95={xs[min(len(xs) - 1, int(len(xs) * 0.95))]:.1f}ms max={xs[-1]:.1f}ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    sym = (sys.argv[2] if len(sys.argv) > 2 else "BTCUSDT").upper()
+    url = api.BASE_URL + f"/api/v2/spot/market/tickers?symbol={sym}"
+    _run("bare", lambda: requests.get(url, timeout=10), n)
+    api.SESSION.get(url, timeout=10)  # 첫 연결은 측정에서 제외(워밍업이 미리 여는 것과 동일)
+    _run("pooled", lambda: api.SESSION.get(url, timeout=10), n)
+
+
+if __name__ == "__main__":
+    main()
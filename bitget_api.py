@@ -5,21 +5,41 @@ Bitget REST API helper (USDT-M Perpetual)
 공용 인터페이스(트레이더/메인과 호환):
   - convert_symbol(symbol) -> str
   - get_last_price(symbol) -> Optional[float]
-  - get_open_positions() -> List[Dict]
+  - get_open_positions() -> List[Position] (slotted, dict 호환 .get)
+  - fetch_open_positions() -> Optional[List[Position]] (조회 실패 시 None)
+  - get_positions_snapshot(max_age) -> Optional[List[Position]]
+  - wait_position_size(symbol, side, max_size, timeout) -> bool
   - place_market_order(symbol, usdt_amount, side, leverage, reduce_only=False) -> Dict
+  - place_market_order_by_size(symbol, size, side, leverage) -> Dict
+  - get_order_batch_stats() -> Dict
+  - load_candles(symbol, tf) -> int
+  - warmup() -> Dict
+  - warm_account_session(n) -> Dict
+  - get_position_mode(symbol) -> 'one_way' | 'hedge'
   - place_reduce_by_size(symbol, size, side) -> Dict
+  - flash_close_position(symbol, side) -> Dict
   - get_symbol_spec(symbol) -> Dict
+  - account_names() / use_account(name) / bind_account(fn) / AccountLocal(factory)
   - round_down_step(value, step) -> float
 """
 
 from __future__ import annotations
-import os, time, math, json, hmac, hashlib, base64
-from typing import Any, Dict, Optional, Tuple, List
+import os, time, math, json, hmac, hashlib, base64, threading, contextvars
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple, List
 from urllib.parse import urlencode
 import requests
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 
+import candles
+import shm_market
+import orderbook
+import exec_ledger
+import tracing
+from symbols import SymbolResolver
+
 # ────────────────────────────────────────────────────────
 # ENV
 # ────────────────────────────────────────────────────────
@@ -28,6 +48,11 @@ API_KEY   = os.getenv("BITGET_API_KEY", "")
 API_SEC   = os.getenv("BITGET_API_SECRET", "")
 API_PASS  = os.getenv("BITGET_API_PASSWORD", "")
 
+# 멀티 계정: 기본 계정(위 키) + BITGET_ACCOUNTS_JSON='[{"name":"sub1","key":"..","secret":"..","passphrase":".."}]'
+MAIN_ACCOUNT     = os.getenv("BITGET_MAIN_ACCOUNT_NAME", "main")
+ACCOUNTS_JSON    = os.getenv("BITGET_ACCOUNTS_JSON", "")
+ACCOUNT_MAX_RPS  = float(os.getenv("ACCOUNT_MAX_RPS", "10"))   # 계정별 인증 호출 예산(초당). 0이면 무제한
+
 USE_V2               = os.getenv("BITGET_USE_V2", "1") == "1"
 V2_TICKER_PATH       = os.getenv("BITGET_V2_TICKER_PATH", "/api/v2/mix/market/ticker")
 # v2 권장 엔드포인트(지원팀 가이드)
@@ -41,10 +66,14 @@ V2_DEPTH_PATH        = os.getenv("BITGET_V2_DEPTH_PATH", "/api/v2/mix/market/ord
 V2_CANDLES_PATH      = os.getenv("BITGET_V2_CANDLES_PATH", "/api/v2/mix/market/candles")
 V2_INDEX_CANDLES_PATH= os.getenv("BITGET_V2_INDEX_CANDLES_PATH", "/api/v2/mix/market/index-candles")
 CANDLE_GRANULARITY   = int(os.getenv("BITGET_CANDLE_GRANULARITY", "60"))
+CANDLE_TOPUP_LIMIT   = int(os.getenv("BITGET_CANDLE_TOPUP_LIMIT", "100"))  # 링버퍼 공백 보충 시 REST 캔들 개수
 
 V2_PLACE_ORDER_PATH  = os.getenv("BITGET_V2_PLACE_ORDER_PATH", "/api/v2/mix/order/place-order")
 V2_POSITIONS_PATH    = os.getenv("BITGET_V2_POSITIONS_PATH", "/api/v2/mix/position/get-all-position")
 V2_POSITIONS_PATH_FALLBACK = "/api/v2/mix/position/all-position"
+V2_BATCH_ORDER_PATH  = os.getenv("BITGET_V2_BATCH_ORDER_PATH", "/api/v2/mix/order/batch-place-order")
+V2_CLOSE_POSITIONS_PATH = os.getenv("BITGET_V2_CLOSE_POSITIONS_PATH", "/api/v2/mix/order/close-positions")
+V2_ORDER_DETAIL_PATH = os.getenv("BITGET_V2_ORDER_DETAIL_PATH", "/api/v2/mix/order/detail")
 
 def _ensure_v1_path(p: str) -> str:
     try:
@@ -78,21 +107,146 @@ try:
 except Exception:
     SYMBOL_ALIASES = {}
 
+# 포지션 스냅샷 캐시/워치
+POS_SNAPSHOT_TTL     = float(os.getenv("POS_SNAPSHOT_TTL", "1.0"))
+POS_WATCH_POLL_MIN   = float(os.getenv("POS_WATCH_POLL_MIN", "0.15"))  # 아무도 갱신 안 할 때 자체 조회 간격(시작)
+POS_WATCH_POLL_MAX   = float(os.getenv("POS_WATCH_POLL_MAX", "1.0"))   # 자체 조회 간격 상한(지수 증가)
+
+# 진입 주문 배칭: 같은 심볼 주문만 batch-place-order 로 묶인다(거래소 제약). 심볼별 진입 가드(rec.op)가
+# 같은 심볼 동시 진입을 막아 실제로는 거의 묶이지 않으므로 기본 꺼짐 — 켜면 주문마다 스레드 1홉이 추가됨
+ORDER_BATCH_ENABLE    = os.getenv("ORDER_BATCH_ENABLE", "0") == "1"
+ORDER_BATCH_WINDOW_MS = float(os.getenv("ORDER_BATCH_WINDOW_MS", "30"))
+ORDER_BATCH_MAX       = max(1, min(50, int(os.getenv("ORDER_BATCH_MAX", "20"))))  # Bitget 1회 최대 50
+
+# 로컬 호가창(orderbook) 기반 시장가 사이징: 호가를 먹어 들어간 평균가로 수량 산출,
+# 평균가 미끄러짐이 상한(bps)을 넘으면 상한 안에서 채울 수 있는 금액으로 축소(0이면 축소 안 함)
+ORDER_BOOK_SIZING     = os.getenv("ORDER_BOOK_SIZING", "1") == "1"
+ORDER_MAX_IMPACT_BPS  = float(os.getenv("ORDER_MAX_IMPACT_BPS", "0"))
+
+# 기동 워밍업
+WARMUP_CONNECTIONS   = int(os.getenv("WARMUP_CONNECTIONS", "4"))     # 미리 열어둘 keep-alive 연결 수
+WARMUP_PING_PATH     = os.getenv("BITGET_WARMUP_PING_PATH", "/api/v2/public/time")
+
 TRACE = os.getenv("TRACE_LOG", "0") == "1"
 MAINTENANCE_ERRORS = {"45001", "40725", "40808", "40015"}
 
 # ────────────────────────────────────────────────────────
 # HTTP 세션
 # ────────────────────────────────────────────────────────
-SESSION = requests.Session()
 _retry = Retry(total=5, read=5, connect=5, backoff_factor=0.5,
                status_forcelist=[429,500,502,503,504],
                allowed_methods={"GET","POST"}, raise_on_status=False)
-_adapter = HTTPAdapter(max_retries=_retry, pool_connections=50, pool_maxsize=100)
-SESSION.mount("https://", _adapter); SESSION.mount("http://", _adapter)
-SESSION.headers.update({"User-Agent":"auto-trader/1.0","Connection":"keep-alive"})
+
+def _new_session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(max_retries=_retry, pool_connections=50, pool_maxsize=100)
+    s.mount("https://", adapter); s.mount("http://", adapter)
+    s.headers.update({"User-Agent":"auto-trader/1.0","Connection":"keep-alive"})
+    return s
+
+SESSION = _new_session()  # 공용(시세/스펙/캔들) — 인증 호출은 계정별 세션 사용
 DEFAULT_TIMEOUT = 12
 
+# ────────────────────────────────────────────────────────
+# 계정
+#  - 계정마다 세션 풀/레이트 예산/포지션 스냅샷/계정모드 캐시/주문 배처를 따로 둔다.
+#  - 현재 계정은 contextvar 로 선택(use_account). 새 스레드/풀로 넘길 때는 bind_account.
+# ────────────────────────────────────────────────────────
+class _Account:
+    def __init__(self, name: str, key: str, secret: str, passphrase: str):
+        self.name, self.key, self.secret, self.passphrase = name, key, secret, passphrase
+        self.session = _new_session()
+        self._rate_lock = threading.Lock()
+        self._next_slot = 0.0
+        self.pos_cond = threading.Condition()
+        # fetching/fetch_ts: wait_position_size 자체 갱신 single-flight(계정당 동시 조회 1개)
+        self.pos_snap: Dict[str,Any] = {"ts": 0.0, "seq": 0, "rows": [], "index": {},
+                                        "fetching": False, "fetch_ts": 0.0}
+        self.mode_cache: Dict[str,Any] = {"ts": 0, "mode": None}  # 'one_way' or 'hedge'
+        self._batcher = None
+
+    def rate_gate(self):
+        if ACCOUNT_MAX_RPS <= 0: return
+        with self._rate_lock:
+            now = time.time(); slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / ACCOUNT_MAX_RPS
+        if slot > now: time.sleep(slot - now)
+
+    def batcher(self) -> "_OrderBatcher":
+        if self._batcher is None:
+            with self._rate_lock:
+                if self._batcher is None:
+                    self._batcher = _OrderBatcher(self.name)
+        return self._batcher
+
+def _load_accounts() -> Dict[str, _Account]:
+    accts = {MAIN_ACCOUNT: _Account(MAIN_ACCOUNT, API_KEY, API_SEC, API_PASS)}
+    try:
+        extra = json.loads(ACCOUNTS_JSON) if ACCOUNTS_JSON else []
+    except Exception:
+        extra = []
+    for i, a in enumerate(extra or []):
+        if not isinstance(a, dict): continue
+        name = str(a.get("name") or f"acct{i + 1}")
+        accts[name] = _Account(name, a.get("key") or "", a.get("secret") or "",
+                               a.get("passphrase") or a.get("password") or "")
+    return accts
+
+ACCOUNTS: Dict[str, _Account] = _load_accounts()
+_CUR_ACCOUNT: contextvars.ContextVar = contextvars.ContextVar("bitget_account", default=MAIN_ACCOUNT)
+
+def account_names() -> List[str]:
+    return list(ACCOUNTS)
+
+def current_account_name() -> str:
+    return _CUR_ACCOUNT.get()
+
+def current_account() -> _Account:
+    return ACCOUNTS.get(_CUR_ACCOUNT.get()) or ACCOUNTS[MAIN_ACCOUNT]
+
+@contextmanager
+def use_account(name: str):
+    tok = _CUR_ACCOUNT.set(name if name in ACCOUNTS else MAIN_ACCOUNT)
+    try:
+        yield current_account()
+    finally:
+        _CUR_ACCOUNT.reset(tok)
+
+def bind_account(fn: Callable) -> Callable:
+    """현재 계정(+추적 span/체결 원장 신호)을 캡처해 다른 스레드에서도 같은 컨텍스트로 실행되게 감싼다"""
+    name = _CUR_ACCOUNT.get()
+    fn = tracing.bind(exec_ledger.bind(fn))
+    def _run(*args, **kwargs):
+        with use_account(name):
+            return fn(*args, **kwargs)
+    return _run
+
+class AccountLocal(MutableMapping):
+    """현재 계정별로 분리된 상태(dict 처럼 사용). factory(name) 로 계정별 초기값 생성"""
+    def __init__(self, factory: Callable[[str], Any] = lambda name: {}):
+        self._factory = factory
+        self._by: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def for_account(self, name: str):
+        v = self._by.get(name)
+        if v is None:
+            with self._lock:
+                v = self._by.get(name)
+                if v is None:
+                    v = self._by[name] = self._factory(name)
+        return v
+
+    def cur(self):
+        return self.for_account(_CUR_ACCOUNT.get())
+
+    def __getitem__(self, k): return self.cur()[k]
+    def __setitem__(self, k, v): self.cur()[k] = v
+    def __delitem__(self, k): del self.cur()[k]
+    def __iter__(self): return iter(self.cur())
+    def __len__(self): return len(self.cur())
+    def __contains__(self, k): return k in self.cur()
+
 def _log(msg: str):
     if TRACE: print(msg, flush=True)
 
@@ -100,12 +254,13 @@ def _ts_ms() -> str: return str(int(time.time()*1000))
 
 def _sign(ts: str, method: str, path: str, query: str, body: str) -> str:
     prehash = f"{ts}{method}{path}{query}{body}"
-    mac = hmac.new(API_SEC.encode(), prehash.encode(), hashlib.sha256).digest()
+    mac = hmac.new(current_account().secret.encode(), prehash.encode(), hashlib.sha256).digest()
     return base64.b64encode(mac).decode()
 
 def _headers(ts: str, sign: str) -> Dict[str,str]:
-    return {"ACCESS-KEY": API_KEY, "ACCESS-SIGN": sign, "ACCESS-TIMESTAMP": ts,
-            "ACCESS-PASSPHRASE": API_PASS, "Content-Type":"application/json","Locale":"en-US"}
+    a = current_account()
+    return {"ACCESS-KEY": a.key, "ACCESS-SIGN": sign, "ACCESS-TIMESTAMP": ts,
+            "ACCESS-PASSPHRASE": a.passphrase, "Content-Type":"application/json","Locale":"en-US"}
 
 def _is_maintenance(js_or_text) -> bool:
     try:
@@ -128,14 +283,23 @@ def _with_retry_maintenance(callable_fn, *args, **kwargs):
         return res
     return res
 
+def _http_span(method: str, path: str, need_auth: bool):
+    # 활성 추적 안에서만 span 생성(백그라운드 폴링은 no-op)
+    return tracing.span(f"HTTP {method}", kind="client", **{
+        "http.request.method": method, "url.path": path,
+        "bitget.account": current_account_name() if need_auth else None})
+
 def _http_get_raw(path: str, params: Dict[str,Any], need_auth: bool=False, timeout: float=DEFAULT_TIMEOUT):
     url = f"{BASE_URL}{path}"
     if params: url = f"{url}?{urlencode(params)}"
-    if need_auth:
-        ts = _ts_ms(); sign = _sign(ts, "GET", path, f"?{urlencode(params)}", "")
-        headers = _headers(ts, sign); r = SESSION.get(url, headers=headers, timeout=timeout)
-    else:
-        r = SESSION.get(url, timeout=timeout)
+    with _http_span("GET", path, need_auth) as sp:
+        if need_auth:
+            ts = _ts_ms(); sign = _sign(ts, "GET", path, f"?{urlencode(params)}", "")
+            headers = _headers(ts, sign); a = current_account(); a.rate_gate()
+            r = a.session.get(url, headers=headers, timeout=timeout)
+        else:
+            r = SESSION.get(url, timeout=timeout)
+        if sp: sp.set(**{"http.response.status_code": r.status_code})
     return r
 
 def _http_get(path: str, params: Dict[str,Any], need_auth: bool=False, timeout: float=DEFAULT_TIMEOUT) -> Dict[str,Any]:
@@ -149,17 +313,24 @@ def _http_get_soft(path: str, params: Dict[str,Any], need_auth: bool=False, time
 
 def _http_post(path: str, body: Dict[str,Any], need_auth: bool=True, timeout: float=DEFAULT_TIMEOUT) -> Dict[str,Any]:
     url = f"{BASE_URL}{path}"; data = json.dumps(body, separators=(",",":"))
-    headers = {"Content-Type":"application/json"}
-    if need_auth:
-        ts = _ts_ms(); sign = _sign(ts, "POST", path, "", data); headers = _headers(ts, sign)
-    r = SESSION.post(url, data=data, headers=headers, timeout=timeout); r.raise_for_status(); return r.json()
+    headers = {"Content-Type":"application/json"}; sess = SESSION
+    with _http_span("POST", path, need_auth) as sp:
+        if need_auth:
+            ts = _ts_ms(); sign = _sign(ts, "POST", path, "", data); headers = _headers(ts, sign)
+            a = current_account(); a.rate_gate(); sess = a.session
+        r = sess.post(url, data=data, headers=headers, timeout=timeout)
+        if sp: sp.set(**{"http.response.status_code": r.status_code})
+    r.raise_for_status(); return r.json()
 
 def _http_post_soft(path: str, body: Dict[str,Any], need_auth: bool=True, timeout: float=DEFAULT_TIMEOUT):
     url = f"{BASE_URL}{path}"; data = json.dumps(body, separators=(",",":"))
-    headers = {"Content-Type":"application/json"}
-    if need_auth:
-        ts = _ts_ms(); sign = _sign(ts, "POST", path, "", data); headers = _headers(ts, sign)
-    r = SESSION.post(url, data=data, headers=headers, timeout=timeout)
+    headers = {"Content-Type":"application/json"}; sess = SESSION
+    with _http_span("POST", path, need_auth) as sp:
+        if need_auth:
+            ts = _ts_ms(); sign = _sign(ts, "POST", path, "", data); headers = _headers(ts, sign)
+            a = current_account(); a.rate_gate(); sess = a.session
+        r = sess.post(url, data=data, headers=headers, timeout=timeout)
+        if sp: sp.set(**{"http.response.status_code": r.status_code})
     try: js = r.json()
     except Exception: js = {}
     return r.status_code, js, r.text
@@ -167,12 +338,10 @@ def _http_post_soft(path: str, body: Dict[str,Any], need_auth: bool=True, timeou
 # ────────────────────────────────────────────────────────
 # 심볼/스펙/캐시
 # ────────────────────────────────────────────────────────
+_RESOLVER = SymbolResolver(SYMBOL_ALIASES)  # 원문→심볼 메모 + 접미어(UMCBL/.P/PERP) 정규화
+
 def convert_symbol(sym: str) -> str:
-    s = (sym or "").upper().strip()
-    s = SYMBOL_ALIASES.get(s, s)
-    for suf in ("_UMCBL","-UMCBL","UMCBL","_CMCBL","-CMCBL","CMCBL"):
-        if s.endswith(suf): s = s.replace(suf,"")
-    return s
+    return _RESOLVER.resolve(sym)
 
 def _v2_product_types() -> List[str]:
     out, seen = [], set()
@@ -184,6 +353,8 @@ _spec_cache: Dict[str,Dict[str,Any]] = {}
 def get_symbol_spec(symbol: str) -> Dict[str,Any]:
     sym = convert_symbol(symbol); sp = _spec_cache.get(sym)
     if sp: return sp
+    sp = shm_market.get_spec(shm_market.FUTURES, sym)  # 공유 테이블(피더가 계약 정보로 채움)
+    if sp: _spec_cache[sym] = sp; return sp
     sp = {"sizeStep":0.001, "priceStep":0.01}  # 필요 시 제품정보 API로 교체 가능
     _spec_cache[sym] = sp; return sp
 
@@ -208,6 +379,7 @@ def refresh_contracts_cache(ttl_sec: int = 600):
             _log(f"contracts fetch fail {pt}: {e}")
     if newmap:
         _contract_cache.clear(); _contract_cache.update(newmap); _contract_cache_ts = now
+        _RESOLVER.rebuild(x for bag in newmap.values() for x in bag)
 
 def is_symbol_listed(symbol: str) -> bool:
     refresh_contracts_cache()
@@ -228,7 +400,11 @@ def _cache_get(sym: str) -> Optional[float]:
     return px if (time.time() - ts) <= TICKER_TTL else None
 
 def _cache_set(sym: str, px: float):
-    _ticker_cache[sym] = (time.time(), float(px))
+    now = time.time()
+    _ticker_cache[sym] = (now, float(px))
+    candles.on_price(sym, float(px), now)
+
+candles.track(CANDLE_GRANULARITY)
 
 def _parse_px(js: Dict[str,Any]) -> Optional[float]:
     d = js.get("data") if isinstance(js, dict) else None
@@ -331,25 +507,67 @@ def _get_depth_mid_v2(sym: str, product: str) -> Optional[float]:
         if bid and ask: return (ask + bid) / 2.0
     return None
 
-def _get_candle_close_v2(sym: str, product: str) -> Optional[float]:
-    sc, js, _ = _http_get_soft(V2_CANDLES_PATH, {"symbol": sym, "granularity": CANDLE_GRANULARITY, "limit": 2}, False)
+def _fetch_book_v2(sym: str) -> Optional[Tuple[list, list]]:
+    """로컬 호가창 REST 스냅샷 (웹소켓을 못 쓸 때 orderbook 폴링 피더가 사용)"""
+    sc, js, _ = _http_get_soft(V2_DEPTH_PATH, {"productType": V2_PRODUCT_TYPE, "symbol": sym, "limit": 50}, False)
     if sc == 200 and isinstance(js, dict):
-        data = js.get("data") or []
-        if data:
-            row = data[-2] if len(data)>=2 else data[-1]
-            close = (row[4] if isinstance(row,(list,tuple)) and len(row)>=5 else (row.get("close") if isinstance(row,dict) else None))
-            if close not in (None,"","null"): return float(close)
+        d = js.get("data") or {}
+        if isinstance(d, dict) and d.get("bids") and d.get("asks"):
+            return d["bids"], d["asks"]
     return None
 
-def _get_index_candle_close_v2(sym: str, product: str) -> Optional[float]:
-    sc, js, _ = _http_get_soft(V2_INDEX_CANDLES_PATH, {"symbol": sym, "granularity": CANDLE_GRANULARITY, "limit": 2}, False)
+orderbook.set_snapshot_fetcher(_fetch_book_v2)
+
+# 캔들 폴백: 로컬 링버퍼(candles)의 마지막 확정 봉을 우선 사용, 공백/지연 시에만 REST 보충
+def _candle_close_buffered(key: str, fetch) -> Optional[float]:
+    tf = CANDLE_GRANULARITY
+    if candles.needs_topup(key, tf):
+        try:
+            rows = fetch()
+            if rows: candles.top_up(key, tf, rows)
+        except Exception as e:
+            _log(f"candle topup fail {key}: {e}")
+    bar = candles.last_closed_bar(key, tf)
+    return bar[4] if bar and bar[4] > 0 else None
+
+# v2 캔들 granularity 는 문자열("1m","1H" 등)
+_V2_GRAN = {60: "1m", 180: "3m", 300: "5m", 900: "15m", 1800: "30m",
+            3600: "1H", 14400: "4H", 21600: "6H", 43200: "12H", 86400: "1D"}
+
+def _fetch_candles_v2(path: str, sym: str, tf: int = None, product: str = None) -> List[candles.Bar]:
+    tf = int(tf or CANDLE_GRANULARITY)
+    q = {"symbol": sym, "productType": product or V2_PRODUCT_TYPE,
+         "granularity": _V2_GRAN.get(tf, f"{max(1, tf // 60)}m"), "limit": CANDLE_TOPUP_LIMIT}
+    sc, js, _ = _http_get_soft(path, q, False)
     if sc == 200 and isinstance(js, dict):
-        data = js.get("data") or []
-        if data:
-            row = data[-2] if len(data)>=2 else data[-1]
-            close = (row[4] if isinstance(row,(list,tuple)) and len(row)>=5 else (row.get("close") if isinstance(row,dict) else None))
-            if close not in (None,"","null"): return float(close)
-    return None
+        return candles.parse_rest_rows(js.get("data"))
+    return []
+
+def load_candles(symbol: str, tf: int) -> int:
+    """링버퍼(symbol, tf)가 비었거나 공백이 있으면 REST 캔들로 보충. 보충된 봉 수 반환"""
+    sym = convert_symbol(symbol)
+    candles.track(tf)
+    if not candles.needs_topup(sym, tf):
+        return 0
+    try:
+        if USE_V2:
+            rows = _fetch_candles_v2(V2_CANDLES_PATH, sym, tf)
+        else:
+            sc, js, _ = _http_get_soft(V1_CANDLES_PATH, {"symbol": f"{sym}_UMCBL", "granularity": str(int(tf)),
+                                                         "limit": str(CANDLE_TOPUP_LIMIT)}, False)
+            rows = candles.parse_rest_rows(js.get("data")) if sc == 200 and isinstance(js, dict) else []
+    except Exception as e:
+        _log(f"candle load fail {sym} {tf}: {e}")
+        return 0
+    candles.top_up(sym, tf, rows)
+    return len(rows)
+
+def _get_candle_close_v2(sym: str, product: str) -> Optional[float]:
+    return _candle_close_buffered(sym, lambda: _fetch_candles_v2(V2_CANDLES_PATH, sym, product=product))
+
+def _get_index_candle_close_v2(sym: str, product: str) -> Optional[float]:
+    # 인덱스 캔들은 체결가 봉과 섞지 않도록 별도 키로 보관
+    return _candle_close_buffered(f"{sym}#index", lambda: _fetch_candles_v2(V2_INDEX_CANDLES_PATH, sym, product=product))
 
 def _get_ticker_v1(sym: str) -> Optional[float]:
     sc, js, _ = _http_get_soft(V1_TICKER_PATH, {"symbol": f"{sym}_UMCBL"}, False)
@@ -373,19 +591,18 @@ def _get_depth_mid_v1(sym: str) -> Optional[float]:
     return None
 
 def _get_candle_close_v1(sym: str, granularity: int) -> Optional[float]:
-    sc, js, _ = _http_get_soft(V1_CANDLES_PATH, {"symbol": f"{sym}_UMCBL","granularity": str(granularity),"limit":"2"}, False)
-    if sc == 200 and isinstance(js, dict):
-        data = js.get("data") or []
-        if data:
-            row = data[-2] if len(data)>=2 else data[-1]
-            close = row[4] if isinstance(row,(list,tuple)) and len(row)>=5 else (row.get("close") if isinstance(row,dict) else None)
-            if close not in (None,"","null"): return float(close)
-    return None
+    def _fetch():
+        sc, js, _ = _http_get_soft(V1_CANDLES_PATH, {"symbol": f"{sym}_UMCBL","granularity": str(granularity),"limit": str(CANDLE_TOPUP_LIMIT)}, False)
+        return candles.parse_rest_rows(js.get("data")) if sc == 200 and isinstance(js, dict) else []
+    return _candle_close_buffered(sym, _fetch)
 
+@tracing.traced("price.last")
 def get_last_price(symbol: str) -> Optional[float]:
     symbol = convert_symbol(symbol)
     cached = _cache_get(symbol)
     if cached: return cached
+    px = shm_market.get_price(shm_market.FUTURES, symbol, TICKER_TTL)
+    if px: _cache_set(symbol, px); return px
 
     if USE_V2:
         s = symbol
@@ -395,7 +612,7 @@ def get_last_price(symbol: str) -> Optional[float]:
             px = _get_mark_v2(s, product)
             if px: _cache_set(symbol, px); return px
             if ALLOW_DEPTH_FALLBACK:
-                px = _get_depth_mid_v2(s, product)
+                px = orderbook.mid(s, TICKER_TTL) or _get_depth_mid_v2(s, product)
                 if px: _cache_set(symbol, px); return px
             px = _get_candle_close_v2(s, product)
             if px: _cache_set(symbol, px); return px
@@ -408,7 +625,7 @@ def get_last_price(symbol: str) -> Optional[float]:
             px = _get_mark_v1(symbol)
             if px: _cache_set(symbol, px); return px
             if ALLOW_DEPTH_FALLBACK:
-                px = _get_depth_mid_v1(symbol)
+                px = orderbook.mid(symbol, TICKER_TTL) or _get_depth_mid_v1(symbol)
                 if px: _cache_set(symbol, px); return px
             px = _get_candle_close_v1(symbol, CANDLE_GRANULARITY)
             if px: _cache_set(symbol, px); return px
@@ -421,11 +638,10 @@ def get_last_price(symbol: str) -> Optional[float]:
 # ────────────────────────────────────────────────────────
 # 포지션 모드(one_way/hedge) 조회
 # ────────────────────────────────────────────────────────
-_account_mode_cache = {"ts": 0, "mode": None}  # 'one_way' or 'hedge'
-
 def _get_account_mode(product_type: str) -> str:
-    """v2 단일계정 조회로 positionMode(one_way/hedge) 확인"""
+    """v2 단일계정 조회로 positionMode(one_way/hedge) 확인 (현재 계정 기준 캐시)"""
     now = time.time()
+    _account_mode_cache = current_account().mode_cache
     if _account_mode_cache["mode"] and (now - _account_mode_cache["ts"] < 60):
         return _account_mode_cache["mode"]
 
@@ -441,6 +657,9 @@ def _get_account_mode(product_type: str) -> str:
     except Exception:
         return (os.getenv("BITGET_FORCE_POSITION_MODE", "") or "one_way").lower()
 
+def get_position_mode(symbol: str) -> str:
+    return _get_account_mode(_guess_product_type(convert_symbol(symbol)))
+
 # ────────────────────────────────────────────────────────
 # 주문/감축
 # ────────────────────────────────────────────────────────
@@ -480,8 +699,26 @@ def _guess_product_type(symbol: str) -> str:
     if s.endswith("USD"):  return "COIN-FUTURES"
     return V2_PRODUCT_TYPE or "USDT-FUTURES"
 
-def _order_size_from_usdt(symbol: str, usdt_amount: float) -> float:
-    last = get_last_price(symbol)
+def _book_sized_amount(symbol: str, usdt_amount: float, side: str) -> Tuple[float, Optional[float]]:
+    """로컬 호가창이 신선하면 (금액, 체결 평균가) — 미끄러짐 상한 초과분은 금액을 줄인다. 없으면 (금액, None)"""
+    imp = orderbook.impact(symbol, side, usdt_amount)
+    if not imp or imp["filled"] < usdt_amount * 0.999:
+        return usdt_amount, None   # 호가 미동기/깊이 부족 → 기존 방식
+    if ORDER_MAX_IMPACT_BPS > 0 and imp["slip_bps"] > ORDER_MAX_IMPACT_BPS:
+        bid_usdt, ask_usdt = orderbook.depth_within(symbol, ORDER_MAX_IMPACT_BPS / 100.0) or (0.0, 0.0)
+        capped = ask_usdt if str(side).lower() in ("buy", "long", "open_long") else bid_usdt
+        if 0 < capped < usdt_amount:
+            _log(f"book cap {symbol} {side} {usdt_amount:.2f}→{capped:.2f} USDT (slip {imp['slip_bps']:.1f}bps)")
+            usdt_amount = capped
+            imp = orderbook.impact(symbol, side, usdt_amount) or imp
+    return usdt_amount, imp["vwap"]
+
+def _order_size_from_usdt(symbol: str, usdt_amount: float, last: Optional[float] = None,
+                          side: Optional[str] = None) -> float:
+    if side and ORDER_BOOK_SIZING:
+        usdt_amount, vwap = _book_sized_amount(symbol, float(usdt_amount), side)
+        if vwap: last = vwap
+    last = last if (last and last > 0) else get_last_price(symbol)
     if not last or last<=0: return 0.0
     step = float(get_symbol_spec(symbol).get("sizeStep",0.001))
     size = float(usdt_amount) / float(last)
@@ -491,14 +728,172 @@ def _hold_side_for(side_bs: str) -> str:
     s = (side_bs or "buy").lower()
     return "long" if s == "buy" else "short"
 
+# ---- 진입 주문 배처 ----
+# Bitget mix batch-place-order 는 요청당 1개 심볼만 받는다 → 심볼 간 배칭(처리량 이득)은 불가.
+# → 윈도우 내 주문을 (symbol, productType, marginMode, marginCoin) 으로 묶어 같은 심볼은 배치 1회,
+#   서로 다른 심볼 그룹은 각자 단건으로 동시에 전송한다(직접 전송 대비 이득 없음, ORDER_BATCH_ENABLE 기본 꺼짐). 개별 결과는 clientOid 로 호출자에게 돌려주고,
+#   실패한 주문은 호출자가 기존 캐스케이드(holdSide 제거/레거시/v1)로 이어간다.
+# - 같은 그룹 주문이 대기열에 없으면 윈도우를 기다리지 않고 바로 보낸다(단건 주문에 지연 추가 없음)
+# - 결과를 못 받은 주문(타임아웃/전송 중 예외)은 접수 여부를 모름 → ORDER_UNKNOWN_CODES 로 돌려주고
+#   캐스케이드로 재전송하지 않는다(중복 체결 방지). 판정은 리컨실러가 포지션 스냅샷으로
+_BATCH_TOP_KEYS = ("symbol", "productType", "marginMode", "marginCoin")
+_BATCH_STATS = {"windows": 0, "orders": 0, "batch_calls": 0, "batched_orders": 0, "single_calls": 0,
+                "failed": 0, "unknown": 0}
+_BATCH_STATS_LOCK = threading.Lock()
+ORDER_UNKNOWN_CODES = ("LOCAL_BATCH_TIMEOUT", "LOCAL_BATCH_ERROR")
+
+def _batch_stat(**inc: int):
+    with _BATCH_STATS_LOCK:
+        for k, v in inc.items():
+            _BATCH_STATS[k] += v
+
+class _OrderBatcher:
+    def __init__(self, account: str = MAIN_ACCOUNT):
+        self.account = account
+        self._cv = threading.Condition()
+        self._items: List[Dict[str,Any]] = []
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._pool = None
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive(): return
+        from concurrent.futures import ThreadPoolExecutor
+        self._pool = self._pool or ThreadPoolExecutor(max_workers=8, thread_name_prefix=f"order-batch-{self.account}")
+        self._thread = threading.Thread(target=self._loop, name=f"order-batcher-{self.account}", daemon=True)
+        self._thread.start()
+
+    def submit(self, body: Dict[str,Any], timeout: float = DEFAULT_TIMEOUT + 5) -> Tuple[int, Dict[str,Any]]:
+        with self._cv:
+            self._ensure_thread()
+            self._seq += 1
+            body = dict(body)
+            body.setdefault("clientOid", f"bt{_ts_ms()}{self._seq:05d}")
+            item = {"body": body, "ev": threading.Event(), "res": (0, {})}
+            self._items.append(item)
+            self._cv.notify_all()
+        if not item["ev"].wait(timeout):
+            _batch_stat(unknown=1)
+            return 0, {"code": "LOCAL_BATCH_TIMEOUT", "msg": "batch result timeout",
+                       "data": {"clientOid": body["clientOid"]}}
+        return item["res"]
+
+    def _has_peer(self) -> bool:
+        """대기열에 같은 그룹(심볼 등) 주문이 2개 이상인지 — 없으면 묶을 게 없으니 기다리지 않는다"""
+        seen = set()
+        for it in self._items:
+            k = tuple(it["body"].get(x) for x in _BATCH_TOP_KEYS)
+            if k in seen: return True
+            seen.add(k)
+        return False
+
+    def _loop(self):
+        _CUR_ACCOUNT.set(self.account)  # 이 스레드의 인증 호출은 배처 계정으로
+        while True:
+            with self._cv:
+                while not self._items:
+                    self._cv.wait()
+                if self._has_peer():
+                    deadline = time.time() + ORDER_BATCH_WINDOW_MS / 1000.0
+                    while len(self._items) < ORDER_BATCH_MAX:
+                        left = deadline - time.time()
+                        if left <= 0: break
+                        self._cv.wait(left)
+                batch, self._items = self._items[:ORDER_BATCH_MAX], self._items[ORDER_BATCH_MAX:]
+            groups: Dict[Tuple, List[Dict[str,Any]]] = {}
+            for it in batch:
+                groups.setdefault(tuple(it["body"].get(k) for k in _BATCH_TOP_KEYS), []).append(it)
+            _batch_stat(windows=1, orders=len(batch))
+            for g in groups.values():
+                self._pool.submit(bind_account(self._send_group), g)
+
+    def _send_group(self, items: List[Dict[str,Any]]):
+        try:
+            if len(items) == 1:
+                it = items[0]
+                sc, js, _ = _http_post_soft(V2_PLACE_ORDER_PATH, it["body"], True)
+                _batch_stat(single_calls=1)
+                it["res"] = (sc, js)
+                return
+            head = items[0]["body"]
+            body = {k: head.get(k) for k in _BATCH_TOP_KEYS}
+            body["orderList"] = [{k: v for k, v in it["body"].items() if k not in _BATCH_TOP_KEYS} for it in items]
+            sc, js, _ = _http_post_soft(V2_BATCH_ORDER_PATH, body, True)
+            _batch_stat(batch_calls=1, batched_orders=len(items))
+            data = js.get("data") if isinstance(js, dict) else None
+            if not _is_ok(sc, js) or not isinstance(data, dict):
+                _maybe_trace("batch order fail", str(head.get("symbol")), sc, js, body)
+                for it in items: it["res"] = (sc, js if isinstance(js, dict) else {})
+                return
+            ok  = {str(r.get("clientOid")): r for r in (data.get("successList") or [])}
+            bad = {str(r.get("clientOid")): r for r in (data.get("failureList") or [])}
+            for it in items:
+                oid = str(it["body"].get("clientOid"))
+                if oid in ok:
+                    it["res"] = (sc, {"code": "00000", "msg": "success", "data": ok[oid]})
+                else:
+                    r = bad.get(oid) or {}
+                    it["res"] = (sc, {"code": str(r.get("errorCode") or "LOCAL_BATCH_MISSING"),
+                                      "msg": r.get("errorMsg") or "not in batch result", "data": None})
+        except Exception as e:
+            for it in items:
+                if not it["res"][0]: it["res"] = (0, {"code": "LOCAL_BATCH_ERROR", "msg": str(e)})
+        finally:
+            _batch_stat(failed=sum(1 for it in items if not _is_ok(*it["res"])))
+            for it in items:
+                it["ev"].set()
+
+@tracing.traced("order.submit")
+def _post_open_v2(body: Dict[str,Any]) -> Tuple[int, Dict[str,Any]]:
+    if ORDER_BATCH_ENABLE:
+        return current_account().batcher().submit(body)
+    sc, js, _ = _http_post_soft(V2_PLACE_ORDER_PATH, body, True)
+    return sc, js
+
+def get_order_batch_stats() -> Dict[str,Any]:
+    with _BATCH_STATS_LOCK:
+        stats = dict(_BATCH_STATS)
+    return {"enabled": ORDER_BATCH_ENABLE, "window_ms": ORDER_BATCH_WINDOW_MS,
+            "max": ORDER_BATCH_MAX, **stats}
+
 # ---- 주문(엔트리/청산) ----
-def place_market_order(symbol: str, usdt_amount: float, side: str, leverage: float, reduce_only: bool=False) -> Dict[str,Any]:
+@tracing.traced("order.market")
+def place_market_order(symbol: str, usdt_amount: float, side: str, leverage: float, reduce_only: bool=False,
+                       price: Optional[float] = None, spec: Optional[Dict[str,Any]] = None) -> Dict[str,Any]:
+    """price/spec 를 넘기면(프리트레이드 컨텍스트) 사이징 시 재조회하지 않는다"""
     sym  = convert_symbol(symbol)
-    size = _order_size_from_usdt(sym, float(usdt_amount))
+    size = _order_size_from_usdt(sym, float(usdt_amount), price, side)
     if size <= 0: raise RuntimeError(f"size_calc_fail {sym} amt={usdt_amount}")
+    return place_market_order_by_size(sym, size, side, leverage, spec=spec, ref_price=price)
+
+def _ref_price(sym: str) -> Optional[float]:
+    """체결 원장 참조가격(조회 없이): 로컬 호가 중간가 → 티커 캐시"""
+    return orderbook.mid(sym, TICKER_TTL) or _cache_get(sym)
+
+def _ledger(kind: str, sym: str, side_bs: str, size: float, fn, ref: Optional[float] = None) -> Dict[str,Any]:
+    """주문 왕복(fn) 전송/응답 시각을 체결 원장에 기록"""
+    t_send = time.time()
+    resp = fn()
+    exec_ledger.record_order(current_account_name(), sym, side_bs, kind, size, resp,
+                             t_send, time.time(), ref or _ref_price(sym))
+    return resp
+
+@tracing.traced("order.market_by_size")
+def place_market_order_by_size(symbol: str, size: float, side: str, leverage: float,
+                               spec: Optional[Dict[str,Any]] = None, ref_price: Optional[float] = None) -> Dict[str,Any]:
+    """계약 수량 기준 시장가 주문(원웨이에서는 보유 반대 포지션과 네팅됨)"""
+    sym     = convert_symbol(symbol)
+    side_bs = "buy" if str(side).lower() in ("buy","long","open_long") else "sell"
+    return _ledger("open", sym, side_bs, float(size),
+                   lambda: _open_by_size(sym, size, side, leverage, spec), ref_price)
+
+def _open_by_size(sym: str, size: float, side: str, leverage: float,
+                  spec: Optional[Dict[str,Any]] = None) -> Dict[str,Any]:
+    step = float((spec or get_symbol_spec(sym)).get("sizeStep", 0.001))
+    size = round_down_step(float(size), step)
+    if size <= 0: raise RuntimeError(f"size_calc_fail {sym} size={size}")
 
     pt = _guess_product_type(sym)
-    mode = _get_account_mode(pt)  # 'one_way' or 'hedge'
 
     # v2 표준 바디(진입). 진입은 모드와 무관하게 reduceOnly 미포함
     side_bs = "buy" if str(side).lower() in ("buy","long","open_long") else "sell"
@@ -516,9 +911,11 @@ def place_market_order(symbol: str, usdt_amount: float, side: str, leverage: flo
     if SEND_HOLDSIDE_ALWAYS:
         body_v2_new["holdSide"] = _hold_side_for(side_bs)
 
-    sc1, js1, _ = _http_post_soft(V2_PLACE_ORDER_PATH, body_v2_new, True)
+    sc1, js1 = _post_open_v2(body_v2_new)
     if _is_ok(sc1, js1): return js1
     _maybe_trace("place_order v2#1 fail", sym, sc1, js1, body_v2_new)
+    if str((js1 or {}).get("code")) in ORDER_UNKNOWN_CODES:
+        return js1   # 접수 여부 미상 → 재전송 금지(호출부 pending 을 리컨실러가 포지션으로 판정)
 
     # holdSide 제거 재시도(일부 계정 side mismatch 회피)
     if _is_side_mismatch(js1) and "holdSide" in body_v2_new:
@@ -571,12 +968,17 @@ def place_market_order(symbol: str, usdt_amount: float, side: str, leverage: flo
         "v1":   {"sc": sc4, "js": js4 or {"text":txt4}, "body": body_v1},
     }}
 
+@tracing.traced("order.reduce")
 def place_reduce_by_size(symbol: str, size: float, side: str) -> Dict[str,Any]:
     """
     size: 줄일(청산할) 계약 수량
     side: 보유 포지션의 방향 ('long' 또는 'short')
     """
     sym = convert_symbol(symbol)
+    close_bs = ("sell" if (side or "").lower() == "long" else "buy")
+    return _ledger("reduce", sym, close_bs, float(size), lambda: _reduce_by_size(sym, size, side))
+
+def _reduce_by_size(sym: str, size: float, side: str) -> Dict[str,Any]:
     pt  = _guess_product_type(sym)
     mode = _get_account_mode(pt)  # 'one_way' or 'hedge'
 
@@ -659,36 +1061,116 @@ def place_reduce_by_size(symbol: str, size: float, side: str) -> Dict[str,Any]:
         "v1":   {"sc": sc4, "js": js4 or {"text":txt4}, "body": body_v1},
     }}
 
+@tracing.traced("order.flash_close")
+def flash_close_position(symbol: str, side: str) -> Dict[str,Any]:
+    """
+    Flash close(시장가 전량 청산, v2 close-positions). 헤지면 holdSide 지정, 원웨이는 생략.
+    실패 시 {"code": ...} 그대로 반환 → 호출자가 place_reduce_by_size 로 폴백.
+    """
+    sym = convert_symbol(symbol)
+    pt  = _guess_product_type(sym)
+    body = {"symbol": sym, "productType": pt}
+    if _get_account_mode(pt) == "hedge":
+        body["holdSide"] = (side or "").lower()
+    sc, js, txt = _http_post_soft(V2_CLOSE_POSITIONS_PATH, body, True)
+    if _is_ok(sc, js):
+        data = js.get("data") or {}
+        fails = data.get("failureList") if isinstance(data, dict) else None
+        if not fails:
+            return js
+        return {"code": str(fails[0].get("errorCode") or sc), "msg": fails[0].get("errorMsg"), "data": data}
+    _maybe_trace("flash close fail", sym, sc, js or {"text": txt}, body)
+    return {"code": str((js or {}).get("code") or sc), "msg": (js or {}).get("msg") or txt, "data": None}
+
+def _fetch_fill_v2(account: str, sym: str, order_id: str) -> Optional[Tuple[float, float, float]]:
+    """체결 원장용 주문 상세: (평균 체결가, 체결 수량, 거래소 갱신 시각) — 전량 체결 전이면 None"""
+    with use_account(account):
+        sc, js, _ = _http_get_soft(V2_ORDER_DETAIL_PATH, {"symbol": sym, "productType": _guess_product_type(sym),
+                                                          "orderId": order_id}, True, 5)
+    d = js.get("data") if isinstance(js, dict) else None
+    if sc != 200 or not isinstance(d, dict) or str(d.get("state") or "").lower() != "filled":
+        return None
+    px = _fnum(d.get("priceAvg"))
+    if px <= 0:
+        return None
+    return px, _fnum(d.get("baseVolume")), _fnum(d.get("uTime") or d.get("cTime")) / 1000.0
+
+exec_ledger.set_fill_fetcher(_fetch_fill_v2)
+
 # ────────────────────────────────────────────────────────
 # 포지션 조회
 # ────────────────────────────────────────────────────────
-def _parse_positions_v2(js: Dict[str,Any]) -> List[Dict[str,Any]]:
+def _fnum(x) -> float:
+    try: return float(x) if x not in (None, "") else 0.0
+    except (TypeError, ValueError): return 0.0
+
+class Position:
+    """
+    포지션 1건 — 파서가 1회 생성(숫자는 float 변환 완료). 리스크 루프가 필요한 필드를 모두 담는다.
+    h: 구조 변경 해시(수량/평단/레버리지/증거금) — 가격 변동만으로는 바뀌지 않음
+    기존 호출부 호환을 위해 dict 처럼 p.get("size") / p["symbol"] / dict(p) 도 지원
+    """
+    __slots__ = ("symbol", "side", "size", "entry_price", "mark_price", "margin", "upnl",
+                 "leverage", "liq_price", "margin_mode", "h")
+    _FIELDS = __slots__[:-1]
+
+    def __init__(self, symbol: str, side: str, size: float, entry_price: float, mark_price: float = 0.0,
+                 margin: float = 0.0, upnl: float = 0.0, leverage: float = 0.0, liq_price: float = 0.0,
+                 margin_mode: str = ""):
+        self.symbol, self.side, self.size, self.entry_price = symbol, side, size, entry_price
+        self.mark_price, self.margin, self.upnl, self.leverage = mark_price, margin, upnl, leverage
+        self.liq_price, self.margin_mode = liq_price, margin_mode
+        self.h = hash((symbol, side, size, entry_price, leverage, margin))
+
+    def roe_pct(self) -> Optional[float]:
+        """거래소 증거금/미실현손익 기준 ROE(%). 증거금 미상이면 None"""
+        return (self.upnl / self.margin) * 100.0 if self.margin > 0 else None
+
+    def get(self, k: str, default=None):
+        return getattr(self, k, default) if k in self._FIELDS else default
+
+    def __getitem__(self, k: str):
+        if k not in self._FIELDS: raise KeyError(k)
+        return getattr(self, k)
+
+    def keys(self): return self._FIELDS
+    def to_dict(self) -> Dict[str,Any]: return {k: getattr(self, k) for k in self._FIELDS}
+    def __repr__(self): return f"Position({self.symbol} {self.side} size={self.size} entry={self.entry_price})"
+
+def _position_of(sym: str, row: Dict[str,Any], mark_key: str) -> Optional[Position]:
+    side = (row.get("holdSide") or "").lower()
+    size = _fnum(row.get("total"))
+    if size <= 0 or side not in ("long","short"):
+        return None
+    return Position(sym, side, size,
+                    _fnum(row.get("openPriceAvg") or row.get("averageOpenPrice")),
+                    mark_price=_fnum(row.get(mark_key)),
+                    margin=_fnum(row.get("marginSize") or row.get("margin")),
+                    upnl=_fnum(row.get("unrealizedPL")),
+                    leverage=_fnum(row.get("leverage")),
+                    liq_price=_fnum(row.get("liquidationPrice")),
+                    margin_mode=str(row.get("marginMode") or ""))
+
+def _parse_positions_v2(js: Dict[str,Any]) -> List[Position]:
     data = js.get("data") or []
-    out: List[Dict[str,Any]] = []
+    out: List[Position] = []
     for row in data:
         try:
-            sym  = convert_symbol(row.get("symbol",""))
-            side = (row.get("holdSide") or "").lower()
-            size = float(row.get("total",0) or 0)
-            entry= float(row.get("averageOpenPrice",0) or 0)
-            if size>0 and side in ("long","short"):
-                out.append({"symbol":sym,"side":side,"size":size,"entry_price":entry})
+            p = _position_of(convert_symbol(row.get("symbol","")), row, "markPrice")
+            if p: out.append(p)
         except Exception:
             pass
     return out
 
-def _parse_positions_v1(js: Dict[str,Any]) -> List[Dict[str,Any]]:
+def _parse_positions_v1(js: Dict[str,Any]) -> List[Position]:
     data = js.get("data") or []
-    out: List[Dict[str,Any]] = []
+    out: List[Position] = []
     for row in data:
         try:
             sym = convert_symbol(row.get("symbol",""))
             for pos in row.get("positions") or []:
-                side = (pos.get("holdSide") or "").lower()
-                size = float(pos.get("total",0) or 0)
-                entry= float(pos.get("averageOpenPrice",0) or 0)
-                if size>0 and side in ("long","short"):
-                    out.append({"symbol":sym,"side":side,"size":size,"entry_price":entry})
+                p = _position_of(sym, pos, "marketPrice")
+                if p: out.append(p)
         except Exception:
             pass
     return out
@@ -704,20 +1186,170 @@ def _get_positions_v2(params) -> Optional[Dict[str,Any]]:
         _log(f"positions v2 {res.status_code} url: {BASE_URL}{V2_POSITIONS_PATH}?{urlencode(params)} body: {res.text}")
     return None
 
-def get_open_positions() -> List[Dict[str,Any]]:
+@tracing.traced("positions.fetch")
+def fetch_open_positions() -> Optional[List[Position]]:
+    """조회 실패(전 경로 실패)는 None — 빈 목록([])은 '정상 응답 + 보유 없음'일 때만"""
     if USE_V2:
         for product in [V2_PRODUCT_TYPE] + [y.strip() for y in (V2_PRODUCT_TYPE_ALTS or "").split(",") if y.strip()]:
             for params in ({"productType":product}, {"productType":product, "marginCoin":MARGIN_COIN}):
                 try:
                     js = _get_positions_v2(params)
-                    if js: return _parse_positions_v2(js)
+                    if js:
+                        rows = _parse_positions_v2(js)
+                        publish_positions(rows); return rows
                 except Exception as e:
                     _log(f"positions v2 error: {e} url: {BASE_URL}{V2_POSITIONS_PATH}?{urlencode(params)}")
     # v1 폴백
     for params in ({"productType":"umcbl"}, {"productType":"umcbl","marginCoin":MARGIN_COIN}):
         try:
             res = _with_retry_maintenance(_http_get_raw, V1_POSITIONS_PATH, params, True)
-            if res.status_code == 200: return _parse_positions_v1(res.json())
+            if res.status_code == 200:
+                rows = _parse_positions_v1(res.json())
+                publish_positions(rows); return rows
         except Exception:
             pass
-    return []
+    return None
+
+def get_open_positions() -> List[Position]:
+    """조회 실패도 [] 로 돌려주는 호환 버전 — 빈 목록으로 로컬 상태를 지우는 경로에는 fetch_open_positions() 사용"""
+    rows = fetch_open_positions()
+    return rows if rows is not None else []
+
+# ────────────────────────────────────────────────────────
+# 포지션 스냅샷/워치
+#  - 포지션을 새로 받아온 컴포넌트(스냅샷 캐시, 워치독, 리컨실러, 스트림)가
+#    publish_positions() 로 게시하면 대기 중인 wait_position_size() 가 즉시 깨어난다.
+#  - 조회 실패([])는 게시하지 않는다(빈 목록을 '전부 청산'으로 오판 방지).
+#  - 스냅샷/조건변수는 계정별(_Account.pos_snap/pos_cond)
+# ────────────────────────────────────────────────────────
+def publish_positions(rows: List[Position], ts: Optional[float] = None):
+    index: Dict[Tuple[str,str], float] = {}
+    for p in rows or []:
+        k = (p.symbol, p.side)
+        index[k] = index.get(k, 0.0) + p.size
+    a = current_account(); cond, snap = a.pos_cond, a.pos_snap
+    with cond:
+        snap.update({"ts": ts or time.time(), "seq": snap["seq"] + 1,
+                          "rows": list(rows or []), "index": index})
+        cond.notify_all()
+
+def get_positions_snapshot(max_age: Optional[float] = None) -> Optional[List[Position]]:
+    """max_age 초 이내 스냅샷이 있으면 재사용, 없으면 새로 조회(조회 결과는 자동 게시). 조회 실패 시 None"""
+    ttl = POS_SNAPSHOT_TTL if max_age is None else float(max_age)
+    a = current_account(); cond, snap = a.pos_cond, a.pos_snap
+    with cond:
+        if snap["seq"] and (time.time() - snap["ts"]) <= ttl:
+            return list(snap["rows"])
+    return fetch_open_positions()
+
+def wait_position_size(symbol: str, side: str, max_size: float = 0.0, timeout: float = 5.0) -> bool:
+    """
+    (symbol, side) 포지션 수량이 max_size 이하가 될 때까지 대기. 도달하면 True, 타임아웃이면 False.
+    호출 이후에 게시된 스냅샷만 인정하며, 다른 컴포넌트가 갱신하지 않으면 직접 조회(간격은 지수 증가).
+    직접 조회는 계정당 single-flight: 대기자 N명이어도 한 명만 조회·게시하고 나머지는 pos_cond 에서 결과를 기다림.
+    조회 실패는 게시하지 않는다(빈 목록을 '0 도달'로 오판 방지).
+    """
+    sym  = convert_symbol(symbol); sd = (side or "").lower()
+    start = time.time(); deadline = start + max(0.0, float(timeout))
+    poll = max(0.05, POS_WATCH_POLL_MIN)
+    a = current_account(); cond, snap = a.pos_cond, a.pos_snap
+    with cond:
+        seen = snap["seq"]
+    while True:
+        with cond:
+            if snap["ts"] >= start and snap["index"].get((sym, sd), 0.0) <= max_size:
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            cond.wait(min(remaining, poll))
+            woke = snap["seq"] != seen
+            seen = snap["seq"]
+        if woke:
+            poll = max(0.05, POS_WATCH_POLL_MIN); continue
+        if time.time() >= deadline:
+            continue
+        with cond:
+            mine = not snap["fetching"] and time.time() - snap["fetch_ts"] >= poll
+            if mine: snap["fetching"] = True
+        if mine:
+            try: fetch_open_positions()   # 성공 시 publish_positions → 대기자 전원 깨움
+            except Exception as e: _log(f"position watch refresh error: {e}")
+            finally:
+                with cond:
+                    snap["fetching"] = False; snap["fetch_ts"] = time.time()
+                    cond.notify_all()
+        with cond:
+            seen = snap["seq"]
+        poll = min(max(POS_WATCH_POLL_MAX, 0.05), poll * 2)
+
+# ────────────────────────────────────────────────────────
+# 기동 워밍업 (TLS 연결/계약/계정모드/포지션/가격 선적재)
+# ────────────────────────────────────────────────────────
+def _timed(fn, *args):
+    t0 = time.time()
+    try:
+        res = fn(*args); err = None
+    except Exception as e:
+        res, err = None, str(e)
+    return res, round((time.time() - t0) * 1000.0, 1), err
+
+def _ping_account_session(timeout: float = 5):
+    """현재 계정 세션 풀에 연결 1개를 연다(공개 핑 → 서명/레이트 게이트 불필요)"""
+    return current_account().session.get(f"{BASE_URL}{WARMUP_PING_PATH}", timeout=timeout)
+
+def warm_account_session(n: int = WARMUP_CONNECTIONS) -> Dict[str,Any]:
+    """현재 계정(use_account)의 인증 세션(a.session)에 keep-alive 연결 n개를 동시에 미리 연다"""
+    from concurrent.futures import ThreadPoolExecutor
+    n = max(0, int(n))
+    if n <= 0:
+        return {"ms": 0.0, "error": None}
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="warmup-acct") as ex:
+        res = [f.result() for f in [ex.submit(bind_account(_timed), _ping_account_session) for _ in range(n)]]
+    errs = [e for _, _, e in res if e]
+    return {"ms": max(ms for _, ms, _ in res), "error": errs[0] if errs else None}
+
+def warmup() -> Dict[str,Any]:
+    """
+    병렬 워밍업. 실패한 단계는 errors 에 남기고 계속 진행(준비 상태는 호출자가 결정).
+    반환: {"ms", "stages": {name: ms}, "errors": {name: msg}, "positions": [...], "prices": {sym: px}}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    t0 = time.time()
+    stages: Dict[str,float] = {}; errors: Dict[str,str] = {}
+    with ThreadPoolExecutor(max_workers=max(4, WARMUP_CONNECTIONS + 3), thread_name_prefix="warmup") as ex:
+        f_conn = [ex.submit(_timed, _http_get_raw, WARMUP_PING_PATH, {}, False, 5) for _ in range(max(0, WARMUP_CONNECTIONS))]
+        # 공용 SESSION 과 별개로 인증 호출(주문/포지션)이 쓰는 계정 세션도
+        f_aconn = ex.submit(bind_account(warm_account_session), WARMUP_CONNECTIONS)
+        f_ctr  = ex.submit(_timed, refresh_contracts_cache, 0)
+        f_mode = ex.submit(bind_account(_timed), _get_account_mode, V2_PRODUCT_TYPE)
+        f_pos  = ex.submit(bind_account(_timed), fetch_open_positions)
+
+        positions, ms, err = f_pos.result()
+        stages["positions"] = ms
+        if positions is None and not err: err = "positions fetch failed"
+        if err: errors["positions"] = err
+        positions = positions or []
+        held = sorted({p.symbol for p in positions})
+        f_px = {sym: ex.submit(_timed, get_last_price, sym) for sym in held}
+
+        conn_ms = [f.result()[1] for f in f_conn]
+        stages["connections"] = max(conn_ms) if conn_ms else 0.0
+        conn_err = [f.result()[2] for f in f_conn if f.result()[2]]
+        if conn_err: errors["connections"] = conn_err[0]
+        aconn = f_aconn.result()
+        stages["account_connections"] = aconn["ms"]
+        if aconn["error"]: errors["account_connections"] = aconn["error"]
+        for name, f in (("contracts", f_ctr), ("account_mode", f_mode)):
+            _, ms, err = f.result()
+            stages[name] = ms
+            if err: errors[name] = err
+        prices: Dict[str,float] = {}
+        px_ms = 0.0
+        for sym, f in f_px.items():
+            px, ms, err = f.result()
+            px_ms = max(px_ms, ms)
+            if px: prices[sym] = px
+        stages["prices"] = px_ms
+    return {"ms": round((time.time() - t0) * 1000.0, 1), "stages": stages, "errors": errors,
+            "positions": positions, "prices": prices}
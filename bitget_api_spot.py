@@ -3,10 +3,12 @@
 # Bitget Spot API helper (V2)
 # - V2 symbols cache (/api/v2/spot/public/symbols)
 # - V2 place order (/api/v2/spot/trade/place-order)
-# - V2 tickers (/api/v2/spot/market/tickers)
+# - V2 tickers (/api/v2/spot/market/tickers) : 단일 심볼 + 전 심볼 1회 조회
 # - Assets V2 (/api/v2/spot/account/assets)
+# - Order fills V2 (/api/v2/spot/trade/orderInfo) : 체결 수량/평단/수수료
 # - Aliases/Fuzzy symbol normalization
 # - Min notional guard, scale retry, light rate-limit, Telegram notify
+# - Pooled keep-alive session with retry/backoff (SESSION) + per-endpoint latency stats
 # ------------------------------------------------------------
 import os
 import re
@@ -18,7 +20,15 @@ import base64
 import hashlib
 from typing import Dict, Optional, Tuple, Any
 
+import threading
+from collections import deque
+
 import requests
+from urllib3.util.retry import Retry
+from requests.adapters import HTTPAdapter
+
+import shm_market
+from symbols import SymbolResolver
 
 BASE_URL = "https://api.bitget.com"
 
@@ -26,6 +36,11 @@ API_KEY        = os.getenv("BITGET_API_KEY", "")
 API_SECRET     = os.getenv("BITGET_API_SECRET", "")
 API_PASSPHRASE = os.getenv("BITGET_API_PASSWORD", "")
 
+SPOT_WARMUP_CONNECTIONS = int(os.getenv("SPOT_WARMUP_CONNECTIONS", "4"))  # 기동 시 미리 열어둘 keep-alive 연결 수
+WARMUP_PING_PATH        = os.getenv("BITGET_WARMUP_PING_PATH", "/api/v2/public/time")
+FILL_WAIT_SEC           = float(os.getenv("SPOT_FILL_WAIT_SEC", "3"))     # 주문 체결 확인 최대 대기
+FILL_POLL_SEC           = float(os.getenv("SPOT_FILL_POLL_SEC", "0.2"))
+
 REMOVED_BLOCK_TTL = int(os.getenv("REMOVED_BLOCK_TTL", "43200"))  # 12h
 TICKER_TTL        = float(os.getenv("SPOT_TICKER_TTL", "2.5"))    # seconds
 AUTO_FUZZY_SYMBOL = os.getenv("AUTO_FUZZY_SYMBOL", "1") == "1"
@@ -45,6 +60,67 @@ except Exception:
     def send_telegram(_msg: str):
         pass
 
+# ------------------------- http transport -------------------------
+# 조회(GET): keep-alive 풀 + 429/5xx 지수 백오프 재시도
+_retry = Retry(total=5, read=5, connect=5, backoff_factor=0.5,
+               status_forcelist=[429, 500, 502, 503, 504],
+               allowed_methods={"GET"}, raise_on_status=False)
+# 주문(POST): 전송 전 실패(연결)와 429(거절 확정)만 재시도. 읽기 타임아웃/5xx 는 주문이 이미 접수됐을 수 있어
+# 재전송하면 시장가가 중복 체결됨 → 재시도하지 않고 호출부(체결 조회/잔고)가 판단
+_order_retry = Retry(total=3, connect=3, read=0, status=3, backoff_factor=0.3,
+                     status_forcelist=[429], allowed_methods={"POST"}, raise_on_status=False)
+
+def _new_session(retry: Retry = _retry) -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=20, pool_maxsize=50)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"User-Agent": "auto-trader-spot/1.0", "Connection": "keep-alive"})
+    return s
+
+SESSION = _new_session()
+# 주문 전용 세션(통합 앱에서 조회 풀을 주입해도 주문 재시도 정책은 바뀌지 않음)
+ORDER_SESSION = _new_session(_order_retry)
+# 통합 앱(main_all)에서는 선물 클라이언트의 연결 풀을 그대로 주입해 api.bitget.com 연결을 공유
+_HTTP: Any = SESSION
+
+def set_http_session(sess: Any):
+    global _HTTP
+    _HTTP = sess
+
+# 엔드포인트별 호출 수/실패/지연(ms)
+_HTTP_STATS: Dict[str, Dict[str, Any]] = {}
+_HTTP_STATS_LOCK = threading.Lock()
+
+def _req(method: str, path: str, **kw) -> requests.Response:
+    key = method.upper() + " " + path.split("?", 1)[0]
+    t0 = time.time()
+    ok = False
+    try:
+        http = ORDER_SESSION if method.upper() == "POST" else _HTTP
+        r = http.request(method, BASE_URL + path, **kw)
+        ok = r.status_code == 200
+        return r
+    finally:
+        ms = (time.time() - t0) * 1000.0
+        with _HTTP_STATS_LOCK:
+            st = _HTTP_STATS.get(key)
+            if st is None:
+                st = _HTTP_STATS[key] = {"n": 0, "err": 0, "ms": deque(maxlen=200)}
+            st["n"] += 1
+            st["err"] += 0 if ok else 1
+            st["ms"].append(ms)
+
+def get_http_stats() -> Dict[str, Any]:
+    out = {}
+    with _HTTP_STATS_LOCK:
+        for k, st in _HTTP_STATS.items():
+            xs = sorted(st["ms"])
+            out[k] = {"n": st["n"], "err": st["err"],
+                      "p50_ms": round(xs[len(xs) // 2], 1) if xs else None,
+                      "p95_ms": round(xs[min(len(xs) - 1, int(len(xs) * 0.95))], 1) if xs else None}
+    return out
+
 # ------------------------- light rate limiter -------------------------
 _last_call: Dict[str, float] = {}
 def _rl(key: str, min_interval: float = 0.08):
@@ -79,11 +155,10 @@ def _headers(method: str, path_with_query: str, body: str = "") -> Dict[str, str
 def _norm(s: str) -> str:
     return (s or "").upper().replace("/", "").replace("-", "").replace("_", "")
 
+_RESOLVER = SymbolResolver(ALIASES)  # 원문→심볼 메모, 상품 갱신 시 접두어 인덱스 재구성
+
 def convert_symbol(sym: str) -> str:
-    s = _norm(sym)
-    if s.endswith("PERP"):
-        s = s[:-4]
-    return ALIASES.get(s, s)
+    return _RESOLVER.resolve(sym)
 
 # ---------------------- removed symbol cache ----------------------
 _REMOVED: Dict[str, float] = {}
@@ -124,7 +199,7 @@ def _refresh_products_cache_v2():
     path = "/api/v2/spot/public/symbols"
     try:
         _rl("products_v2", 0.15)
-        r = requests.get(BASE_URL + path, timeout=12)
+        r = _req("get", path, timeout=12)
         j = r.json()
         arr = j.get("data") or []
         m: Dict[str, Dict[str, Any]] = {}
@@ -148,6 +223,7 @@ def _refresh_products_cache_v2():
             m[sym_base] = spec
         _PROD = m
         _PROD_TS = time.time()
+        _RESOLVER.rebuild(m.keys())
     except Exception as e:
         print("spot products v2 refresh fail:", e)
 
@@ -159,27 +235,7 @@ def _closest_symbol_guess(base: str) -> Optional[str]:
     """유사 심볼 추정(옵션) ex) MOEWUSDT → MOODENGUSDT"""
     if not AUTO_FUZZY_SYMBOL:
         return None
-    pref = base.replace("USDT", "")
-    if len(pref) < 3:
-        return None
-    best: Optional[str] = None
-    best_score = 99
-    for k in _PROD.keys():
-        if not k.endswith("USDT"):
-            continue
-        if k.startswith(pref):
-            score = 0
-        elif k.startswith(pref[:4]):
-            score = 1
-        elif k.startswith(pref[:3]):
-            score = 2
-        else:
-            continue
-        if score < best_score:
-            best_score = score
-            best = k
-            if best_score == 0:
-                break
+    best = _RESOLVER.guess(base)
     if best and best != base:
         try:
             send_telegram(f"[SPOT] alias auto map {base} -> {best}")
@@ -188,13 +244,18 @@ def _closest_symbol_guess(base: str) -> Optional[str]:
     return best
 
 def get_symbol_spec_spot(symbol: str) -> Dict[str, float]:
-    _ensure_products()
     base = convert_symbol(symbol)
+    sh = shm_market.get_spec(shm_market.SPOT, base)
+    if sh:
+        # 공유 테이블에 있으면 전체 심볼 REST 갱신 생략
+        return {"qtyStep": sh["sizeStep"], "priceStep": sh["priceStep"], "minQuote": sh["minQuote"] or 1.0,
+                "tradable": sh["tradable"], "baseCoin": "", "quoteCoin": "USDT"}
+    _ensure_products()
     spec = _PROD.get(base)
     if not spec:
         guess = _closest_symbol_guess(base)
         if guess:
-            ALIASES[base] = guess
+            _RESOLVER.add_alias(base, guess)
             spec = _PROD.get(guess)
     if not spec:
         spec = {
@@ -222,11 +283,15 @@ def get_last_price_spot(symbol: str, retries: int = 4, sleep_base: float = 0.15)
     now = time.time()
     if c and now - c[0] <= TICKER_TTL:
         return float(c[1])
+    px = shm_market.get_price(shm_market.SPOT, base, TICKER_TTL)
+    if px:
+        _TICKER_CACHE[base] = (now, px)
+        return px
     path = f"/api/v2/spot/market/tickers?symbol={base}"
     for i in range(retries):
         try:
             _rl("spot_ticker_v2", 0.06)
-            r = requests.get(BASE_URL + path, timeout=10)
+            r = _req("get", path, timeout=10)
             if r.status_code != 200:
                 time.sleep(sleep_base * (2 ** i))
                 continue
@@ -246,16 +311,36 @@ def get_last_price_spot(symbol: str, retries: int = 4, sleep_base: float = 0.15)
         time.sleep(sleep_base * (2 ** i))
     return None
 
+def get_all_tickers_spot() -> Dict[str, float]:
+    """전 심볼 현재가 1회 조회(/api/v2/spot/market/tickers). 결과로 티커 캐시도 갱신. 실패 시 빈 dict"""
+    try:
+        _rl("spot_tickers_all_v2", 0.1)
+        r = _req("get", "/api/v2/spot/market/tickers", timeout=10)
+        if r.status_code != 200:
+            return {}
+        arr = r.json().get("data") or []
+    except Exception as e:
+        print("spot tickers(all) fail:", e)
+        return {}
+    now = time.time()
+    out: Dict[str, float] = {}
+    for d in arr:
+        sym = _norm(d.get("symbol") or "")
+        px = _to_float(d.get("lastPr") or d.get("close") or d.get("last"))
+        if sym and px > 0:
+            out[sym] = px
+            _TICKER_CACHE[sym] = (now, px)
+    return out
+
 # -------------------------- balances (V2) --------------------------
-_BAL_TS = 0.0
-_BAL: Dict[str, float] = {}
+BAL_MAX_AGE = float(os.getenv("SPOT_BAL_MAX_AGE", "5"))   # 일반 조회 허용 나이(초)
 
 def _fetch_assets_v2(coin: Optional[str] = None) -> Dict[str, float]:
     path = "/api/v2/spot/account/assets"
     if coin:
         path += f"?coin={coin}"
     _rl("spot_bal_v2", 0.15)
-    r = requests.get(BASE_URL + path, headers=_headers("GET", path, ""), timeout=12)
+    r = _req("get", path, headers=_headers("GET", path, ""), timeout=12)
     j = r.json()
     arr = j.get("data") or []
     m: Dict[str, float] = {}
@@ -266,28 +351,109 @@ def _fetch_assets_v2(coin: Optional[str] = None) -> Dict[str, float]:
         m[c] = _to_float(it.get("available"), 0.0)
     return m
 
+class _BalanceService:
+    """
+    전체 자산 맵 1개를 메모리에 두고 코인별 조회는 여기서 응답.
+    - refresh 는 single-flight: 동시에 들어온 요청은 진행 중인 1회 조회 결과를 함께 기다림
+    - fresh 요청은 '요청 시점 이후 시작된' 조회 결과만 인정(주문 직후 옛 값 방지)
+    - 주문 후 invalidate → 체결 결과로 낙관적 갱신(apply). 체결을 못 받으면 다음 조회 1회가 확정
+    """
+    def __init__(self):
+        self._cv = threading.Condition()
+        self._map: Dict[str, float] = {}
+        self._ts = 0.0          # 마지막 성공 조회 시작 시각
+        self._inflight = 0.0    # 진행 중 조회의 시작 시각(0=없음)
+        self._dirty = True
+        self._applied = 0.0     # 마지막 낙관적 반영 시각
+        self.stats = {"fetches": 0, "coalesced": 0, "hits": 0, "errors": 0, "optimistic": 0}
+
+    def _refresh(self, not_before: float) -> Dict[str, float]:
+        with self._cv:
+            deadline = time.time() + 15.0
+            while True:
+                if self._ts >= not_before and not self._dirty:
+                    self.stats["coalesced"] += 1
+                    return self._map
+                if not self._inflight:
+                    break
+                # 진행 중 조회가 끝나면 위에서 다시 확인 → 실패했거나 도중 체결로 dirty 면 직접 재조회
+                left = deadline - time.time()
+                if left <= 0:
+                    break  # 진행 중 조회가 응답 없음 → 직접 조회
+                self._cv.wait(left)
+            started = self._inflight = time.time()
+            self._dirty = False
+        m: Optional[Dict[str, float]] = None
+        try:
+            m = _fetch_assets_v2(None)
+        except Exception as e:
+            print("spot balances fetch fail:", e)
+        with self._cv:
+            self._inflight = 0.0
+            self.stats["fetches"] += 1
+            if m and self._applied <= started:
+                self._map, self._ts = m, started
+            elif m:
+                self._dirty = True  # 조회 도중 체결이 반영됨 → 이 결과는 체결 이전 값일 수 있음
+            else:
+                self.stats["errors"] += 1
+                self._dirty = True
+            self._cv.notify_all()
+            return self._map
+
+    def snapshot(self, fresh: bool = False) -> Dict[str, float]:
+        now = time.time()
+        if fresh:
+            return self._refresh(now)
+        with self._cv:
+            if self._map and now - self._ts < BAL_MAX_AGE and not self._dirty:
+                self.stats["hits"] += 1
+                return self._map
+        return self._refresh(now - BAL_MAX_AGE)
+
+    def free(self, coin: str, fresh: bool = False) -> float:
+        return float(self.snapshot(fresh).get(coin, 0.0))
+
+    def invalidate(self):
+        with self._cv:
+            self._dirty = True
+
+    def apply(self, deltas: Dict[str, float]):
+        """체결 수량으로 메모리 잔고를 즉시 보정 → 재조회 없이 계속 메모리에서 응답(다음 주기 조회가 확정)"""
+        with self._cv:
+            if not self._map:
+                return  # 기준 맵이 없으면 보정 불가 → dirty 유지
+            m = dict(self._map)
+            for c, d in deltas.items():
+                m[c] = max(0.0, m.get(c, 0.0) + float(d))
+            self._map = m
+            self._applied = time.time()
+            self._dirty = False
+            self.stats["optimistic"] += 1
+
+BALANCES = _BalanceService()
+
 def get_spot_balances(force: bool = False, coin: Optional[str] = None) -> Dict[str, float]:
-    global _BAL_TS, _BAL
-    now = time.time()
-    if not force and not coin and _BAL and now - _BAL_TS < 5.0:
-        return _BAL
-    try:
-        if coin:
-            return _fetch_assets_v2(coin)
-        m = _fetch_assets_v2(None)
-        if m:
-            _BAL, _BAL_TS = m, now
-        return m or _BAL
-    except Exception:
-        return _BAL
+    m = BALANCES.snapshot(fresh=force)
+    if coin:
+        return {coin: m.get(coin, 0.0)}
+    return m
 
 def get_spot_free_qty(symbol: str, fresh: bool = False) -> float:
     base = convert_symbol(symbol).replace("USDT", "")
-    if fresh:
-        m = get_spot_balances(force=True, coin=base)
-        return float(m.get(base, 0.0))
-    m = get_spot_balances()
-    return float(m.get(base, 0.0))
+    return BALANCES.free(base, fresh)
+
+def apply_fill_balance(symbol: str, side: str, fill: Dict[str, Any]):
+    """주문 체결(get_order_fill_spot 결과)을 잔고 맵에 낙관적으로 반영"""
+    base = convert_symbol(symbol)
+    coin = _PROD.get(base, {}).get("baseCoin") or (base[:-4] if base.endswith("USDT") else base)
+    if side == "buy":
+        BALANCES.apply({coin: fill.get("net_qty", 0.0), "USDT": -float(fill.get("quote") or 0.0)})
+    else:
+        BALANCES.apply({coin: -float(fill.get("qty") or 0.0), "USDT": float(fill.get("quote") or 0.0)})
+
+def get_balance_stats() -> Dict[str, Any]:
+    return dict(BALANCES.stats, age=round(time.time() - BALANCES._ts, 2) if BALANCES._ts else None)
 
 # ------------------------ helpers (fmt/err) ------------------------
 def _extract_code_text(resp_text: str) -> Dict[str, str]:
@@ -319,7 +485,8 @@ def _post_v2_place_order(body: Dict[str, Any]) -> Dict[str, Any]:
     path = "/api/v2/spot/trade/place-order"
     bj = json.dumps(body)
     _rl("spot_order_v2", 0.12)
-    r = requests.post(BASE_URL + path, headers=_headers("POST", path, bj), data=bj, timeout=15)
+    r = _req("post", path, headers=_headers("POST", path, bj), data=bj, timeout=15)
+    BALANCES.invalidate()  # 주문이 나갔으면(성공/실패 불문) 메모리 잔고는 확정값이 아님
     if r.status_code != 200:
         return {"http": r.status_code, "text": r.text}
     return r.json()
@@ -447,3 +614,117 @@ def place_spot_market_sell_qty(symbol: str, qty: float) -> Dict[str, Any]:
 
     # API 코드 에러 그대로 리턴
     return res
+
+
+# ------------------------------ fills (V2) ------------------------------
+def order_id_of(resp: Dict[str, Any]) -> str:
+    d = resp.get("data") if isinstance(resp, dict) else None
+    return str((d or {}).get("orderId") or "") if isinstance(d, dict) else ""
+
+def _base_fee(fee_detail: Any, base_coin: str) -> float:
+    """feeDetail(JSON 문자열/딕트)에서 기초코인으로 낸 수수료(양수) 합"""
+    if isinstance(fee_detail, str):
+        try:
+            fee_detail = json.loads(fee_detail) if fee_detail else {}
+        except Exception:
+            return 0.0
+    if not isinstance(fee_detail, dict):
+        return 0.0
+    if "feeCoin" in fee_detail:  # {"feeCoin","totalFee"} 형태
+        return abs(_to_float(fee_detail.get("totalFee"))) if _norm(fee_detail.get("feeCoin")) == base_coin else 0.0
+    fee = 0.0
+    for coin, d in fee_detail.items():  # {"BTC": {"totalFee": -0.0001, ...}, "newFees": {...}} 형태
+        if _norm(coin) == base_coin and isinstance(d, dict):
+            fee += abs(_to_float(d.get("totalFee")))
+    return fee
+
+def get_order_fill_spot(symbol: str, order_id: str, wait_sec: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    주문 체결 결과: {"orderId","status","qty","avg_px","quote","fee_base","net_qty"}
+    - 종결(filled/cancelled) 또는 wait_sec 초과 시 반환, 조회 실패면 None
+    - net_qty: 매수 수수료가 기초코인에서 빠지면 그만큼 차감한 실제 보유 증가분
+    """
+    if not order_id:
+        return None
+    base = convert_symbol(symbol)
+    coin = _PROD.get(base, {}).get("baseCoin") or (base[:-4] if base.endswith("USDT") else base)
+    path = f"/api/v2/spot/trade/orderInfo?orderId={order_id}"
+    deadline = time.time() + (FILL_WAIT_SEC if wait_sec is None else wait_sec)
+    last: Optional[Dict[str, Any]] = None
+    while True:
+        try:
+            _rl("spot_order_info_v2", 0.05)
+            r = _req("get", path, headers=_headers("GET", path, ""), timeout=8)
+            arr = r.json().get("data") or []
+            d = arr[0] if isinstance(arr, list) and arr else (arr if isinstance(arr, dict) else None)
+            if d:
+                qty = _to_float(d.get("baseVolume"))
+                quote = _to_float(d.get("quoteVolume"))
+                avg = _to_float(d.get("priceAvg")) or (quote / qty if qty > 0 else 0.0)
+                fee = _base_fee(d.get("feeDetail"), coin) if str(d.get("side") or "").lower() == "buy" else 0.0
+                last = {"orderId": order_id, "status": str(d.get("status") or "").lower(), "qty": qty,
+                        "avg_px": avg, "quote": quote or qty * avg, "fee_base": fee,
+                        "net_qty": max(0.0, qty - fee)}
+                if last["status"] in ("filled", "full_fill", "cancelled", "canceled"):
+                    return last
+        except Exception as e:
+            print("spot order info fail:", order_id, e)
+        if time.time() >= deadline:
+            return last
+        time.sleep(FILL_POLL_SEC)
+
+
+# ------------------------------ warm-up ------------------------------
+def _timed(fn, *args, **kwargs):
+    t0 = time.time()
+    try:
+        res = fn(*args, **kwargs); err = None
+    except Exception as e:
+        res, err = None, str(e)
+    return res, round((time.time() - t0) * 1000.0, 1), err
+
+def warmup_spot(held_min_quote: bool = True) -> Dict[str, Any]:
+    """
+    기동 워밍업: 상품 스펙 + 전체 잔고를 병렬 적재하고, 보유 코인 가격을 선조회.
+    held_min_quote=True 면 minQuote 이상 가치가 있는 USDT 페어만 보유로 본다(먼지 잔고 제외).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    t0 = time.time()
+    stages: Dict[str, float] = {}
+    errors: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(8, SPOT_WARMUP_CONNECTIONS + 2), thread_name_prefix="spot-warmup") as ex:
+        # 동시 핑으로 풀에 TLS 연결을 미리 열어 첫 주문이 핸드셰이크 비용을 치르지 않게
+        f_conn = [ex.submit(_timed, _req, "get", WARMUP_PING_PATH, timeout=5) for _ in range(max(0, SPOT_WARMUP_CONNECTIONS))]
+        if f_conn:   # 주문 전용 세션도 연결 1개
+            f_conn.append(ex.submit(_timed, ORDER_SESSION.get, BASE_URL + WARMUP_PING_PATH, timeout=5))
+        f_prod = ex.submit(_timed, _refresh_products_cache_v2)
+        f_bal  = ex.submit(_timed, get_spot_balances, True)
+        if f_conn:
+            conn = [f.result() for f in f_conn]
+            stages["connections"] = max(ms for _, ms, _ in conn)
+            errs = [e for _, _, e in conn if e]
+            if errs: errors["connections"] = errs[0]
+        _, ms, err = f_prod.result(); stages["products"] = ms
+        if err: errors["products"] = err
+        bal, ms, err = f_bal.result(); stages["balances"] = ms
+        if err: errors["balances"] = err
+        bal = bal or {}
+
+        cands = [c + "USDT" for c, q in bal.items() if q > 0 and c != "USDT" and (c + "USDT") in _PROD]
+        f_px = {sym: ex.submit(_timed, get_last_price_spot, sym) for sym in cands}
+        prices: Dict[str, float] = {}
+        px_ms = 0.0
+        for sym, f in f_px.items():
+            px, ms, _ = f.result()
+            px_ms = max(px_ms, ms)
+            if px: prices[sym] = float(px)
+        stages["prices"] = px_ms
+
+    held: Dict[str, float] = {}
+    for sym, px in prices.items():
+        qty = float(bal.get(sym[:-4], 0.0))
+        min_q = float(_PROD.get(sym, {}).get("minQuote", 1.0))
+        if qty > 0 and (not held_min_quote or qty * px >= min_q):
+            held[sym] = qty
+    return {"ms": round((time.time() - t0) * 1000.0, 1), "stages": stages, "errors": errors,
+            "held": held, "prices": prices}
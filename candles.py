@@ -0,0 +1,194 @@
+# candles.py
+# ------------------------------------------------------------
+# 심볼/타임프레임별 OHLCV 링버퍼 (array 기반, HTTP 없음)
+# - 가격 갱신(on_price)으로 현재 봉을 집계하고, 봉이 바뀌면 링에 확정 봉으로 push
+# - 틱 공백(봉 누락/중간 시작) 발생 시 gap 표시 → 캔들 REST 로 top_up 할 때만 보충
+# - last_closed_bar / last_bars 는 링 인덱스 계산만으로 응답
+# - subscribe(fn): 봉 확정 시 fn(symbol, tf, bar) 호출(로컬 지표 엔진용)
+# ------------------------------------------------------------
+import os
+import time
+import threading
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+CANDLE_BUFFER_LEN = int(os.getenv("CANDLE_BUFFER_LEN", "500"))
+# 집계할 타임프레임(초). 기본 1m/5m/15m
+CANDLE_BUFFER_TFS = [int(x) for x in os.getenv("CANDLE_BUFFER_TFS", "60,300,900").split(",") if x.strip()]
+
+Bar = Tuple[float, float, float, float, float, float]  # (open_ts, o, h, l, c, v)
+
+
+class _Ring:
+    __slots__ = ("tf", "cap", "ts", "o", "h", "l", "c", "v", "n", "head",
+                 "cur_ts", "cur_o", "cur_h", "cur_l", "cur_c", "cur_v", "cur_partial", "gap")
+
+    def __init__(self, tf: int, cap: int):
+        self.tf, self.cap = int(tf), int(cap)
+        self.ts = array("d", bytes(8 * cap)); self.o = array("d", bytes(8 * cap))
+        self.h  = array("d", bytes(8 * cap)); self.l = array("d", bytes(8 * cap))
+        self.c  = array("d", bytes(8 * cap)); self.v = array("d", bytes(8 * cap))
+        self.n = 0       # 확정 봉 개수(<= cap)
+        self.head = 0    # 다음에 쓸 위치
+        self.cur_ts = -1.0
+        self.cur_o = self.cur_h = self.cur_l = self.cur_c = self.cur_v = 0.0
+        self.cur_partial = True  # 첫 봉은 중간부터 관측됨
+        self.gap = True  # 빈 버퍼/틱 중간 시작 → 보충 필요
+
+    def _push(self, t: float, o: float, h: float, l: float, c: float, v: float):
+        i = self.head
+        self.ts[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i] = t, o, h, l, c, v
+        self.head = (i + 1) % self.cap
+        if self.n < self.cap:
+            self.n += 1
+
+    def on_price(self, px: float, ts: float) -> Optional[Bar]:
+        """틱 반영. 봉이 확정되면 그 봉을 반환"""
+        b = ts - (ts % self.tf)
+        if self.cur_ts < 0:
+            self.cur_ts, self.cur_o = b, px
+            self.cur_h = self.cur_l = self.cur_c = px
+            self.cur_v = 0.0
+            self.cur_partial = True
+            return None
+        if b == self.cur_ts:
+            if px > self.cur_h: self.cur_h = px
+            if px < self.cur_l: self.cur_l = px
+            self.cur_c = px
+            return None
+        if b < self.cur_ts:
+            return None  # 역행 틱 무시
+        closed = (self.cur_ts, self.cur_o, self.cur_h, self.cur_l, self.cur_c, self.cur_v)
+        self._push(*closed)
+        if self.cur_partial or b - self.cur_ts > self.tf:
+            self.gap = True  # 중간 시작 봉 확정 또는 봉 누락
+        self.cur_partial = False
+        self.cur_ts, self.cur_o = b, px
+        self.cur_h = self.cur_l = self.cur_c = px
+        self.cur_v = 0.0
+        return closed
+
+    def last_closed(self) -> Optional[Bar]:
+        if self.n == 0:
+            return None
+        i = (self.head - 1) % self.cap
+        return (self.ts[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i])
+
+    def last_n(self, k: int) -> List[Bar]:
+        k = max(0, min(int(k), self.n))
+        out: List[Bar] = []
+        start = (self.head - k) % self.cap
+        for j in range(k):
+            i = (start + j) % self.cap
+            out.append((self.ts[i], self.o[i], self.h[i], self.l[i], self.c[i], self.v[i]))
+        return out
+
+    def merge(self, rows: List[Bar]):
+        """REST 캔들로 보충(같은 봉은 REST 우선). 아직 진행 중인 봉은 제외"""
+        now = time.time()
+        merged: Dict[float, Bar] = {b[0]: b for b in self.last_n(self.n)}
+        for r in rows:
+            if r[0] + self.tf > now or (self.cur_ts >= 0 and r[0] >= self.cur_ts):
+                continue
+            merged[r[0]] = r
+        self.n = self.head = 0
+        for t in sorted(merged)[-self.cap:]:
+            self._push(*merged[t])
+        self.gap = False
+
+
+_BOOK: Dict[Tuple[str, int], _Ring] = {}
+_LOCK = threading.Lock()
+_SUBSCRIBERS: List[Callable[[str, int, Bar], None]] = []
+
+
+def subscribe(fn: Callable[[str, int, Bar], None]):
+    if fn not in _SUBSCRIBERS:
+        _SUBSCRIBERS.append(fn)
+
+
+def _ring(symbol: str, tf: int) -> _Ring:
+    k = (symbol, int(tf))
+    r = _BOOK.get(k)
+    if r is None:
+        r = _BOOK[k] = _Ring(tf, CANDLE_BUFFER_LEN)
+    return r
+
+
+def on_price(symbol: str, px: float, ts: Optional[float] = None):
+    if not symbol or not px or px <= 0:
+        return
+    ts = time.time() if ts is None else float(ts)
+    closed: List[Tuple[int, Bar]] = []
+    with _LOCK:
+        for tf in CANDLE_BUFFER_TFS:
+            bar = _ring(symbol, tf).on_price(float(px), ts)
+            if bar is not None:
+                closed.append((tf, bar))
+    # 콜백은 락 밖에서
+    for tf, bar in closed:
+        for fn in list(_SUBSCRIBERS):
+            try:
+                fn(symbol, tf, bar)
+            except Exception as e:
+                print("candle subscriber error:", e)
+
+
+def last_closed_bar(symbol: str, tf: int) -> Optional[Bar]:
+    with _LOCK:
+        r = _BOOK.get((symbol, int(tf)))
+        return r.last_closed() if r else None
+
+
+def last_bars(symbol: str, tf: int, n: int) -> List[Bar]:
+    with _LOCK:
+        r = _BOOK.get((symbol, int(tf)))
+        return r.last_n(n) if r else []
+
+
+def needs_topup(symbol: str, tf: int) -> bool:
+    """비었거나, 공백이 있거나, 마지막 확정 봉이 한 봉 이상 뒤처졌으면 True"""
+    with _LOCK:
+        r = _BOOK.get((symbol, int(tf)))
+        if r is None or r.gap or r.n == 0:
+            return True
+        return time.time() - (r.ts[(r.head - 1) % r.cap] + r.tf) > r.tf
+
+
+def top_up(symbol: str, tf: int, rows: List[Bar]):
+    if not rows:
+        return
+    with _LOCK:
+        _ring(symbol, tf).merge(rows)
+
+
+def parse_rest_rows(data) -> List[Bar]:
+    """Bitget 캔들 응답(list[list] 또는 list[dict], ts=ms) → 오름차순 Bar 목록"""
+    out: List[Bar] = []
+    for row in data or []:
+        try:
+            if isinstance(row, (list, tuple)) and len(row) >= 5:
+                t, o, h, l, c = (float(x) for x in row[:5])
+                v = float(row[5]) if len(row) > 5 and row[5] not in (None, "") else 0.0
+            elif isinstance(row, dict):
+                t = float(row.get("ts") or row.get("timestamp") or 0)
+                o, h, l, c = (float(row.get(k) or 0) for k in ("open", "high", "low", "close"))
+                v = float(row.get("baseVolume") or row.get("volume") or 0)
+            else:
+                continue
+            out.append((t / 1000.0 if t > 1e11 else t, o, h, l, c, v))
+        except Exception:
+            continue
+    out.sort(key=lambda b: b[0])
+    return out
+
+
+def track(tf: int):
+    """틱 집계 대상 타임프레임 추가"""
+    with _LOCK:
+        if int(tf) not in CANDLE_BUFFER_TFS:
+            CANDLE_BUFFER_TFS.append(int(tf))
+
+
+def tracked_timeframes() -> List[int]:
+    return list(CANDLE_BUFFER_TFS)
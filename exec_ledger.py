@@ -0,0 +1,262 @@
+# exec_ledger.py
+# ------------------------------------------------------------
+# 체결 품질 원장: 신호→체결 지연 + 슬리피지(bps) 주문별 기록
+# - 타임스탬프: 웹훅 수신(_t_rx) → 큐에서 꺼냄(_t_dq) → 주문 전송 → 거래소 응답(ack) → 체결(주문 상세 조회)
+#   · 수신/꺼냄 시각은 신호 dict 에 실어 큐(공유 큐 포함)를 그대로 통과시킨다
+#   · 신호 종류/참조가격은 signal_scope() 로 실행 스레드의 contextvar 에 묶고, 주문 함수가 읽어 간다
+#   · 신호 없이 나간 주문(워치독 손절/재조정 등)은 type="internal" 로 기록(전송 이후 구간만)
+# - 참조가격: 페이로드 price/close 우선, 없으면 주문 시점 사이징 가격(또는 로컬 호가 중간가)
+# - 체결 조회/파일 기록은 백그라운드 스레드 1개 → 주문 경로는 dict 1개 append 만
+# - 조회: summary() 심볼별/신호종류별 구간 지연 p50/p95/p99 + 슬리피지, 내보내기: TRADE_LOG_DIR/exec-YYYYMMDD.jsonl
+# ------------------------------------------------------------
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+EXEC_LEDGER_ENABLE    = os.getenv("EXEC_LEDGER_ENABLE", "1") == "1"
+EXEC_LEDGER_KEEP      = int(os.getenv("EXEC_LEDGER_KEEP", "2000"))
+EXEC_FILL_POLL_SEC    = float(os.getenv("EXEC_FILL_POLL_SEC", "0.5"))
+EXEC_FILL_TIMEOUT_SEC = float(os.getenv("EXEC_FILL_TIMEOUT_SEC", "10"))
+TRADE_LOG_DIR         = os.getenv("TRADE_LOG_DIR", "").strip()
+
+RX_KEY = "_t_rx"   # 웹훅/로컬 신호 수신 시각
+DQ_KEY = "_t_dq"   # 워커가 큐에서 꺼낸 시각
+
+_REF_KEYS = ("price", "close", "px", "ref_price")
+STAGES = ("queue", "pre", "ack", "fill", "total")
+
+# (account, symbol, order_id) → (avg_px, filled_size, exchange_ts) | None(아직 미체결)
+_FILL_FETCHER: Optional[Callable[[str, str, str], Optional[Tuple[float, float, float]]]] = None
+
+_SIG: contextvars.ContextVar = contextvars.ContextVar("exec_signal", default=None)
+
+_LOCK = threading.Lock()
+_ROWS: deque = deque(maxlen=EXEC_LEDGER_KEEP)
+_PENDING: List[Dict[str, Any]] = []
+_CV = threading.Condition()
+_THREAD: Optional[threading.Thread] = None
+_STATS = {"orders": 0, "filled": 0, "rejected": 0, "nofill": 0, "exported": 0, "export_errors": 0}
+
+
+def set_fill_fetcher(fn: Callable[[str, str, str], Optional[Tuple[float, float, float]]]):
+    global _FILL_FETCHER
+    _FILL_FETCHER = fn
+
+
+# ----------------------- 신호 타임스탬프 -----------------------
+def stamp(data: Any, key: str, ts: Optional[float] = None):
+    """신호 dict 에 시각을 1번만 기록(재큐잉돼도 최초 시각 유지)"""
+    if EXEC_LEDGER_ENABLE and isinstance(data, dict) and key not in data:
+        data[key] = ts or time.time()
+
+
+def _ref_from(data: Dict[str, Any]) -> float:
+    for k in _REF_KEYS:
+        try:
+            v = float(data.get(k) or 0)
+        except (TypeError, ValueError):
+            continue
+        if v > 0:
+            return v
+    return 0.0
+
+
+@contextmanager
+def signal_scope(data: Dict[str, Any], typ: str):
+    """이 블록 안에서 나간 주문은 data 의 신호(종류/수신 시각/참조가격)로 귀속"""
+    if not EXEC_LEDGER_ENABLE:
+        yield
+        return
+    tok = _SIG.set({"type": typ or "signal", "t_rx": data.get(RX_KEY),
+                    "t_dq": data.get(DQ_KEY), "ref": _ref_from(data)})
+    try:
+        yield
+    finally:
+        _SIG.reset(tok)
+
+
+def bind(fn: Callable) -> Callable:
+    """현재 신호 컨텍스트를 캡처해 다른 스레드(풀)에서 나간 주문도 같은 신호로 귀속"""
+    sig = _SIG.get()
+    def _run(*args, **kwargs):
+        tok = _SIG.set(sig)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _SIG.reset(tok)
+    return _run
+
+
+# ----------------------- 주문 기록 -----------------------
+def _order_id(resp: Any) -> str:
+    d = resp.get("data") if isinstance(resp, dict) else None
+    if isinstance(d, dict):
+        return str(d.get("orderId") or "")
+    return ""
+
+
+def record_order(account: str, symbol: str, side: str, kind: str, size: float, resp: Any,
+                 t_send: float, t_ack: float, ref: Optional[float] = None):
+    """주문 1건(전송/응답 시각) 등록. 체결 조회는 백그라운드에서"""
+    if not EXEC_LEDGER_ENABLE:
+        return
+    sig = _SIG.get() or {}
+    code = str(resp.get("code", "")) if isinstance(resp, dict) else ""
+    row = {
+        "account": account, "symbol": symbol, "side": side, "kind": kind,
+        "type": sig.get("type") or "internal", "size": size, "code": code, "order_id": _order_id(resp),
+        "ref_px": sig.get("ref") or ref or None, "fill_px": None, "fill_size": None, "slip_bps": None,
+        "t_rx": sig.get("t_rx"), "t_dq": sig.get("t_dq"), "t_send": t_send, "t_ack": t_ack, "t_fill": None,
+        "status": "acked" if code == "00000" else "rejected",
+    }
+    with _CV:
+        _ensure_thread()
+        _PENDING.append(row)
+        _CV.notify()
+
+
+def _ensure_thread():
+    global _THREAD
+    if _THREAD and _THREAD.is_alive():
+        return
+    _THREAD = threading.Thread(target=_loop, name="exec-ledger", daemon=True)
+    _THREAD.start()
+
+
+def _slip_bps(side: str, ref: float, px: float) -> float:
+    """양수 = 불리(매수는 더 비싸게, 매도는 더 싸게 체결)"""
+    d = (px - ref) if side == "buy" else (ref - px)
+    return d / ref * 1e4
+
+
+def _finish(row: Dict[str, Any], status: str):
+    row["status"] = status
+    t_rx, t_dq, t_send = row["t_rx"], row["t_dq"], row["t_send"]
+    end = row["t_fill"] or row["t_ack"]
+    lat = {"ack": (row["t_ack"] - t_send) * 1000.0}
+    if row["t_fill"]:
+        lat["fill"] = (row["t_fill"] - t_send) * 1000.0
+    if t_dq:
+        lat["pre"] = (t_send - t_dq) * 1000.0
+    if t_rx:
+        lat["total"] = (end - t_rx) * 1000.0
+        if t_dq:
+            lat["queue"] = (t_dq - t_rx) * 1000.0
+    row["lat_ms"] = {k: round(v, 1) for k, v in lat.items()}
+    if row["fill_px"] and row["ref_px"]:
+        row["slip_bps"] = round(_slip_bps(row["side"], row["ref_px"], row["fill_px"]), 2)
+    with _LOCK:
+        _ROWS.append(row)
+        _STATS["orders"] += 1
+        _STATS[status] = _STATS.get(status, 0) + 1
+    _export(row)
+
+
+def _poll(row: Dict[str, Any], now: float) -> bool:
+    """체결 확인되면 True"""
+    if _FILL_FETCHER is None or not row["order_id"]:
+        return False
+    try:
+        got = _FILL_FETCHER(row["account"], row["symbol"], row["order_id"])
+    except Exception as e:
+        print("exec ledger fill fetch error:", e)
+        return False
+    if not got:
+        return False
+    px, sz, ts = got
+    row["fill_px"], row["fill_size"] = px, sz
+    # 거래소 시각은 로컬 시계와 어긋날 수 있어 [전송, 관측] 구간으로 자른다
+    row["t_fill"] = min(max(ts or now, row["t_send"]), now)
+    return True
+
+
+def _loop():
+    while True:
+        with _CV:
+            while not _PENDING:
+                _CV.wait()
+            batch = list(_PENDING)
+        now = time.time()
+        done = []
+        for row in batch:
+            if row["status"] == "rejected":
+                _finish(row, "rejected")
+            elif _poll(row, now):
+                _finish(row, "filled")
+            elif now - row["t_ack"] >= EXEC_FILL_TIMEOUT_SEC or _FILL_FETCHER is None:
+                _finish(row, "nofill")
+            else:
+                continue
+            done.append(row)
+        gone = {id(r) for r in done}
+        with _CV:
+            _PENDING[:] = [r for r in _PENDING if id(r) not in gone]
+            more = bool(_PENDING)
+        if more:
+            time.sleep(EXEC_FILL_POLL_SEC)
+
+
+# ----------------------- 내보내기 -----------------------
+def export_path(ts: Optional[float] = None) -> Optional[str]:
+    if not TRADE_LOG_DIR:
+        return None
+    return os.path.join(TRADE_LOG_DIR, time.strftime("exec-%Y%m%d.jsonl", time.gmtime(ts or time.time())))
+
+
+def _export(row: Dict[str, Any]):
+    path = export_path(row["t_send"])
+    if not path:
+        return
+    try:
+        os.makedirs(TRADE_LOG_DIR, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+        _STATS["exported"] += 1
+    except Exception as e:
+        _STATS["export_errors"] += 1
+        print("exec ledger export error:", e)
+
+
+# ----------------------- 조회 -----------------------
+def _pctl(vals: List[float], q: float) -> Optional[float]:
+    if not vals:
+        return None
+    v = sorted(vals)
+    return round(v[min(len(v) - 1, int(round(q * (len(v) - 1))))], 2)
+
+
+def _agg(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"n": len(rows), "filled": sum(1 for r in rows if r["status"] == "filled"),
+                           "rejected": sum(1 for r in rows if r["status"] == "rejected")}
+    lat = {}
+    for st in STAGES:
+        vals = [r["lat_ms"][st] for r in rows if st in r["lat_ms"]]
+        if vals:
+            lat[st] = {"n": len(vals), "p50": _pctl(vals, 0.50), "p95": _pctl(vals, 0.95),
+                       "p99": _pctl(vals, 0.99), "max": round(max(vals), 1)}
+    out["lat_ms"] = lat
+    slip = [r["slip_bps"] for r in rows if r["slip_bps"] is not None]
+    if slip:
+        out["slip_bps"] = {"n": len(slip), "mean": round(sum(slip) / len(slip), 2), "p50": _pctl(slip, 0.50),
+                           "p95": _pctl(slip, 0.95), "max": round(max(slip), 2)}
+    return out
+
+
+def summary(account: str = "", symbol: str = "", typ: str = "", recent: int = 20) -> Dict[str, Any]:
+    with _LOCK:
+        rows = [r for r in _ROWS if (not account or r["account"] == account)
+                and (not symbol or r["symbol"] == symbol) and (not typ or r["type"] == typ)]
+        stats = dict(_STATS)
+    by_sym: Dict[str, List[Dict[str, Any]]] = {}
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for r in rows:
+        by_sym.setdefault(r["symbol"], []).append(r)
+        by_type.setdefault(r["type"], []).append(r)
+    return {"enabled": EXEC_LEDGER_ENABLE, "stats": stats, "pending": len(_PENDING), "export": export_path(),
+            "all": _agg(rows), "by_symbol": {k: _agg(v) for k, v in by_sym.items()},
+            "by_type": {k: _agg(v) for k, v in by_type.items()}, "recent": rows[-recent:] if recent > 0 else []}
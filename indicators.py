@@ -0,0 +1,212 @@
+# indicators.py
+# ------------------------------------------------------------
+# 보유 포지션 대상 로컬 지표 엔진 (EMA/ATR, 봉당 O(1) 갱신)
+# - candles 링버퍼의 확정 봉(subscribe)으로 갱신 → TradingView 왕복 없이 청산 신호 생성
+# - emaexit: 롱은 종가 < EMA, 숏은 종가 > EMA 가 CONFIRM_BARS 연속
+# - failcut: ATR_MULT > 0 이면 진입가 대비 ATR*배수 역행 시
+# - 신호는 sink(dict) 로 전달(main 의 큐 → _handle_signal). 포지션당 1회만 발사
+# - 심볼별 설정: INDICATOR_RULES_JSON = {"BTCUSDT": {"tf": 900, "ema": 50, "atr_mult": 2.5}, "XRPUSDT": {"enable": false}}
+# ------------------------------------------------------------
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import candles
+from bitget_api import load_candles
+
+INDICATOR_EXIT_ENABLE   = os.getenv("INDICATOR_EXIT_ENABLE", "0") == "1"
+INDICATOR_TF            = int(os.getenv("INDICATOR_TF", "300"))
+INDICATOR_EMA_LEN       = int(os.getenv("INDICATOR_EMA_LEN", "20"))
+INDICATOR_ATR_LEN       = int(os.getenv("INDICATOR_ATR_LEN", "14"))
+INDICATOR_ATR_MULT      = float(os.getenv("INDICATOR_ATR_MULT", "0"))   # 0이면 failcut 비활성
+INDICATOR_CONFIRM_BARS  = int(os.getenv("INDICATOR_CONFIRM_BARS", "1"))
+
+try:
+    INDICATOR_RULES = json.loads(os.getenv("INDICATOR_RULES_JSON", "") or "{}")
+except Exception:
+    INDICATOR_RULES = {}
+
+
+def rule_for(symbol: str) -> dict:
+    r = {"enable": INDICATOR_EXIT_ENABLE, "tf": INDICATOR_TF, "ema": INDICATOR_EMA_LEN,
+         "atr": INDICATOR_ATR_LEN, "atr_mult": INDICATOR_ATR_MULT, "confirm": INDICATOR_CONFIRM_BARS}
+    r.update(INDICATOR_RULES.get(symbol) or {})
+    return r
+
+
+# ----------------------- 지표 -----------------------
+class EMA:
+    __slots__ = ("n", "alpha", "value", "count")
+
+    def __init__(self, n: int):
+        self.n = max(1, int(n))
+        self.alpha = 2.0 / (self.n + 1.0)
+        self.value = 0.0
+        self.count = 0
+
+    def update(self, x: float) -> float:
+        # 첫 n개는 SMA 로 시드
+        self.count += 1
+        if self.count <= self.n:
+            self.value += (x - self.value) / self.count
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.n
+
+
+class ATR:
+    """Wilder ATR"""
+    __slots__ = ("n", "value", "count", "prev_close")
+
+    def __init__(self, n: int):
+        self.n = max(1, int(n))
+        self.value = 0.0
+        self.count = 0
+        self.prev_close = None
+
+    def update(self, h: float, l: float, c: float) -> float:
+        pc = self.prev_close
+        tr = (h - l) if pc is None else max(h - l, abs(h - pc), abs(l - pc))
+        self.prev_close = c
+        self.count += 1
+        if self.count <= self.n:
+            self.value += (tr - self.value) / self.count
+        else:
+            self.value += (tr - self.value) / self.n
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.n
+
+
+# ----------------------- 포지션 트랙 -----------------------
+class _Track:
+    __slots__ = ("symbol", "side", "entry", "rule", "ema", "atr", "last_ts", "beyond", "fired", "since")
+
+    def __init__(self, symbol: str, side: str, entry: float, rule: dict):
+        self.symbol, self.side, self.entry, self.rule = symbol, side, float(entry or 0.0), rule
+        self.ema = EMA(rule["ema"])
+        self.atr = ATR(rule["atr"])
+        self.last_ts = -1.0
+        self.beyond = 0      # EMA 반대편 연속 종가 수
+        self.fired = None    # 발사한 신호 타입
+        self.since = time.time()
+
+    def feed(self, bar: candles.Bar) -> Optional[Tuple[str, str]]:
+        """확정 봉 1개 반영 → (신호타입, 사유) 또는 None"""
+        ts, _o, h, l, c, _v = bar
+        if ts <= self.last_ts:
+            return None
+        self.last_ts = ts
+        ema = self.ema.update(c)
+        atr = self.atr.update(h, l, c)
+        if self.fired or not self.ema.ready:
+            return None
+
+        long_ = self.side == "long"
+        mult = float(self.rule.get("atr_mult") or 0.0)
+        if mult > 0 and self.atr.ready and self.entry > 0:
+            stop = self.entry - mult * atr if long_ else self.entry + mult * atr
+            if (c <= stop) if long_ else (c >= stop):
+                return "failcut", f"close {c:g} {'<=' if long_ else '>='} entry±{mult:g}*ATR {stop:g}"
+
+        self.beyond = self.beyond + 1 if ((c < ema) if long_ else (c > ema)) else 0
+        if self.beyond >= max(1, int(self.rule.get("confirm") or 1)):
+            return "emaexit", f"close {c:g} {'<' if long_ else '>'} EMA{self.ema.n} {ema:g}"
+        return None
+
+
+_TRACKS: Dict[Tuple[str, str], _Track] = {}
+_LOCK = threading.Lock()
+_SINK: Optional[Callable[[dict], None]] = None
+_FIRED_LOG: List[dict] = []
+
+
+def set_signal_sink(fn: Callable[[dict], None]):
+    global _SINK
+    _SINK = fn
+    candles.subscribe(on_bar)
+
+
+def _emit(tr: _Track, typ: str, reason: str, bar_ts: float):
+    sig = {"type": typ, "symbol": tr.symbol, "side": tr.side, "source": "local",
+           "reason": reason, "bar_ts": bar_ts, "tf": tr.rule["tf"]}
+    _FIRED_LOG.append(dict(sig, ts=time.time()))
+    del _FIRED_LOG[:-50]
+    if _SINK:
+        try:
+            _SINK(sig)
+        except Exception as e:
+            print("indicator sink error:", e)
+
+
+def _attach(symbol: str, side: str, entry: float, rule: dict):
+    tf = int(rule["tf"])
+    load_candles(symbol, tf)  # HTTP 는 락 밖에서
+    tr = _Track(symbol, side, entry, rule)
+    hist = candles.last_bars(symbol, tf, max(tr.ema.n, tr.atr.n) * 3)
+    with _LOCK:
+        if (symbol, side) in _TRACKS:
+            return
+        for b in hist:
+            tr.feed(b)
+        tr.fired = None  # 과거 봉으로는 발사하지 않음
+        tr.beyond = 0
+        _TRACKS[(symbol, side)] = tr
+
+
+def sync_held(held: List[Tuple[str, str, float]]):
+    """보유 포지션 목록 [(symbol, side, entry)] 과 트랙 동기화 (워치독 주기 호출)"""
+    want = {}
+    for symbol, side, entry in held:
+        rule = rule_for(symbol)
+        if rule.get("enable"):
+            want[(symbol, side)] = (entry, rule)
+    with _LOCK:
+        for k in [k for k in _TRACKS if k not in want]:
+            _TRACKS.pop(k, None)
+        new = [k for k in want if k not in _TRACKS]
+        for k in want:
+            tr = _TRACKS.get(k)
+            if tr is not None and want[k][0] > 0:
+                tr.entry = float(want[k][0])  # 물타기 등 평균가 변경 반영
+    for symbol, side in new:
+        entry, rule = want[(symbol, side)]
+        try:
+            _attach(symbol, side, entry, rule)
+        except Exception as e:
+            print("indicator attach error:", symbol, side, e)
+
+
+def on_bar(symbol: str, tf: int, bar: candles.Bar):
+    out = []
+    with _LOCK:
+        for side in ("long", "short"):
+            tr = _TRACKS.get((symbol, side))
+            if tr is None or int(tr.rule["tf"]) != int(tf):
+                continue
+            hit = tr.feed(bar)
+            if hit:
+                tr.fired = hit[0]
+                out.append((tr, hit))
+    for tr, (typ, reason) in out:
+        _emit(tr, typ, reason, bar[0])
+
+
+def get_indicator_snapshot() -> dict:
+    with _LOCK:
+        tracks = [{
+            "symbol": t.symbol, "side": t.side, "tf": t.rule["tf"], "entry": t.entry,
+            "ema_len": t.ema.n, "ema": round(t.ema.value, 8), "ema_ready": t.ema.ready,
+            "atr": round(t.atr.value, 8), "atr_ready": t.atr.ready,
+            "last_bar_ts": t.last_ts, "fired": t.fired,
+        } for t in _TRACKS.values()]
+    return {"enabled": INDICATOR_EXIT_ENABLE, "rules": INDICATOR_RULES, "tracks": tracks,
+            "recent": list(_FIRED_LOG[-20:])}
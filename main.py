@@ -1,15 +1,29 @@
 # -*- coding: utf-8 -*-
-import os, time, json, hashlib, threading, queue, re, traceback
+import os, time, json, hashlib, threading, queue, re, traceback, asyncio
 from collections import deque
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
 from trader import (
     enter_position, take_partial_profit, close_position, reduce_by_contracts,
-    start_watchdogs, start_reconciler, get_pending_snapshot, start_capacity_guard
+    start_watchdogs, start_reconciler, get_pending_snapshot, start_capacity_guard,
+    wait_until_flat, reverse_position, get_entry_latency_snapshot, pretrade_context,
+    close_all_positions, seed_local_positions, get_drift_stats,
 )
 from telegram_bot import send_telegram
-from bitget_api import convert_symbol, get_open_positions
+from bitget_api import (
+    convert_symbol, get_open_positions, fetch_open_positions, get_positions_snapshot, get_order_batch_stats, warmup, warm_account_session,
+    AccountLocal, account_names, use_account, current_account_name,
+)
+import indicators
+import shared_state
+import shm_market
+import orderbook
+import exec_ledger
+import tracing
+import profiler
 
 # ── 금액/일반 ENV
 DEFAULT_AMOUNT         = float(os.getenv("DEFAULT_AMOUNT", "15"))
@@ -30,6 +44,15 @@ FORCE_DEFAULT_AMOUNT   = os.getenv("FORCE_DEFAULT_AMOUNT", "1") == "1"
 ENTRY_PRECLEAR         = os.getenv("ENTRY_PRECLEAR", "1") == "1"
 ENTRY_PRECLEAR_WAIT    = float(os.getenv("ENTRY_PRECLEAR_WAIT", "0.8"))   # 1회 대기
 ENTRY_PRECLEAR_RETRY   = int(os.getenv("ENTRY_PRECLEAR_RETRY", "6"))      # 최대 N회(총 ~5초)
+# 반대 포지션 소멸 대기 상한(포지션 갱신 알림으로 즉시 깨어남). 기본값은 기존 WAIT×RETRY
+ENTRY_PRECLEAR_TIMEOUT = float(os.getenv("ENTRY_PRECLEAR_TIMEOUT", str(ENTRY_PRECLEAR_WAIT * max(1, ENTRY_PRECLEAR_RETRY))))
+
+# 기동 워밍업/준비 게이트
+WARMUP_ENABLE          = os.getenv("WARMUP_ENABLE", "1") == "1"
+WARMUP_GATE_MAX_SEC    = float(os.getenv("WARMUP_GATE_MAX_SEC", "15"))  # 워커가 워밍업을 기다리는 최대 시간
+
+# 로컬 지표 청산(source=local)과 TradingView 청산 중 늦게 온 쪽을 무시하는 창
+LOCAL_EXIT_DEDUP_TTL   = float(os.getenv("LOCAL_EXIT_DEDUP_TTL", "120"))
 
 SYMBOL_AMOUNT_JSON = os.getenv("SYMBOL_AMOUNT_JSON", "")
 try:
@@ -41,8 +64,25 @@ app = FastAPI()
 
 INGRESS_LOG: deque = deque(maxlen=200)
 _DEDUP: Dict[str, float] = {}
-_BIZDEDUP: Dict[str, float] = {}
+_BIZDEDUP: Dict[str, float] = AccountLocal()  # 계정별(같은 신호를 계정마다 한 번씩 처리)
 _task_q: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=QUEUE_MAX)
+_SHARED_ID_KEY = "_shared_id"   # 공유 큐 행 id(리더 워커가 처리 완료 후 ack)
+# 통합 라우터(main_all)가 이 앱을 마운트할 때 수신 신호를 자기 큐로 넘기는 싱크(그때는 이 모듈 워커가 안 뜸)
+_QUEUE_SINK: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+
+def set_queue_sink(fn: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]):
+    global _QUEUE_SINK
+    _QUEUE_SINK = fn
+
+# 계정 팬아웃: 신호 1건을 모든 계정에서 동시에 처리
+_FANOUT_POOL = ThreadPoolExecutor(max_workers=max(2, WORKERS * len(account_names())), thread_name_prefix="acct-fanout")
+_ACCT_STATS: Dict[str, Dict[str, Any]] = {
+    n: {"signals": 0, "errors": 0, "lat_ms": deque(maxlen=200), "last": None} for n in account_names()
+}
+_ACCT_STATS_LOCK = threading.Lock()
+
+_READY_EV = threading.Event()
+_WARMUP: Dict[str, Any] = {"ready": False, "started": 0.0, "ms": None, "stages": {}, "errors": {}}
 
 # ─────────────────────────────────────────────────────────────
 # 유틸
@@ -182,51 +222,51 @@ def _coerce_to_dict(x: Any) -> Optional[Dict[str, Any]]:
 def _opposite(side: str) -> str:
     return "short" if side == "long" else "long"
 
-def _preclear_opposite_if_needed(symbol: str, desired_side: str):
+@tracing.traced("main.preclear")
+def _preclear_opposite_if_needed(symbol: str, desired_side: str, positions: Optional[List[Any]] = None) -> bool:
     """
     반대 포지션 보유 시 → reduceOnly 시장가로 즉시 정리 후 진입.
     (Bitget 원웨이/체결타이밍에서 발생하는 side mismatch 방지)
+    positions: 진입 프리페치 스냅샷(없으면 최근 스냅샷). 정리 주문을 냈으면 True(호출부 스냅샷은 낡음)
     """
     if not ENTRY_PRECLEAR:
-        return
+        return False
     try:
         sym = convert_symbol(symbol)
         desired = desired_side.lower()
         opp = _opposite(desired)
 
-        positions = get_open_positions()
+        # 진입 프리페치 스냅샷 재사용, 없으면 최근 스냅샷(POS_SNAPSHOT_TTL 이내)
+        if positions is None:
+            positions = get_positions_snapshot() or []
         # 심볼/반대방향 보유 체크
         opp_pos = None
         for p in positions:
-            if p.get("symbol") == sym and (p.get("side") or "").lower() == opp:
-                if float(p.get("size", 0) or 0) > 0:
-                    opp_pos = p
-                    break
+            if p.symbol == sym and p.side == opp:
+                opp_pos = p
+                break
 
         if not opp_pos:
-            return  # 반대 포지션 없음 → 바로 진입 가능
+            return False  # 반대 포지션 없음 → 바로 진입 가능
 
-        send_telegram(f"🔧 preclear {sym} {opp} size={opp_pos.get('size')}")
+        send_telegram(f"🔧 preclear {sym} {opp} size={opp_pos.size}")
 
         # trader.close_position 는 reduceOnly 시장가 청산 호출
         close_position(sym, side=opp, reason="preclear")
 
-        # 반대 포지션이 사라질 때까지 짧게 폴링
-        for _ in range(max(1, ENTRY_PRECLEAR_RETRY)):
-            time.sleep(max(0.1, ENTRY_PRECLEAR_WAIT))
-            positions = get_open_positions()
-            still = False
-            for p in positions:
-                if p.get("symbol") == sym and (p.get("side") or "").lower() == opp:
-                    if float(p.get("size",0) or 0) > 0:
-                        still = True
-                        break
-            if not still:
-                break
+        # 반대 포지션이 사라질 때까지 대기(거래소 확인 즉시 반환)
+        t0 = time.time()
+        if wait_until_flat(sym, opp, timeout=ENTRY_PRECLEAR_TIMEOUT):
+            if LOG_INGRESS:
+                send_telegram(f"🔧 preclear done {sym} {opp} in {(time.time()-t0)*1000:.0f}ms")
+        else:
+            send_telegram(f"⚠️ preclear timeout {sym} {opp} ({ENTRY_PRECLEAR_TIMEOUT:.1f}s)")
+        return True
 
     except Exception as e:
         # preclear 실패해도 진입은 시도(거래소가 이미 정리했거나, 소량 잔존 등)
         send_telegram(f"⚠️ preclear error {symbol} {desired_side}: {e}")
+        return True
 
 # ─────────────────────────────────────────────────────────────
 # Payload 파서
@@ -291,6 +331,34 @@ async def _parse_any(req: Request) -> Dict[str, Any]:
 # ─────────────────────────────────────────────────────────────
 # 시그널 처리
 # ─────────────────────────────────────────────────────────────
+MASS_EXIT_KEYS = {"massexit", "killswitch", "flatall"}
+
+def _exit_dedup_hit(symbol: str, side: str, local: bool, now: float) -> bool:
+    """로컬/트뷰 중 한쪽이 이미 청산을 '확인'했으면 다른 쪽 신호는 무시 (_BIZDEDUP 공유)"""
+    other = f"exit:{'tv' if local else 'local'}:{symbol}:{side}"
+    return now - _BIZDEDUP.get(other, 0.0) < LOCAL_EXIT_DEDUP_TTL
+
+def _exit_dedup_mark(symbol: str, side: str, local: bool, now: float):
+    """청산이 확인된 뒤에만 기록 → 실패한 청산이 반대쪽(트뷰/로컬) 청산 신호를 막지 않도록"""
+    _BIZDEDUP[f"exit:{'local' if local else 'tv'}:{symbol}:{side}"] = now
+
+def _enqueue_local_signal(sig: Dict[str, Any]):
+    """indicators 엔진 → 웹훅과 같은 큐/워커로 _handle_signal 처리"""
+    INGRESS_LOG.append({"ts": time.time(), "ip": "local", "data": sig})
+    exec_ledger.stamp(sig, exec_ledger.RX_KEY)
+    try:
+        _task_q.put_nowait(sig)
+    except queue.Full:
+        send_telegram("⚠️ queue full → drop local signal: " + json.dumps(sig))
+
+def _run_mass_exit(data: Dict[str, Any], reason: str = "massExit") -> Dict[str, Any]:
+    syms = data.get("symbols")
+    if isinstance(syms, str):
+        syms = [x.strip() for x in syms.split(",") if x.strip()]
+    side = data.get("side") or data.get("direction")
+    side = _infer_side(side, "") if side else None
+    return close_all_positions(reason=reason, symbols=syms or None, side=side or None)
+
 def _handle_signal(data: Any):
     if not isinstance(data, dict):
         dd = _coerce_to_dict(data)
@@ -315,6 +383,10 @@ def _handle_signal(data: Any):
     symbol  = _pick_symbol(data)
     side    = _infer_side(data.get("side") or data.get("direction"), "long")
 
+    # 전체 일괄 청산(심볼 불필요)
+    if _norm_type(typ_raw) in MASS_EXIT_KEYS:
+        _run_mass_exit(data, reason=_norm_type(typ_raw)); return
+
     if not symbol:
         send_telegram("⚠️ symbol 없음: " + json.dumps(data)); return
 
@@ -335,9 +407,18 @@ def _handle_signal(data: Any):
         except: pass
 
     if t == "entry":
-        # [NEW] 반대 포지션 자동 정리 후 진입
-        _preclear_opposite_if_needed(symbol, side)
-        enter_position(symbol, amount, side=side, leverage=leverage); return
+        # 새 포지션 → 이전 포지션의 청산 중복 창 해제
+        for sd in ("long", "short"):
+            _BIZDEDUP.pop(f"exit:local:{symbol}:{sd}", None)
+            _BIZDEDUP.pop(f"exit:tv:{symbol}:{sd}", None)
+        # 반대 포지션 보유 시 단일 왕복 플립(네팅) → 불가하면 기존 preclear 후 진입
+        # 프리페치(포지션/가격/모드/스펙)는 1회만: 플립 판단과 진입이 같은 ctx 공유
+        ctx = pretrade_context(symbol)
+        if reverse_position(symbol, amount, side=side, leverage=leverage, ctx=ctx):
+            return
+        if _preclear_opposite_if_needed(symbol, side, ctx["positions"]):
+            ctx = None   # 반대 포지션을 정리했으면 스냅샷이 낡음 → 진입에서 다시 조회
+        enter_position(symbol, amount, side=side, leverage=leverage, ctx=ctx); return
 
     if t in ("tp1","tp2","tp3"):
         pct = float(os.getenv("TP1_PCT","0.30")) if t=="tp1" else float(os.getenv("TP2_PCT","0.40")) if t=="tp2" else float(os.getenv("TP3_PCT","0.30"))
@@ -345,7 +426,15 @@ def _handle_signal(data: Any):
 
     CLOSE_KEYS = {"stoploss","emaexit","failcut","fullexit","close","exit","liquidation","sl1","sl2","breakeven"}
     if t in CLOSE_KEYS:
-        close_position(symbol, side=side, reason=t); return
+        local = data.get("source") == "local"
+        if _exit_dedup_hit(symbol, side, local, now):
+            return
+        if local:
+            try: send_telegram(f"📐 local {t} {symbol} {side}: {data.get('reason', '')}")
+            except: pass
+        if close_position(symbol, side=side, reason=t):
+            _exit_dedup_mark(symbol, side, local, now)
+        return
 
     if t == "reducebycontracts":
         contracts = _safe_float(data.get("contracts"), 0.0)
@@ -357,15 +446,81 @@ def _handle_signal(data: Any):
 
     send_telegram("❓ 알 수 없는 신호: " + json.dumps(data))
 
+# ─────────────────────────────────────────────────────────────
+# 계정 팬아웃
+# ─────────────────────────────────────────────────────────────
+def _run_for_account(name: str, fn: Callable[[], Any], tag: str) -> Dict[str, Any]:
+    t0 = time.time(); res = None; err = None
+    try:
+        with use_account(name):
+            res = fn()
+    except Exception as e:
+        err = str(e)
+        print(f"[{name}] {tag} error:", e)
+    ms = round((time.time() - t0) * 1000.0, 1)
+    with _ACCT_STATS_LOCK:
+        st = _ACCT_STATS.setdefault(name, {"signals": 0, "errors": 0, "lat_ms": deque(maxlen=200), "last": None})
+        st["signals"] += 1
+        st["errors"] += 1 if err else 0
+        st["lat_ms"].append(ms)
+        st["last"] = {"ts": t0, "tag": tag, "ms": ms, "ok": err is None, "error": err}
+    return {"account": name, "ms": ms, "ok": err is None, "error": err, "result": res}
+
+def _fanout(fn: Callable[[], Any], tag: str) -> List[Dict[str, Any]]:
+    names = account_names()
+    if len(names) == 1:
+        return [_run_for_account(names[0], fn, tag)]
+    futs = [_FANOUT_POOL.submit(tracing.bind(_run_for_account), n, fn, tag) for n in names]
+    out = [f.result() for f in futs]
+    bad = [r for r in out if not r["ok"]]
+    if bad or LOG_INGRESS:
+        try:
+            send_telegram(f"👥 {tag} " + " ".join(f"{r['account']}={'OK' if r['ok'] else 'ERR'}/{r['ms']:.0f}ms" for r in out))
+        except Exception:
+            pass
+    return out
+
+def _signal_type(data: Dict[str, Any]) -> str:
+    typ = data.get("type") or data.get("event") or data.get("action") or data.get("signalType") or ""
+    if isinstance(typ, (list, tuple)):
+        typ = typ[0] if typ else ""
+    t = _norm_type(str(typ or ""))
+    return f"{t}@local" if data.get("source") == "local" else t
+
+def _run_signal(data: Dict[str, Any]):
+    # 이 신호로 나간 주문은 체결 원장에 신호 종류/수신 시각과 함께 기록
+    typ = _signal_type(data)
+    with exec_ledger.signal_scope(data, typ), \
+         tracing.span("signal", **{"signal.type": typ, "bitget.account": current_account_name()}):
+        _handle_signal(dict(data))
+
+def _dispatch(data: Dict[str, Any]):
+    _fanout(lambda: _run_signal(data), str(data.get("type") or data.get("event") or "signal"))
+
+def get_account_stats() -> Dict[str, Any]:
+    out = {}
+    with _ACCT_STATS_LOCK:
+        for n, st in _ACCT_STATS.items():
+            lat = sorted(st["lat_ms"])
+            out[n] = {"signals": st["signals"], "errors": st["errors"], "last": st["last"],
+                      "p50_ms": lat[len(lat) // 2] if lat else None,
+                      "p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else None}
+    return out
+
 # ─────────────────────────────────────────────────────────────
 # 워커/엔드포인트/시작
 # ─────────────────────────────────────────────────────────────
 def _worker_loop(idx: int):
+    # 워밍업 완료(또는 상한 시간)까지 대기 → 첫 신호가 콜드 연결/빈 캐시 비용을 치르지 않도록
+    _READY_EV.wait(WARMUP_GATE_MAX_SEC)
     while True:
+        sid = None
         try:
             data = _task_q.get()
             if data is None:
                 continue
+            if isinstance(data, dict):
+                sid = data.pop(_SHARED_ID_KEY, None)
 
             if isinstance(data, (str, bytes)):
                 try:
@@ -385,7 +540,14 @@ def _worker_loop(idx: int):
                 send_telegram(f"[worker-{idx}] drop: empty dict payload")
                 continue
 
-            _handle_signal(data)
+            t_dq = time.time()
+            exec_ledger.stamp(data, exec_ledger.DQ_KEY, t_dq)
+            # 웹훅 수신 span(_trace)을 이어 받는다. 없으면(로컬 신호 등) 여기서 새 추적
+            with tracing.span("worker", parent=tracing.extract(data), root=True, kind="consumer", worker=idx):
+                t_rx = data.get(exec_ledger.RX_KEY)
+                if isinstance(t_rx, (int, float)):
+                    tracing.record("queue.wait", t_rx, t_dq, **{"queue.size": _task_q.qsize()})
+                _dispatch(data)
 
         except Exception as e:
             try:
@@ -395,27 +557,51 @@ def _worker_loop(idx: int):
             print(f"[worker-{idx}] error: {e} | type={type(data).__name__} | payload={preview[:500]}")
             print(traceback.format_exc())
         finally:
+            if sid is not None:
+                # 공유 큐 신호는 처리(또는 버림)가 끝난 뒤 ack — 도중에 리더가 죽으면 새 리더가 회수해 다시 실행
+                try: shared_state.ack([sid])
+                except Exception as e: print(f"[worker-{idx}] shared ack error: {e}")
             try: _task_q.task_done()
             except: pass
 
 async def _ingest(req: Request):
     now = time.time()
-    try:
-        data = await _parse_any(req)
-    except Exception as e:
-        return {"ok": False, "error": f"bad_payload: {e}"}
-
-    if not isinstance(data, dict):
-        dd = _coerce_to_dict(data)
-        if dd is None:
-            return {"ok": False, "error": "payload_not_dict"}
-        data = dd
-
-    dk = _dedup_key(data)
+    with tracing.span("ingest", root=True, kind="server", **{"url.path": req.url.path}) as sp:
+        try:
+            data = await _parse_any(req)
+        except Exception as e:
+            return {"ok": False, "error": f"bad_payload: {e}"}
+
+        if not isinstance(data, dict):
+            dd = _coerce_to_dict(data)
+            if dd is None:
+                return {"ok": False, "error": "payload_not_dict"}
+            data = dd
+
+        if await _is_dup_async(_dedup_key(data), now):
+            if sp: sp.set(dedup=True)
+            return {"ok": True, "dedup": True}
+        INGRESS_LOG.append({"ts": now, "ip": (req.client.host if req and req.client else "?"), "data": data})
+        exec_ledger.stamp(data, exec_ledger.RX_KEY, now)
+        tracing.inject(data)
+        if sp: sp.set(**{"signal.type": _signal_type(data), "signal.symbol": _pick_symbol(data)})
+        return await _queue_signal_async(data)
+
+def _is_dup(dk: str, now: float) -> bool:
+    if shared_state.SHARED_STATE_ENABLE:
+        # 다른 워커가 받은 같은 신호도 중복으로 본다
+        return not shared_state.claim_once("in:" + dk, DEDUP_TTL)
     if dk in _DEDUP and now - _DEDUP[dk] < DEDUP_TTL:
-        return {"ok": True, "dedup": True}
+        return True
     _DEDUP[dk] = now
-    INGRESS_LOG.append({"ts": now, "ip": (req.client.host if req and req.client else "?"), "data": data})
+    return False
+
+def _queue_signal(data: Dict[str, Any]) -> Dict[str, Any]:
+    if _QUEUE_SINK is not None:
+        return _QUEUE_SINK(data)
+    if shared_state.SHARED_STATE_ENABLE:
+        # 어느 워커가 받든 공유 큐로 → 리더가 꺼내 실행
+        return {"ok": True, "queued": True, "shared_id": shared_state.enqueue(data)}
     try:
         _task_q.put_nowait(data)
     except queue.Full:
@@ -423,6 +609,17 @@ async def _ingest(req: Request):
         return {"ok": False, "queued": False, "reason": "queue_full"}
     return {"ok": True, "queued": True, "qsize": _task_q.qsize()}
 
+# 공유 상태(sqlite BEGIN IMMEDIATE, busy_timeout 대기 가능)는 이벤트 루프 밖에서 — 락 대기가 워커의 모든 요청을 막지 않도록
+async def _is_dup_async(dk: str, now: float) -> bool:
+    if shared_state.SHARED_STATE_ENABLE:
+        return await asyncio.get_running_loop().run_in_executor(None, _is_dup, dk, now)
+    return _is_dup(dk, now)
+
+async def _queue_signal_async(data: Dict[str, Any]) -> Dict[str, Any]:
+    if shared_state.SHARED_STATE_ENABLE and _QUEUE_SINK is None:
+        return await asyncio.get_running_loop().run_in_executor(None, _queue_signal, data)
+    return _queue_signal(data)
+
 app = FastAPI()
 
 @app.get("/")
@@ -439,17 +636,13 @@ async def signal_get(req: Request):
     if not qp:
         return {"ok": False, "error": "no query params"}
     now = time.time()
-    dk = _dedup_key(qp)
-    if dk in _DEDUP and now - _DEDUP[dk] < DEDUP_TTL:
+    if await _is_dup_async(_dedup_key(qp), now):
         return {"ok": True, "dedup": True}
-    _DEDUP[dk] = now
     INGRESS_LOG.append({"ts": now, "ip": (req.client.host if req and req.client else "?"), "data": qp})
-    try:
-        _task_q.put_nowait(qp)
-    except queue.Full:
-        send_telegram("⚠️ queue full → drop signal: " + json.dumps(qp))
-        return {"ok": False, "queued": False, "reason": "queue_full"}
-    return {"ok": True, "queued": True, "qsize": _task_q.qsize()}
+    exec_ledger.stamp(qp, exec_ledger.RX_KEY, now)
+    with tracing.span("ingest", root=True, kind="server", **{"url.path": req.url.path}):
+        tracing.inject(qp)
+        return await _queue_signal_async(qp)
 
 @app.post("/webhook")
 async def webhook(req: Request):
@@ -461,15 +654,35 @@ async def alert(req: Request):
 
 @app.get("/health")
 def health():
-    return {"ok": True, "ingress": len(INGRESS_LOG), "queue": _task_q.qsize(), "workers": WORKERS}
+    out = {"ok": True, "ingress": len(INGRESS_LOG), "queue": _task_q.qsize(), "workers": WORKERS}
+    if _ELECTOR is not None:
+        out["leader"] = _ELECTOR.status()
+        out["shared_queue"] = shared_state.queue_depth()
+    if shm_market.SHM_MARKET_ENABLE:
+        out["shm"] = shm_market.stats()
+    if orderbook.ORDERBOOK_ENABLE:
+        out["orderbook"] = orderbook.stats()
+    if exec_ledger.EXEC_LEDGER_ENABLE:
+        out["execution"] = exec_ledger.summary(recent=0)["stats"]
+    if tracing.TRACE_ENABLE:
+        out["tracing"] = tracing.stats()
+    return out
+
+@app.get("/ready")
+def ready():
+    # 포지션 적재 실패(기본/추가 계정)면 준비 아님 — 워커 게이트(_READY_EV)와 별개
+    seeded = "positions" not in (_WARMUP.get("errors") or {}) and \
+        not any(a.get("error") for a in (_WARMUP.get("accounts") or {}).values())
+    return JSONResponse(dict(_WARMUP), status_code=200 if _READY_EV.is_set() and seeded else 503)
 
 @app.get("/ingress")
 def ingress():
     return list(INGRESS_LOG)[-30:]
 
 @app.get("/positions")
-def positions():
-    return {"positions": get_open_positions()}
+def positions(account: str = ""):
+    with use_account(account or account_names()[0]):
+        return {"positions": [p.to_dict() for p in get_open_positions()]}
 
 @app.get("/queue")
 def queue_size():
@@ -490,20 +703,184 @@ def config():
         "ENTRY_PRECLEAR": ENTRY_PRECLEAR,
         "ENTRY_PRECLEAR_WAIT": ENTRY_PRECLEAR_WAIT,
         "ENTRY_PRECLEAR_RETRY": ENTRY_PRECLEAR_RETRY,
+        "ENTRY_PRECLEAR_TIMEOUT": ENTRY_PRECLEAR_TIMEOUT,
+        "WARMUP_ENABLE": WARMUP_ENABLE,
+        "WARMUP_GATE_MAX_SEC": WARMUP_GATE_MAX_SEC,
+        "INDICATOR_EXIT_ENABLE": indicators.INDICATOR_EXIT_ENABLE,
+        "INDICATOR_TF": indicators.INDICATOR_TF,
+        "INDICATOR_EMA_LEN": indicators.INDICATOR_EMA_LEN,
+        "INDICATOR_ATR_LEN": indicators.INDICATOR_ATR_LEN,
+        "INDICATOR_ATR_MULT": indicators.INDICATOR_ATR_MULT,
+        "INDICATOR_CONFIRM_BARS": indicators.INDICATOR_CONFIRM_BARS,
+        "INDICATOR_RULES": indicators.INDICATOR_RULES,
+        "LOCAL_EXIT_DEDUP_TTL": LOCAL_EXIT_DEDUP_TTL,
+        "ACCOUNTS": account_names(),
+        "SHARED_STATE_ENABLE": shared_state.SHARED_STATE_ENABLE,
+        "SHARED_STATE_DB": shared_state.SHARED_STATE_DB,
+        "LEADER_LEASE_SEC": shared_state.LEADER_LEASE_SEC,
     }
 
 @app.get("/pending")
-def pending():
-    return get_pending_snapshot()
+def pending(account: str = ""):
+    with use_account(account or account_names()[0]):
+        return get_pending_snapshot()
+
+@app.post("/mass-exit")
+async def mass_exit(req: Request):
+    try:
+        data = await _parse_any(req)
+    except Exception:
+        data = {}
+    data = {**dict(req.query_params), **(data or {})}
+    reason = str(data.get("reason") or "massExit")
+    if _ELECTOR is not None and not _ELECTOR.is_leader:
+        # 실행 상태는 리더에만 있으므로 리더에게 넘긴다
+        return {"ok": True, "forwarded": "leader", **(await _queue_signal_async({**data, "type": "massExit"}))}
+    # 워커 큐를 우회해 즉시 실행(이벤트 루프 블로킹 방지), 전 계정 동시
+    res = await asyncio.get_running_loop().run_in_executor(None, lambda: _fanout(lambda: _run_mass_exit(data, reason), reason))
+    return res[0]["result"] if len(res) == 1 else {"accounts": res}
+
+@app.get("/latency")
+def latency(account: str = ""):
+    with use_account(account or account_names()[0]):
+        out = get_entry_latency_snapshot()
+    out["order_batch"] = get_order_batch_stats()
+    return out
+
+@app.get("/execution")
+def execution(account: str = "", symbol: str = "", type: str = "", recent: int = 20):
+    """신호→체결 구간 지연/슬리피지(심볼별·신호종류별). 주문별 원본은 TRADE_LOG_DIR 의 exec-*.jsonl"""
+    return exec_ledger.summary(account, convert_symbol(symbol) if symbol else "", type, recent)
+
+@app.get("/debug/profile")
+def debug_profile(seconds: float = 10.0, hz: float = 50.0, format: str = "collapsed", token: str = "", thread: str = ""):
+    return profiler.handle(seconds, hz, format, token, thread)
+
+@app.get("/drift")
+def drift(account: str = ""):
+    with use_account(account or account_names()[0]):
+        return get_drift_stats()
+
+@app.get("/accounts")
+def accounts():
+    stats = get_account_stats()
+    out = {}
+    for n in account_names():
+        with use_account(n):
+            out[n] = {"fanout": stats.get(n), "entry_latency": get_entry_latency_snapshot(),
+                      "pending": get_pending_snapshot()["counts"]}
+    return {"accounts": out}
+
+@app.get("/indicators")
+def indicators_state():
+    return indicators.get_indicator_snapshot()
+
+@app.get("/orderbook")
+def orderbook_state(symbol: str = "", levels: int = 10):
+    if not symbol:
+        return orderbook.stats()
+    return orderbook.view(convert_symbol(symbol), levels) or {"symbol": convert_symbol(symbol), "synced": False}
+
+def _warm_extra_account() -> int:
+    warm_account_session()
+    positions = fetch_open_positions()
+    if positions is None:
+        raise RuntimeError("positions fetch failed")
+    return seed_local_positions(positions)
+
+def _run_warmup():
+    _WARMUP["started"] = time.time()
+    try:
+        if WARMUP_ENABLE:
+            # 추가 계정은 인증 세션 연결 + 포지션 적재만(시세/계약 캐시는 공용) — 기본 계정 워밍업과 동시에
+            f_acct = [_FANOUT_POOL.submit(_run_for_account, n, _warm_extra_account, "warmup")
+                      for n in account_names()[1:]]
+            with use_account(account_names()[0]):
+                res = warmup()
+                if "positions" in res["errors"]:   # 포지션 미적재로 준비 완료 처리하지 않도록 1회 재시도
+                    rows = fetch_open_positions()
+                    if rows is not None:
+                        res["positions"] = rows
+                        res["errors"].pop("positions", None)
+                seeded = seed_local_positions(res.get("positions") or [])
+            _WARMUP.update({"ms": res["ms"], "stages": res["stages"], "errors": res["errors"],
+                            "positions": len(res.get("positions") or []), "seeded": seeded,
+                            "prices": len(res.get("prices") or {})})
+            if f_acct:
+                _WARMUP["accounts"] = {r["account"]: {"seeded": r["result"], "ms": r["ms"], "error": r["error"]}
+                                       for r in (f.result() for f in f_acct)}
+            send_telegram(
+                f"🔥 warm-up {res['ms']:.0f}ms | " + " ".join(f"{k}={v:.0f}ms" for k, v in res["stages"].items())
+                + (f" | errors={list(res['errors'])}" if res["errors"] else "")
+            )
+    except Exception as e:
+        _WARMUP["errors"] = {"warmup": str(e)}
+        print("warmup error:", e)
+    finally:
+        if _WARMUP["ms"] is None:
+            _WARMUP["ms"] = round((time.time() - _WARMUP["started"]) * 1000.0, 1)
+        _WARMUP["ready"] = True
+        _READY_EV.set()
+
+# ─────────────────────────────────────────────────────────────
+# 다중 워커(SHARED_STATE_ENABLE=1): 모든 워커가 웹훅을 받아 공유 큐에 넣고,
+# 리더 1개만 큐를 비워 실행 + 워치독/리컨실러/용량가드를 돌린다(실행 상태는 리더 프로세스에만 존재).
+# ─────────────────────────────────────────────────────────────
+_ELECTOR: Optional[shared_state.LeaderElector] = None
+
+def _shared_pump():
+    _READY_EV.wait(WARMUP_GATE_MAX_SEC)
+    last_gc = 0.0
+    while True:
+        try:
+            now = time.time()
+            if now - last_gc >= 30.0:
+                last_gc = now
+                shared_state.purge_expired()
+                shared_state.release_stale_claims()
+            rows = shared_state.claim_signals(50)
+            for i, body in rows:
+                if isinstance(body, dict):
+                    body[_SHARED_ID_KEY] = i   # 워커가 _dispatch 를 마친 뒤 ack
+                    _task_q.put(body)
+                else:   # id 를 실을 수 없는 본문(문자열 등)은 기존대로 넣고 바로 ack
+                    _task_q.put(body)
+                    shared_state.ack([i])
+            if not rows:
+                time.sleep(shared_state.SHARED_QUEUE_POLL)
+        except Exception as e:
+            print("shared pump error:", e)
+            time.sleep(1.0)
+
+def _start_engine():
+    """실행 엔진(신호 실행 + 백그라운드 루프). 단일 워커면 기동 시, 다중 워커면 리더 당선 시 1회"""
+    indicators.set_signal_sink(_enqueue_local_signal)
+    orderbook.start()
+    for name in account_names():
+        with use_account(name):
+            start_capacity_guard()
+            start_watchdogs()
+            start_reconciler()
+    if _ELECTOR is not None:
+        # 임대가 넘어왔다 = 이전 리더는 죽었거나 종료 중 → 그 리더가 쥐고 있던 신호를 즉시 회수
+        n = shared_state.release_stale_claims(0)
+        if n:
+            print(f"leader takeover: released {n} claimed signals")
+        threading.Thread(target=_shared_pump, daemon=True, name="shared-pump").start()
+        send_telegram(f"👑 leader {shared_state.WORKER_ID}")
 
 @app.on_event("startup")
 def on_startup():
+    global _ELECTOR
+    threading.Thread(target=_run_warmup, daemon=True, name="warmup").start()
     for i in range(WORKERS):
         t = threading.Thread(target=_worker_loop, args=(i,), daemon=True, name=f"signal-worker-{i}")
         t.start()
-    start_capacity_guard()
-    start_watchdogs()
-    start_reconciler()
+    if shared_state.SHARED_STATE_ENABLE:
+        _ELECTOR = shared_state.LeaderElector("engine", _start_engine)
+        _ELECTOR.start()
+    else:
+        _start_engine()
     try:
         threading.Thread(
             target=send_telegram,
@@ -0,0 +1,236 @@
+# main_all.py
+# ------------------------------------------------------------
+# 선물 + 현물 통합 라우터 (프로세스 1개)
+# - 수신/파싱/중복제거/큐/워커를 하나로 두고 신호마다 엔진(futures|spot)을 골라 실행
+#   · 경로: /futures/signal, /spot/signal (webhook/alert 동일)
+#   · 페이로드: market|engine|exchange|product = "spot" | "futures" (없으면 UNIFIED_DEFAULT_ENGINE)
+# - api.bitget.com 연결 풀(bitget_api.SESSION)과 텔레그램 outbox 공유 → 서비스 2개 대비 메모리/폴링 절반
+# - 엔진별 조회 엔드포인트는 /futures/*, /spot/* 에 기존 앱을 그대로 마운트
+#   · 마운트된 선물 앱의 수신 경로(GET /futures/signal 등)는 set_queue_sink 로 이 큐에 연결(하위 앱 큐는 소비자 없음)
+# - 실행 상태가 프로세스 안에만 있으므로 gunicorn --workers 1 로 띄운다
+#   start: gunicorn main_all:app -k uvicorn.workers.UvicornWorker --workers 1
+# ------------------------------------------------------------
+import os
+import time
+import json
+import queue
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+import bitget_api
+import bitget_api_spot
+import exec_ledger
+import tracing
+import profiler
+import indicators
+import main as fut
+import main_spot as spot
+from telegram_bot import send_telegram, get_outbox_stats
+
+UNIFIED_DEFAULT_ENGINE = os.getenv("UNIFIED_DEFAULT_ENGINE", "futures").strip().lower()
+UNIFIED_WORKERS        = int(os.getenv("UNIFIED_WORKERS", str(max(fut.WORKERS, spot.WORKERS))))
+UNIFIED_QUEUE_MAX      = int(os.getenv("UNIFIED_QUEUE_MAX", str(fut.QUEUE_MAX)))
+
+_ENGINE_KEYS = ("market", "engine", "exchange", "product")
+_ALIASES = {"spot": "spot", "futures": "futures", "future": "futures", "perp": "futures",
+            "swap": "futures", "mix": "futures", "usdt-futures": "futures", "umcbl": "futures"}
+
+# 엔진별 실행 함수: dict 신호 1개를 받아 처리 (선물은 계정 팬아웃 포함)
+ENGINES: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "futures": fut._dispatch,
+    "spot": spot._handle_signal,
+}
+
+# ----------------------- 앱 상태 -----------------------
+app = FastAPI()
+
+INGRESS_LOG: deque = deque(maxlen=200)
+_task_q: "queue.Queue" = queue.Queue(maxsize=UNIFIED_QUEUE_MAX)
+
+_STATS_LOCK = threading.Lock()
+_STATS: Dict[str, Dict[str, Any]] = {
+    e: {"queued": 0, "done": 0, "errors": 0, "dropped": 0, "last": 0.0,
+        "wait_ms": deque(maxlen=200), "run_ms": deque(maxlen=200)}
+    for e in ENGINES
+}
+
+
+# ----------------------- 라우팅 -----------------------
+def _route(data: Dict[str, Any], hint: Optional[str] = None) -> str:
+    if hint in ENGINES:
+        return hint
+    for k in _ENGINE_KEYS:
+        v = _ALIASES.get(str(data.get(k) or "").strip().lower())
+        if v:
+            return v
+    return UNIFIED_DEFAULT_ENGINE if UNIFIED_DEFAULT_ENGINE in ENGINES else "futures"
+
+
+def _put(engine: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        _task_q.put_nowait((engine, data, time.time()))
+    except queue.Full:
+        with _STATS_LOCK:
+            _STATS[engine]["dropped"] += 1
+        send_telegram(f"⚠️ queue full → drop {engine} signal: " + json.dumps(data))
+        return {"ok": False, "queued": False, "engine": engine, "reason": "queue_full"}
+    with _STATS_LOCK:
+        _STATS[engine]["queued"] += 1
+    return {"ok": True, "queued": True, "engine": engine, "qsize": _task_q.qsize()}
+
+
+def _futures_sink(data: Dict[str, Any]) -> Dict[str, Any]:
+    """마운트된 선물 앱이 자체 수신한 신호(수신 기록/중복제거/스탬프는 그쪽에서 끝남)"""
+    return _put("futures", data)
+
+
+def _local_futures_signal(sig: Dict[str, Any]):
+    """indicators 엔진의 로컬 청산 신호도 같은 큐/워커로"""
+    INGRESS_LOG.append({"ts": time.time(), "ip": "local", "engine": "futures", "data": sig})
+    exec_ledger.stamp(sig, exec_ledger.RX_KEY)
+    _put("futures", sig)
+
+
+async def _ingest(req: Request, hint: Optional[str] = None):
+    now = time.time()
+    with tracing.span("ingest", root=True, kind="server", **{"url.path": req.url.path}) as sp:
+        try:
+            data = await fut._parse_any(req)   # 선물 파서가 현물 포맷의 상위집합
+        except Exception as e:
+            return {"ok": False, "error": f"bad_payload: {e}"}
+        if not isinstance(data, dict):
+            data = fut._coerce_to_dict(data)
+            if data is None:
+                return {"ok": False, "error": "payload_not_dict"}
+        engine = _route(data, hint)
+        if sp: sp.set(engine=engine)
+        # 엔진을 키에 섞어 /futures 와 /spot 에 같은 본문이 와도 각각 실행
+        if await fut._is_dup_async(engine + ":" + fut._dedup_key(data), now):
+            return {"ok": True, "dedup": True, "engine": engine}
+        INGRESS_LOG.append({"ts": now, "ip": (req.client.host if req and req.client else "?"),
+                            "engine": engine, "data": data})
+        exec_ledger.stamp(data, exec_ledger.RX_KEY, now)
+        tracing.inject(data)
+        return _put(engine, data)
+
+
+# ----------------------- 워커 -----------------------
+def _worker_loop(idx: int):
+    fut._READY_EV.wait(fut.WARMUP_GATE_MAX_SEC)
+    spot._READY_EV.wait(spot.WARMUP_GATE_MAX_SEC)
+    while True:
+        engine, data, t_in = _task_q.get()
+        t0 = time.time()
+        err = False
+        exec_ledger.stamp(data, exec_ledger.DQ_KEY, t0)
+        try:
+            with tracing.span("worker", parent=tracing.extract(data), root=True, kind="consumer",
+                              worker=idx, engine=engine):
+                tracing.record("queue.wait", t_in, t0, **{"queue.size": _task_q.qsize()})
+                ENGINES[engine](data)
+        except Exception as e:
+            err = True
+            print(f"[worker-{idx}] {engine} error: {e} | payload={str(data)[:500]}")
+        finally:
+            t1 = time.time()
+            with _STATS_LOCK:
+                st = _STATS[engine]
+                st["done"] += 1
+                st["errors"] += int(err)
+                st["last"] = t1
+                st["wait_ms"].append((t0 - t_in) * 1000.0)
+                st["run_ms"].append((t1 - t0) * 1000.0)
+            _task_q.task_done()
+
+
+def _pct(xs, q: float) -> Optional[float]:
+    if not xs:
+        return None
+    s = sorted(xs)
+    return round(s[min(len(s) - 1, int(len(s) * q))], 1)
+
+
+def get_engine_stats() -> Dict[str, Any]:
+    out = {}
+    with _STATS_LOCK:
+        for e, st in _STATS.items():
+            out[e] = {k: st[k] for k in ("queued", "done", "errors", "dropped", "last")}
+            out[e].update({"wait_p50_ms": _pct(st["wait_ms"], 0.5), "wait_p95_ms": _pct(st["wait_ms"], 0.95),
+                           "run_p50_ms": _pct(st["run_ms"], 0.5), "run_p95_ms": _pct(st["run_ms"], 0.95)})
+    return out
+
+
+# ----------------------- FastAPI -----------------------
+@app.get("/")
+def root():
+    return {"ok": True, "service": "unified", "engines": list(ENGINES)}
+
+@app.post("/signal")
+async def signal(req: Request):
+    return await _ingest(req)
+
+@app.post("/webhook")
+async def webhook(req: Request):
+    return await _ingest(req)
+
+@app.post("/alert")
+async def alert(req: Request):
+    return await _ingest(req)
+
+def _add_engine_hooks(engine: str):
+    async def hook(req: Request):
+        return await _ingest(req, engine)
+    for p in ("signal", "webhook", "alert"):
+        app.add_api_route(f"/{engine}/{p}", hook, methods=["POST"], name=f"{engine}_{p}")
+
+for _e in ENGINES:
+    _add_engine_hooks(_e)
+
+@app.get("/health")
+def health():
+    return {"ok": True, "ingress": len(INGRESS_LOG), "queue": _task_q.qsize(), "workers": UNIFIED_WORKERS,
+            "engines": get_engine_stats(), "telegram": get_outbox_stats(), "tracing": tracing.stats()}
+
+@app.get("/ready")
+def ready():
+    ok = fut._READY_EV.is_set() and spot._READY_EV.is_set()
+    return JSONResponse({"futures": dict(fut._WARMUP), "spot": dict(spot._WARMUP)}, status_code=200 if ok else 503)
+
+@app.get("/ingress")
+def ingress():
+    return list(INGRESS_LOG)[-30:]
+
+@app.get("/debug/profile")
+def debug_profile(seconds: float = 10.0, hz: float = 50.0, format: str = "collapsed", token: str = "", thread: str = ""):
+    return profiler.handle(seconds, hz, format, token, thread)
+
+@app.get("/engines")
+def engines():
+    return get_engine_stats()
+
+# 엔진별 조회(/futures/positions, /spot/balances ...) — 위 명시 경로가 먼저 매칭된다
+# 가려지지 않은 선물 앱 수신 경로(GET /futures/signal, 비리더 /mass-exit 전달)는 이 큐로
+fut.set_queue_sink(_futures_sink)
+app.mount("/futures", fut.app)
+app.mount("/spot", spot.app)
+
+
+# ----------------------- 스타트업 -----------------------
+@app.on_event("startup")
+def on_startup():
+    bitget_api_spot.set_http_session(bitget_api.SESSION)
+    threading.Thread(target=fut._run_warmup, daemon=True, name="warmup").start()
+    threading.Thread(target=spot._run_warmup, daemon=True, name="spot-warmup").start()
+    for i in range(UNIFIED_WORKERS):
+        threading.Thread(target=_worker_loop, args=(i,), daemon=True, name=f"signal-worker-{i}").start()
+    fut._start_engine()
+    indicators.set_signal_sink(_local_futures_signal)
+    spot._start_engine()
+    try:
+        threading.Thread(target=send_telegram, args=("✅ unified FastAPI up (futures + spot)",), daemon=True).start()
+    except Exception:
+        pass
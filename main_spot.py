@@ -12,6 +12,7 @@ from collections import deque
 from typing import Dict, Any
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
 # Telegram (spot 전용 모듈 우선)
 try:
@@ -23,13 +24,17 @@ except Exception:
         def send_telegram(msg: str):
             print("[TG]", msg)
 
+import shm_market
+import profiler
+
 # Bitget Spot 헬퍼
-from bitget_api_spot import convert_symbol, get_spot_balances
+from bitget_api_spot import convert_symbol, get_spot_balances, warmup_spot, get_http_stats, get_balance_stats
 
 # 트레이더(실거래 동작)
 from trader_spot import (
     enter_spot, take_partial_spot, close_spot,
-    start_capacity_guard, start_auto_stoploss
+    start_capacity_guard, start_auto_stoploss, seed_holdings,
+    start_drift_reconciler, get_drift_stats, get_recent_fills, get_auto_sl_stats,
 )
 
 # ----------------------- 환경변수 -----------------------
@@ -59,6 +64,9 @@ AUTO_SL_PCT       = _auto_sl_pct_env if _auto_sl_pct_env < 0 else -abs(_auto_sl_
 AUTO_SL_POLL_SEC  = float(os.getenv("AUTO_SL_POLL_SEC", "3"))
 AUTO_SL_GRACE_SEC = float(os.getenv("AUTO_SL_GRACE_SEC", "5"))
 
+WARMUP_ENABLE       = os.getenv("WARMUP_ENABLE", "1") == "1"
+WARMUP_GATE_MAX_SEC = float(os.getenv("WARMUP_GATE_MAX_SEC", "15"))
+
 # ----------------------- 앱 상태 -----------------------
 app = FastAPI()
 
@@ -68,6 +76,9 @@ _BIZDEDUP: Dict[str, float] = {}
 
 _task_q: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=QUEUE_MAX)
 
+_READY_EV = threading.Event()
+_WARMUP: Dict[str, Any] = {"ready": False, "started": 0.0, "ms": None, "stages": {}, "errors": {}}
+
 
 # ----------------------- 유틸 -----------------------
 def _dedup_key(d: Dict[str, Any]) -> str:
@@ -174,6 +185,8 @@ def _handle_signal(data: Dict[str, Any]):
 
 
 def _worker_loop(idx: int):
+    # 워밍업 완료(또는 상한 시간)까지 대기
+    _READY_EV.wait(WARMUP_GATE_MAX_SEC)
     while True:
         try:
             data = _task_q.get()
@@ -228,15 +241,42 @@ async def alert(req: Request):
 
 @app.get("/health")
 def health():
-    return {"ok": True, "ingress": len(INGRESS_LOG), "queue": _task_q.qsize(), "workers": WORKERS}
+    out = {"ok": True, "ingress": len(INGRESS_LOG), "queue": _task_q.qsize(), "workers": WORKERS}
+    if shm_market.SHM_MARKET_ENABLE:
+        out["shm"] = shm_market.stats()
+    return out
+
+@app.get("/ready")
+def ready():
+    return JSONResponse(dict(_WARMUP), status_code=200 if _READY_EV.is_set() else 503)
 
 @app.get("/ingress")
 def ingress():
     return list(INGRESS_LOG)[-30:]
 
+@app.get("/debug/profile")
+def debug_profile(seconds: float = 10.0, hz: float = 50.0, format: str = "collapsed", token: str = "", thread: str = ""):
+    return profiler.handle(seconds, hz, format, token, thread)
+
+@app.get("/drift")
+def drift():
+    return get_drift_stats()
+
+@app.get("/autosl")
+def autosl():
+    return get_auto_sl_stats()
+
+@app.get("/fills")
+def fills():
+    return {"fills": get_recent_fills()}
+
+@app.get("/http")
+def http_stats():
+    return get_http_stats()
+
 @app.get("/balances")
 def balances():
-    return {"balances": get_spot_balances(force=True)}
+    return {"balances": get_spot_balances(force=True), "stats": get_balance_stats()}
 
 @app.get("/config")
 def config():
@@ -257,16 +297,43 @@ def config():
 
 
 # ----------------------- 스타트업 -----------------------
+def _run_warmup():
+    _WARMUP["started"] = time.time()
+    try:
+        if WARMUP_ENABLE:
+            res = warmup_spot()
+            seeded = seed_holdings(res.get("held") or {})
+            _WARMUP.update({"ms": res["ms"], "stages": res["stages"], "errors": res["errors"],
+                            "held": len(res.get("held") or {}), "seeded": seeded})
+            send_telegram(
+                f"[SPOT] warm-up {res['ms']:.0f}ms | " + " ".join(f"{k}={v:.0f}ms" for k, v in res["stages"].items())
+                + (f" | errors={list(res['errors'])}" if res["errors"] else "")
+            )
+    except Exception as e:
+        _WARMUP["errors"] = {"warmup": str(e)}
+        print("[spot] warmup error:", e)
+    finally:
+        if _WARMUP["ms"] is None:
+            _WARMUP["ms"] = round((time.time() - _WARMUP["started"]) * 1000.0, 1)
+        _WARMUP["ready"] = True
+        _READY_EV.set()
+
+def _start_engine():
+    """백그라운드 루프(용량가드 + 자동손절 + 드리프트). 통합 앱(main_all)도 이걸로 기동"""
+    start_capacity_guard()
+    start_auto_stoploss()
+    start_drift_reconciler()
+
 @app.on_event("startup")
 def on_startup():
+    threading.Thread(target=_run_warmup, daemon=True, name="spot-warmup").start()
+
     # 워커
     for i in range(WORKERS):
         t = threading.Thread(target=_worker_loop, args=(i,), daemon=True, name=f"spot-worker-{i}")
         t.start()
 
-    # 용량가드 + 자동손절
-    start_capacity_guard()
-    start_auto_stoploss()
+    _start_engine()
 
     # 기동 알림
     try:
@@ -0,0 +1,393 @@
+# orderbook.py
+# ------------------------------------------------------------
+# 심볼별 로컬 L2 호가창 미러 (선물 공용 웹소켓 books 채널)
+# - 스냅샷 + 증분(update) 적용, 증분마다 CRC32 체크섬(상위 25호가) 검증 → 불일치 시 재구독으로 재동기화
+# - 최우선 호가/중간가/스프레드/밴드별 누적 깊이는 적용 시 계산해 두고 조회는 필드 읽기만(O(1))
+#   · 밴드(ORDERBOOK_BANDS_PCT) 밖의 임의 % 깊이, 시장가 체결 추정(impact)은 해당 구간만 순회
+# - 웹소켓 클라이언트(websocket-client, requirements 포함)가 없거나 ORDERBOOK_WS=0 이면 REST 스냅샷 폴링으로 대체
+#   · REST 는 심볼당 요청 1회/주기라 레이트리밋을 먹으므로 ORDERBOOK_REST_MAX_SYMBOLS 로 작게 제한하고 기동 시 경고
+# - 대상: 보유 포지션(워치독이 set_held 로 계정별 갱신) + ORDERBOOK_SYMBOLS
+# ------------------------------------------------------------
+import os
+import json
+import time
+import zlib
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import websocket  # websocket-client (선택)
+except Exception:
+    websocket = None
+
+ORDERBOOK_ENABLE      = os.getenv("ORDERBOOK_ENABLE", "0") == "1"
+ORDERBOOK_WS          = os.getenv("ORDERBOOK_WS", "1") == "1"
+ORDERBOOK_WS_URL      = os.getenv("ORDERBOOK_WS_URL", "wss://ws.bitget.com/v2/ws/public")
+ORDERBOOK_INST_TYPE   = os.getenv("ORDERBOOK_INST_TYPE", "USDT-FUTURES")
+ORDERBOOK_CHANNEL     = os.getenv("ORDERBOOK_CHANNEL", "books")
+ORDERBOOK_SYMBOLS     = [s.strip().upper() for s in os.getenv("ORDERBOOK_SYMBOLS", "").split(",") if s.strip()]
+ORDERBOOK_MAX_SYMBOLS = int(os.getenv("ORDERBOOK_MAX_SYMBOLS", "50"))
+ORDERBOOK_BANDS_PCT   = [float(x) for x in os.getenv("ORDERBOOK_BANDS_PCT", "0.1,0.5,1,2").split(",") if x.strip()]
+ORDERBOOK_STALE_SEC   = float(os.getenv("ORDERBOOK_STALE_SEC", "5"))
+ORDERBOOK_POLL_SEC    = float(os.getenv("ORDERBOOK_POLL_SEC", "1.0"))   # REST 폴백 주기
+ORDERBOOK_REST_MAX_SYMBOLS = int(os.getenv("ORDERBOOK_REST_MAX_SYMBOLS", "5"))   # REST 폴백 시 심볼 상한
+ORDERBOOK_PING_SEC    = 25.0
+CHECKSUM_LEVELS       = 25
+
+Level = Tuple[str, str]  # (price, size) 원문 문자열 — 체크섬은 원문 그대로 계산해야 한다
+
+
+def _crc32_signed(s: str) -> int:
+    v = zlib.crc32(s.encode())
+    return v - (1 << 32) if v >= (1 << 31) else v
+
+
+class L2Book:
+    __slots__ = ("symbol", "lock", "_b", "_a", "_bk", "_ak", "top", "bands", "ts", "seq", "synced")
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.lock = threading.Lock()
+        self._b: Dict[float, Tuple[str, str, float]] = {}   # px → (px원문, sz원문, sz)
+        self._a: Dict[float, Tuple[str, str, float]] = {}
+        self._bk: List[float] = []   # -px 오름차순 → [0] 이 최우선 매수
+        self._ak: List[float] = []   # px 오름차순 → [0] 이 최우선 매도
+        # (bid, ask, bid_sz, ask_sz, mid, spread_bps) — 튜플 1개로 통째 교체(읽는 쪽이 찢긴 값을 보지 않게)
+        self.top: Optional[Tuple[float, float, float, float, float, float]] = None
+        self.bands: Dict[float, Tuple[float, float]] = {}   # pct → (매수측 USDT, 매도측 USDT)
+        self.ts = 0.0
+        self.seq = 0
+        self.synced = False
+
+    @staticmethod
+    def _set(side: Dict[float, Tuple[str, str, float]], keys: List[float], neg: bool, px_s: str, sz_s: str):
+        px, sz = float(px_s), float(sz_s)
+        k = -px if neg else px
+        if sz <= 0:
+            if side.pop(px, None) is not None:
+                i = bisect_left(keys, k)
+                if i < len(keys) and keys[i] == k:
+                    del keys[i]
+            return
+        if px not in side:
+            insort(keys, k)
+        side[px] = (px_s, sz_s, sz)
+
+    def _apply(self, bids: Iterable[Level], asks: Iterable[Level]):
+        for row in bids or ():
+            self._set(self._b, self._bk, True, str(row[0]), str(row[1]))
+        for row in asks or ():
+            self._set(self._a, self._ak, False, str(row[0]), str(row[1]))
+
+    def checksum(self) -> int:
+        parts: List[str] = []
+        bk, ak = self._bk, self._ak
+        for i in range(CHECKSUM_LEVELS):
+            if i < len(bk):
+                b = self._b[-bk[i]]; parts.append(b[0]); parts.append(b[1])
+            if i < len(ak):
+                a = self._a[ak[i]]; parts.append(a[0]); parts.append(a[1])
+        return _crc32_signed(":".join(parts))
+
+    def _refresh(self, ts: float):
+        if not self._bk or not self._ak:
+            self.top, self.bands = None, {}
+            self.ts = ts
+            return
+        bid, ask = -self._bk[0], self._ak[0]
+        mid = (bid + ask) / 2.0
+        self.top = (bid, ask, self._b[bid][2], self._a[ask][2], mid, (ask - bid) / mid * 1e4)
+        self.bands = {p: (self._walk_bids(mid * (1.0 - p / 100.0)), self._walk_asks(mid * (1.0 + p / 100.0)))
+                      for p in ORDERBOOK_BANDS_PCT}
+        self.ts = ts
+
+    def _walk_bids(self, floor_px: float) -> float:
+        tot = 0.0
+        for k in self._bk:
+            px = -k
+            if px < floor_px:
+                break
+            tot += px * self._b[px][2]
+        return tot
+
+    def _walk_asks(self, cap_px: float) -> float:
+        tot = 0.0
+        for px in self._ak:
+            if px > cap_px:
+                break
+            tot += px * self._a[px][2]
+        return tot
+
+    def snapshot(self, bids: Iterable[Level], asks: Iterable[Level], ts: Optional[float] = None, seq: int = 0):
+        with self.lock:
+            self._b.clear(); self._a.clear(); self._bk.clear(); self._ak.clear()
+            self._apply(bids, asks)
+            self.seq = int(seq or 0)
+            self.synced = True
+            self._refresh(ts or time.time())
+
+    def update(self, bids: Iterable[Level], asks: Iterable[Level], checksum: Optional[int] = None,
+               ts: Optional[float] = None, seq: int = 0) -> bool:
+        """
+        증분 적용. 체크섬 불일치일 때만 False (호출측이 재동기화)
+        미동기 상태(스냅샷 대기 중)의 증분은 조용히 버리고 True — 재동기화는 이미 예약돼 있어 다시 걸면 루프가 된다
+        """
+        with self.lock:
+            if not self.synced:
+                return True
+            seq = int(seq or 0)
+            if seq and self.seq and seq <= self.seq:
+                return True   # 중복/역행 메시지 무시
+            self._apply(bids, asks)
+            self.seq = seq or self.seq
+            if checksum is not None and self.checksum() != int(checksum):
+                self.synced = False
+                return False
+            self._refresh(ts or time.time())
+            return True
+
+    def fresh(self, max_age: Optional[float] = None) -> bool:
+        return self.synced and self.top is not None and \
+            (time.time() - self.ts) <= (ORDERBOOK_STALE_SEC if max_age is None else max_age)
+
+    def depth_within(self, pct: float) -> Tuple[float, float]:
+        """mid ± pct% 안의 누적 (매수측, 매도측) USDT. 설정 밴드면 O(1)"""
+        hit = self.bands.get(float(pct))
+        if hit is not None:
+            return hit
+        with self.lock:
+            if self.top is None:
+                return 0.0, 0.0
+            mid = self.top[4]
+            return self._walk_bids(mid * (1.0 - pct / 100.0)), self._walk_asks(mid * (1.0 + pct / 100.0))
+
+    def impact(self, side: str, notional: float) -> Optional[Dict[str, float]]:
+        """시장가 notional(USDT) 체결 추정: 평균가/최악가/미끄러짐(bps, mid 대비)/호가로 채운 금액"""
+        buy = str(side).lower() in ("buy", "long", "open_long")
+        with self.lock:
+            if self.top is None:
+                return None
+            mid = self.top[4]
+            keys, book = (self._ak, self._a) if buy else (self._bk, self._b)
+            left, cost, qty, worst = float(notional), 0.0, 0.0, 0.0
+            for k in keys:
+                px = k if buy else -k
+                take = min(left, px * book[px][2])
+                cost += take; qty += take / px; worst = px; left -= take
+                if left <= 1e-12:
+                    break
+        if qty <= 0:
+            return None
+        vwap = cost / qty
+        return {"vwap": vwap, "worst": worst, "filled": cost, "slip_bps": abs(vwap - mid) / mid * 1e4}
+
+    def view(self, levels: int = 10) -> Dict[str, Any]:
+        with self.lock:
+            bids = [[-k, self._b[-k][2]] for k in self._bk[:levels]]
+            asks = [[k, self._a[k][2]] for k in self._ak[:levels]]
+        top = self.top
+        return {"symbol": self.symbol, "synced": self.synced, "ts": self.ts, "seq": self.seq,
+                "bid": top[0] if top else None, "ask": top[1] if top else None,
+                "mid": top[4] if top else None, "spread_bps": round(top[5], 2) if top else None,
+                "bands": {str(p): {"bid_usdt": round(b, 2), "ask_usdt": round(a, 2)} for p, (b, a) in self.bands.items()},
+                "bids": bids, "asks": asks}
+
+
+# ----------------------- 레지스트리 -----------------------
+_BOOKS: Dict[str, L2Book] = {}
+_LOCK = threading.Lock()
+_HELD: Dict[str, set] = {}            # owner(계정) → 보유 심볼
+_RESYNC: set = set()
+_FETCH: Optional[Callable[[str], Optional[Tuple[List[Level], List[Level]]]]] = None
+_STATS: Dict[str, Any] = {"mode": None, "snapshots": 0, "updates": 0, "dropped": 0, "checksum_fail": 0, "resyncs": 0,
+                          "ws_connects": 0, "ws_errors": 0, "rest_errors": 0, "last_msg": 0.0}
+_STARTED = False
+
+
+def set_snapshot_fetcher(fn: Callable[[str], Optional[Tuple[List[Level], List[Level]]]]):
+    """REST 스냅샷 함수(symbol → (bids, asks)) 등록 — HTTP 는 bitget_api 쪽에 둔다"""
+    global _FETCH
+    _FETCH = fn
+
+
+def set_held(symbols: Iterable[str], owner: str = "main"):
+    with _LOCK:
+        _HELD[owner] = {s for s in symbols if s}
+
+
+def _wanted() -> List[str]:
+    with _LOCK:
+        want = set(ORDERBOOK_SYMBOLS)
+        for s in _HELD.values():
+            want |= s
+    cap = ORDERBOOK_REST_MAX_SYMBOLS if _STATS["mode"] == "rest" else ORDERBOOK_MAX_SYMBOLS
+    return sorted(want)[:max(0, cap)]
+
+
+def _book(symbol: str) -> L2Book:
+    b = _BOOKS.get(symbol)
+    if b is None:
+        with _LOCK:
+            b = _BOOKS.get(symbol)
+            if b is None:
+                b = _BOOKS[symbol] = L2Book(symbol)
+    return b
+
+
+def get(symbol: str, max_age: Optional[float] = None) -> Optional[L2Book]:
+    b = _BOOKS.get(symbol)
+    return b if b is not None and b.fresh(max_age) else None
+
+
+def best(symbol: str, max_age: Optional[float] = None) -> Optional[Tuple[float, float]]:
+    b = get(symbol, max_age)
+    top = b.top if b else None
+    return (top[0], top[1]) if top else None
+
+
+def mid(symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+    b = get(symbol, max_age)
+    top = b.top if b else None
+    return top[4] if top else None
+
+
+def spread_bps(symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+    b = get(symbol, max_age)
+    top = b.top if b else None
+    return top[5] if top else None
+
+
+def depth_within(symbol: str, pct: float, max_age: Optional[float] = None) -> Optional[Tuple[float, float]]:
+    b = get(symbol, max_age)
+    return b.depth_within(pct) if b else None
+
+
+def impact(symbol: str, side: str, notional: float, max_age: Optional[float] = None) -> Optional[Dict[str, float]]:
+    b = get(symbol, max_age)
+    return b.impact(side, notional) if b else None
+
+
+def view(symbol: str, levels: int = 10) -> Optional[Dict[str, Any]]:
+    b = _BOOKS.get(symbol)
+    return b.view(levels) if b else None
+
+
+def stats() -> Dict[str, Any]:
+    now = time.time()
+    books = list(_BOOKS.values())
+    return dict(_STATS, enabled=ORDERBOOK_ENABLE, wanted=_wanted(), books=len(books),
+                synced=sum(1 for b in books if b.synced),
+                stale=[b.symbol for b in books if b.synced and now - b.ts > ORDERBOOK_STALE_SEC])
+
+
+# ----------------------- 메시지 적용 -----------------------
+def on_message(msg: Dict[str, Any]) -> bool:
+    """books 채널 메시지 1건 적용. 체크섬 불일치면 재동기화 예약 후 False"""
+    arg = msg.get("arg") or {}
+    sym = str(arg.get("instId") or "").upper()
+    action = msg.get("action")
+    if not sym or action not in ("snapshot", "update"):
+        return True
+    b = _book(sym)
+    ok = True
+    ts = time.time()   # 신선도는 로컬 수신 시각 기준(거래소 시계 오차 무시)
+    for d in msg.get("data") or []:
+        if action == "snapshot":
+            b.snapshot(d.get("bids"), d.get("asks"), ts, d.get("seq") or 0)
+            _STATS["snapshots"] += 1
+            continue
+        if not b.synced:
+            _STATS["dropped"] += 1   # 스냅샷 대기 중 증분
+            continue
+        if not b.update(d.get("bids"), d.get("asks"), d.get("checksum"), ts, d.get("seq") or 0):
+            _STATS["checksum_fail"] += 1
+            with _LOCK:
+                _RESYNC.add(sym)
+            ok = False
+            break
+        _STATS["updates"] += 1
+    _STATS["last_msg"] = time.time()
+    return ok
+
+
+# ----------------------- 피더 -----------------------
+def _arg(sym: str) -> Dict[str, str]:
+    return {"instType": ORDERBOOK_INST_TYPE, "channel": ORDERBOOK_CHANNEL, "instId": sym}
+
+
+def _ws_loop():
+    backoff = 1.0
+    while True:
+        subscribed: set = set()
+        try:
+            ws = websocket.create_connection(ORDERBOOK_WS_URL, timeout=1.0)
+            _STATS["ws_connects"] += 1
+            backoff, last_ping = 1.0, time.time()
+            while True:
+                want = set(_wanted())
+                with _LOCK:
+                    resync = _RESYNC & subscribed
+                    _RESYNC.clear()
+                rem = (subscribed - want) | resync
+                add = (want - subscribed) | resync
+                if rem:
+                    ws.send(json.dumps({"op": "unsubscribe", "args": [_arg(s) for s in rem]}))
+                    subscribed -= rem
+                    for s in rem - want:
+                        _BOOKS.pop(s, None)
+                if add:
+                    ws.send(json.dumps({"op": "subscribe", "args": [_arg(s) for s in add]}))
+                    subscribed |= add
+                    _STATS["resyncs"] += len(resync)
+                if time.time() - last_ping >= ORDERBOOK_PING_SEC:
+                    ws.send("ping"); last_ping = time.time()
+                try:
+                    raw = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    continue
+                if not raw or raw == "pong":
+                    continue
+                on_message(json.loads(raw))
+        except Exception as e:
+            _STATS["ws_errors"] += 1
+            print("orderbook ws error:", e)
+        # 끊기면 모든 책을 미동기로(재접속 시 스냅샷부터)
+        for b in list(_BOOKS.values()):
+            b.synced = False
+        time.sleep(backoff)
+        backoff = min(30.0, backoff * 2)
+
+
+def _rest_loop():
+    while True:
+        t0 = time.time()
+        want = _wanted()
+        for s in [s for s in list(_BOOKS) if s not in want]:
+            _BOOKS.pop(s, None)
+        for sym in want:
+            try:
+                rows = _FETCH(sym) if _FETCH else None
+                if rows:
+                    _book(sym).snapshot(rows[0], rows[1])
+                    _STATS["snapshots"] += 1
+            except Exception as e:
+                _STATS["rest_errors"] += 1
+                print("orderbook rest error:", sym, e)
+        time.sleep(max(0.1, ORDERBOOK_POLL_SEC - (time.time() - t0)))
+
+
+def start():
+    """피더 스레드 시작(idempotent). 웹소켓 사용 불가면 REST 폴링"""
+    global _STARTED
+    if _STARTED or not ORDERBOOK_ENABLE:
+        return
+    _STARTED = True
+    use_ws = ORDERBOOK_WS and websocket is not None
+    _STATS["mode"] = "ws" if use_ws else "rest"
+    if not use_ws:
+        why = "ORDERBOOK_WS=0" if not ORDERBOOK_WS else "websocket-client not installed"
+        _STATS["rest_reason"] = why
+        print(f"⚠️ orderbook: REST polling fallback ({why}) — max {ORDERBOOK_REST_MAX_SYMBOLS} symbols "
+              f"every {ORDERBOOK_POLL_SEC}s")
+    threading.Thread(target=_ws_loop if use_ws else _rest_loop, daemon=True, name="orderbook-feed").start()
@@ -0,0 +1,144 @@
+# pos_state.py
+# ------------------------------------------------------------
+# (심볼, 사이드)별 상태 레코드 테이블 (선물/현물 공용)
+# - 포지션/가드/쿨다운/트레일 상태를 레코드 1개(__slots__)에 모음 → 틱당 dict 조회 1번, 문자열 결합 없음
+# - 키: (intern(symbol), side) 튜플. 레코드는 로그/응답용 문자열 키(SYMBOL_side)를 생성 시 1번만 만든다
+# - 락: 심볼 해시로 고른 스트라이프(RLock) 1개 → 같은 심볼의 long/short 는 같은 스트라이프
+#   · rec.lock : 필드 갱신용 짧은 임계구역(스트라이프 공유)
+#   · rec.op   : 주문 왕복 동안 잡는 키별 직렬화 락
+# - 수명: 진입/발견 시 생성 → opened()/closed() → 종료 후 evict_sec 동안 안 보이면 제거, 총량은 max_size 로 제한
+#   · ensure() 는 기존 레코드도 touch → 호출부가 들고 있는 동안(체결 조회 대기 등) evict 대상에서 밀려남
+#   · 그래도 제거된 레코드에 opened() 할 때는 adopt() 로 다시 넣는다(열린 포지션이 테이블 밖에 남지 않도록)
+# ------------------------------------------------------------
+import os
+import sys
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+POS_STATE_STRIPES   = int(os.getenv("POS_STATE_STRIPES", "16"))
+POS_STATE_EVICT_SEC = float(os.getenv("POS_STATE_EVICT_SEC", "600"))  # 종료(또는 마지막 관측) 후 보존 시간
+POS_STATE_MAX       = int(os.getenv("POS_STATE_MAX", "2048"))
+POS_STATE_SWEEP_SEC = float(os.getenv("POS_STATE_SWEEP_SEC", "30"))
+
+
+class PosRecord:
+    __slots__ = ("symbol", "side", "key", "lock", "op", "open", "touch_ts")
+
+    def __init__(self, symbol: str, side: str, lock):
+        self.symbol = symbol
+        self.side = side
+        self.key = sys.intern(f"{symbol}_{side}") if side else symbol
+        self.lock = lock
+        self.op = threading.RLock()
+        self.open = False
+        self.touch_ts = time.time()
+
+    def touch(self, now: float):
+        """거래소에서 관측됨(열려 있지 않아도 evict 유예)"""
+        self.touch_ts = now
+
+    def opened(self, now: float):
+        self.open = True
+        self.touch_ts = now
+
+    def closed(self, now: float):
+        self.open = False
+        self.touch_ts = now
+
+
+class StateTable:
+    def __init__(self, factory: Callable[[str, str, "threading.RLock"], PosRecord],
+                 stripes: int = POS_STATE_STRIPES, evict_sec: float = POS_STATE_EVICT_SEC,
+                 max_size: int = POS_STATE_MAX):
+        n = 1
+        while n < max(1, stripes):
+            n <<= 1
+        self._factory = factory
+        self._stripes = [threading.RLock() for _ in range(n)]
+        self._mask = n - 1
+        self._map: Dict[Tuple[str, str], PosRecord] = {}
+        self.evict_sec = float(evict_sec)
+        self.max_size = int(max_size)
+        self.created = 0
+        self.evicted = 0
+        self._last_sweep = 0.0
+
+    def stripe(self, symbol: str):
+        return self._stripes[hash(symbol) & self._mask]
+
+    def get(self, symbol: str, side: str = "") -> Optional[PosRecord]:
+        return self._map.get((symbol, side))
+
+    def ensure(self, symbol: str, side: str = "") -> PosRecord:
+        rec = self._map.get((symbol, side))
+        if rec is not None:
+            rec.touch_ts = time.time()
+            return rec
+        lk = self.stripe(symbol)
+        with lk:
+            rec = self._map.get((symbol, side))
+            if rec is None:
+                symbol = sys.intern(symbol)
+                rec = self._map[(symbol, side)] = self._factory(symbol, side, lk)
+                self.created += 1
+        if len(self._map) > self.max_size:
+            self.sweep(force=True)
+        return rec
+
+    def adopt(self, rec: PosRecord) -> bool:
+        """그 사이 evict 된 레코드를 다시 넣는다(같은 키의 새 레코드가 이미 있으면 그쪽을 유지). 넣었으면 True"""
+        k = (rec.symbol, rec.side)
+        if self._map.get(k) is rec:
+            return False
+        with self.stripe(rec.symbol):
+            if k in self._map:
+                return False
+            self._map[k] = rec
+            self.created += 1
+            return True
+
+    def records(self) -> List[PosRecord]:
+        return list(self._map.values())
+
+    def open_records(self) -> List[PosRecord]:
+        return [r for r in list(self._map.values()) if r.open]
+
+    def _drop(self, rec: PosRecord) -> bool:
+        with rec.lock:
+            # 주문 중(op 보유)이거나 그 사이 다시 열린 레코드는 남긴다
+            if rec.open or not rec.op.acquire(blocking=False):
+                return False
+            try:
+                k = (rec.symbol, rec.side)
+                if self._map.get(k) is rec:
+                    del self._map[k]
+                    return True
+                return False
+            finally:
+                rec.op.release()
+
+    def sweep(self, now: Optional[float] = None, force: bool = False) -> int:
+        """닫힌 지 evict_sec 지난 레코드 제거 + max_size 초과분은 오래된 순으로 제거. 제거 건수 반환"""
+        now = now or time.time()
+        if not force and now - self._last_sweep < POS_STATE_SWEEP_SEC:
+            return 0
+        self._last_sweep = now
+        n = 0
+        for rec in list(self._map.values()):
+            if not rec.open and now - rec.touch_ts >= self.evict_sec and self._drop(rec):
+                n += 1
+        over = len(self._map) - self.max_size
+        if over > 0:
+            idle = sorted((r for r in list(self._map.values()) if not r.open), key=lambda r: r.touch_ts)
+            for rec in idle[:over]:
+                if self._drop(rec):
+                    n += 1
+        self.evicted += n
+        return n
+
+    def stats(self) -> Dict[str, int]:
+        recs = list(self._map.values())
+        return {"records": len(recs), "open": sum(1 for r in recs if r.open), "created": self.created,
+                "evicted": self.evicted, "stripes": len(self._stripes), "max": self.max_size,
+                "evict_sec": self.evict_sec}
@@ -0,0 +1,142 @@
+# profiler.py
+# ------------------------------------------------------------
+# 온디맨드 샘플링 프로파일러 (운영 중 프로세스 내부 보기)
+# - 요청을 받은 스레드(엔드포인트 스레드풀) 1개가 hz 주기로 sys._current_frames() 를 읽어 전 스레드(신호 워커/워치독/재조정기...) 스택을 집계
+#   · 대상 스레드를 멈추거나 락을 잡지 않는다(프레임 읽기는 GIL 보유 중 짧은 순회뿐) → 매매 스레드 블로킹 없음
+#   · 주기/시간/깊이/고유 스택 수 상한(PROFILE_MAX_*)으로 오버헤드 제한, 동시에 1개만 실행
+# - 출력: collapsed stacks("스레드;바깥함수;...;안쪽함수 샘플수") — flamegraph.pl / speedscope / inferno 에 그대로 입력
+#   스레드 이름이 첫 프레임이라 플레임그래프가 스레드별로 묶인다
+# - 기본 꺼짐: PROFILE_ENABLE=1 이고 PROFILE_TOKEN 이 설정돼 있을 때만 실행(스택에 내부 구조가 그대로 드러남)
+# ------------------------------------------------------------
+import os
+import sys
+import hmac
+import time
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+PROFILE_ENABLE     = os.getenv("PROFILE_ENABLE", "0") == "1"
+PROFILE_TOKEN      = os.getenv("PROFILE_TOKEN", "")                    # 필수: ?token= 일치해야 실행(비어 있으면 거부)
+PROFILE_MAX_SEC    = float(os.getenv("PROFILE_MAX_SEC", "60"))
+PROFILE_MAX_HZ     = float(os.getenv("PROFILE_MAX_HZ", "100"))
+PROFILE_MAX_DEPTH  = int(os.getenv("PROFILE_MAX_DEPTH", "64"))
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "20000"))     # 고유 스택 상한(초과분은 [truncated] 로 합산)
+
+_RUN_LOCK = threading.Lock()
+_LAST: Dict[str, Any] = {}
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _label(code, cache: Dict[Any, str]) -> str:
+    s = cache.get(code)
+    if s is None:
+        s = cache[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return s
+
+
+def _stack(frame, cache: Dict[Any, str]) -> Tuple[str, ...]:
+    out = []
+    while frame is not None and len(out) < PROFILE_MAX_DEPTH:
+        out.append(_label(frame.f_code, cache))
+        frame = frame.f_back
+    out.reverse()   # 바깥 → 안쪽
+    return tuple(out)
+
+
+def _thread_names() -> Dict[int, str]:
+    return {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+
+
+def sample(seconds: float = 10.0, hz: float = 50.0) -> Dict[str, Any]:
+    """
+    seconds 동안 hz 주기로 전 스레드 스택 샘플링(호출 스레드에서 실행, 동시 실행 시 ProfilerBusy)
+    벽시계 기준이라 락/HTTP/큐 대기 중인 스택도 그대로 잡힌다(느린 워커가 어디서 기다리는지 보기 위함)
+    """
+    seconds = max(0.1, min(float(seconds), PROFILE_MAX_SEC))
+    hz = max(1.0, min(float(hz), PROFILE_MAX_HZ))
+    if not _RUN_LOCK.acquire(blocking=False):
+        raise ProfilerBusy("profile already running")
+    try:
+        me = threading.get_ident()
+        interval = 1.0 / hz
+        cache: Dict[Any, str] = {}
+        counts: Counter = Counter()
+        per_thread: Counter = Counter()
+        names = _thread_names()
+        names_ts = time.time()
+        n = truncated = 0
+        t0 = time.time()
+        cpu0 = time.thread_time()
+        nxt = t0
+        while True:
+            now = time.time()
+            if now - t0 >= seconds:
+                break
+            if now - names_ts >= 1.0:
+                names = _thread_names(); names_ts = now
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                st = _stack(frame, cache)
+                name = names.get(ident) or f"thread-{ident}"
+                key = (name,) + st
+                if key not in counts and len(counts) >= PROFILE_MAX_STACKS:
+                    key = (name, "[truncated]")
+                    truncated += 1
+                counts[key] += 1
+                per_thread[name] += 1
+            n += 1
+            nxt += interval
+            delay = nxt - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                nxt = time.time()   # 밀렸으면 따라잡지 않고 다음 주기부터
+        elapsed = time.time() - t0
+        out = {
+            "seconds": round(elapsed, 2), "hz": hz, "samples": n,
+            "overhead_cpu_ms": round((time.thread_time() - cpu0) * 1000.0, 1),
+            "truncated": truncated,
+            "threads": dict(per_thread.most_common()),
+            "collapsed": "\n".join(f"{';'.join(k)} {c}" for k, c in counts.most_common()),
+        }
+        _LAST.clear()
+        _LAST.update({k: v for k, v in out.items() if k != "collapsed"}, ts=t0)
+        return out
+    finally:
+        _RUN_LOCK.release()
+
+
+def check_token(token: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(str(token or ""), PROFILE_TOKEN)
+
+
+def handle(seconds: float, hz: float, fmt: str = "collapsed", token: str = "", thread: str = ""):
+    """
+    선물/현물/통합 앱 공용 /debug/profile 처리 — 동기 엔드포인트(스레드풀)에서 호출할 것
+    전 스레드 샘플링 프로파일(collapsed stacks, 스레드 이름이 첫 프레임) → flamegraph.pl / speedscope
+    """
+    from fastapi.responses import JSONResponse, PlainTextResponse
+    if not PROFILE_ENABLE or not PROFILE_TOKEN:
+        return JSONResponse({"ok": False, "error": "profiler_disabled"}, status_code=404)
+    if not check_token(token):
+        return JSONResponse({"ok": False, "error": "forbidden"}, status_code=403)
+    try:
+        out = sample(seconds, hz)
+    except ProfilerBusy as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=409)
+    if thread:   # 스레드 이름 접두어로 거르기(예: signal-worker)
+        out["collapsed"] = "\n".join(ln for ln in out["collapsed"].split("\n") if ln.startswith(thread))
+        out["threads"] = {k: v for k, v in out["threads"].items() if k.startswith(thread)}
+    if fmt == "json":
+        return out
+    return PlainTextResponse(out["collapsed"] + "\n")
+
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": PROFILE_ENABLE and bool(PROFILE_TOKEN), "running": _RUN_LOCK.locked(), "max_sec": PROFILE_MAX_SEC,
+            "max_hz": PROFILE_MAX_HZ, "last": dict(_LAST) or None}
@@ -0,0 +1,75 @@
+# reconcile.py
+# ------------------------------------------------------------
+# 로컬 상태 ↔ 거래소 스냅샷 일괄 비교 (선물/현물 공용)
+# - 로컬/원격 모두 {key: size} 해시 인덱스로 만들어 한 번에 diff → O(n)
+# - add(원격에만 있음) / remove(로컬에만 있음) / resize(수량 불일치) 분류
+# - 적용은 각 트레이더가 자기 락 안에서 일괄 수행, 여기서는 이벤트/드리프트 지표만 관리
+# ------------------------------------------------------------
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+DriftEvent = Dict[str, object]  # {"kind","key","local","remote","ts"}
+
+
+def diff_tables(local: Dict[str, float], remote: Dict[str, float], rel_tol: float = 0.01) -> List[DriftEvent]:
+    """local/remote: {key: size}. size<=0 은 없음으로 본다. local size 가 None 이면 수량 미상(비교 생략)"""
+    now = time.time()
+    out: List[DriftEvent] = []
+    for k, r in remote.items():
+        if r <= 0:
+            continue
+        l = local.get(k)
+        if k not in local or (l is not None and l <= 0):
+            out.append({"kind": "add", "key": k, "local": 0.0, "remote": r, "ts": now})
+        elif l is not None and abs(r - l) > max(abs(r), abs(l)) * rel_tol:
+            out.append({"kind": "resize", "key": k, "local": l, "remote": r, "ts": now})
+    for k, l in local.items():
+        if (l is None or l > 0) and remote.get(k, 0.0) <= 0:
+            out.append({"kind": "remove", "key": k, "local": l, "remote": 0.0, "ts": now})
+    return out
+
+
+class DriftTracker:
+    """드리프트 카운터 + 최근 이벤트 + 구독자"""
+
+    def __init__(self, name: str, keep: int = 100):
+        self.name = name
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[DriftEvent]], None]] = []
+        self.recent: deque = deque(maxlen=keep)
+        self.counts = {"add": 0, "remove": 0, "resize": 0, "skipped": 0}
+        self.cycles = 0
+        self.errors = 0
+        self.last: Dict[str, object] = {"ts": 0.0, "ms": 0.0, "local": 0, "remote": 0, "drift": 0}
+
+    def subscribe(self, fn: Callable[[List[DriftEvent]], None]):
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+
+    def record(self, applied: List[DriftEvent], skipped: int, n_local: int, n_remote: int, ms: float):
+        with self._lock:
+            self.cycles += 1
+            for ev in applied:
+                self.counts[ev["kind"]] = self.counts.get(ev["kind"], 0) + 1
+                self.recent.append(ev)
+            self.counts["skipped"] += skipped
+            self.last = {"ts": time.time(), "ms": round(ms, 1), "local": n_local, "remote": n_remote,
+                         "drift": len(applied)}
+        if applied:
+            for fn in list(self._listeners):
+                try:
+                    fn(applied)
+                except Exception as e:
+                    print(f"[{self.name}] drift listener error:", e)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self, recent: Optional[int] = 20) -> dict:
+        with self._lock:
+            return {"name": self.name, "cycles": self.cycles, "errors": self.errors,
+                    "counts": dict(self.counts), "last": dict(self.last),
+                    "recent": list(self.recent)[-(recent or 0):] if recent else []}
@@ -0,0 +1,175 @@
+# shared_state.py
+# ------------------------------------------------------------
+# gunicorn 다중 워커용 공유 상태 (로컬 SQLite, WAL)
+# - claim_once: 워커 간 공통 중복 제거(INSERT OR IGNORE + 만료)
+# - enqueue / claim_signals / ack: 워커 간 공유 신호 큐
+# - LeaderElector: 임대(lease) 기반 리더 선출. 리더 1개만 워치독/리컨실러/용량가드를 돌린다.
+#   임대를 잃은 리더는 프로세스를 종료해(gunicorn 재기동) 리더 이중화를 막는다.
+# ------------------------------------------------------------
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SHARED_STATE_ENABLE = os.getenv("SHARED_STATE_ENABLE", "0") == "1"
+SHARED_STATE_DB     = os.getenv("SHARED_STATE_DB", "/var/data/bot_state.sqlite3")
+LEADER_LEASE_SEC    = float(os.getenv("LEADER_LEASE_SEC", "10"))
+SHARED_QUEUE_POLL   = float(os.getenv("SHARED_QUEUE_POLL", "0.05"))
+SHARED_CLAIM_STALE  = float(os.getenv("SHARED_CLAIM_STALE", "5"))   # 죽은 리더가 가져간 신호 회수 기준(초)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_tls = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        path = SHARED_STATE_DB
+        d = os.path.dirname(path)
+        if d and not os.path.isdir(d):
+            try:
+                os.makedirs(d, exist_ok=True)
+            except Exception:
+                path = os.path.join("/tmp", os.path.basename(path))
+        conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)  # autocommit, 트랜잭션은 명시적으로
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dedup  (k TEXT PRIMARY KEY, exp REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS signals(id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL,
+                                               body TEXT NOT NULL, claimed_by TEXT, claimed_ts REAL);
+            CREATE TABLE IF NOT EXISTS leader (name TEXT PRIMARY KEY, owner TEXT NOT NULL, exp REAL NOT NULL);
+        """)
+        _tls.conn = conn
+    return conn
+
+
+class _Tx:
+    """BEGIN IMMEDIATE ~ COMMIT/ROLLBACK (쓰기 락을 처음부터 잡아 워커 간 경합을 직렬화)"""
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn = _db()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, et, ev, tb):
+        self.conn.execute("ROLLBACK" if et else "COMMIT")
+        return False
+
+
+# ----------------------- 중복 제거 -----------------------
+def claim_once(key: str, ttl: float) -> bool:
+    """ttl 안에서 key 를 처음 본 워커만 True"""
+    now = time.time()
+    with _Tx() as c:
+        c.execute("DELETE FROM dedup WHERE k=? AND exp<?", (key, now))
+        cur = c.execute("INSERT OR IGNORE INTO dedup(k, exp) VALUES(?, ?)", (key, now + float(ttl)))
+        return cur.rowcount == 1
+
+
+def purge_expired():
+    with _Tx() as c:
+        c.execute("DELETE FROM dedup WHERE exp<?", (time.time(),))
+
+
+# ----------------------- 공유 신호 큐 -----------------------
+def enqueue(body: Any) -> int:
+    with _Tx() as c:
+        cur = c.execute("INSERT INTO signals(ts, body) VALUES(?, ?)", (time.time(), json.dumps(body)))
+        return int(cur.lastrowid)
+
+
+def claim_signals(limit: int = 50) -> List[Tuple[int, Any]]:
+    now = time.time()
+    with _Tx() as c:
+        rows = c.execute("SELECT id, body FROM signals WHERE claimed_by IS NULL ORDER BY id LIMIT ?",
+                         (int(limit),)).fetchall()
+        if rows:
+            c.executemany("UPDATE signals SET claimed_by=?, claimed_ts=? WHERE id=?",
+                          [(WORKER_ID, now, r[0]) for r in rows])
+    return [(r[0], json.loads(r[1])) for r in rows]
+
+
+def ack(ids: List[int]):
+    if not ids:
+        return
+    with _Tx() as c:
+        c.executemany("DELETE FROM signals WHERE id=?", [(i,) for i in ids])
+
+
+def release_stale_claims(stale: Optional[float] = None) -> int:
+    """다른(죽은) 워커가 가져가 놓고 처리 못 한 신호를 큐로 되돌림.
+    stale=0 이면 경과 시간과 무관하게 모두 회수(리더 인수 시: 신호는 리더만 가져가므로 남은 claim 은 전부 이전 리더 것)"""
+    stale = SHARED_CLAIM_STALE if stale is None else float(stale)
+    with _Tx() as c:
+        cur = c.execute("UPDATE signals SET claimed_by=NULL, claimed_ts=NULL "
+                        "WHERE claimed_by IS NOT NULL AND claimed_by<>? AND claimed_ts<=?",
+                        (WORKER_ID, time.time() - stale))
+        return cur.rowcount
+
+
+def queue_depth() -> Dict[str, int]:
+    c = _db()
+    total, claimed = c.execute("SELECT COUNT(*), COUNT(claimed_by) FROM signals").fetchone()
+    return {"pending": int(total) - int(claimed), "claimed": int(claimed)}
+
+
+# ----------------------- 리더 선출 -----------------------
+class LeaderElector:
+    def __init__(self, name: str, on_elected: Callable[[], None]):
+        self.name = name
+        self.on_elected = on_elected
+        self.is_leader = False
+        self.since = 0.0
+        self._renewed = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def _try_acquire(self) -> bool:
+        now = time.time()
+        with _Tx() as c:
+            row = c.execute("SELECT owner, exp FROM leader WHERE name=?", (self.name,)).fetchone()
+            if row is None or row[0] == WORKER_ID or row[1] < now:
+                c.execute("INSERT INTO leader(name, owner, exp) VALUES(?, ?, ?) "
+                          "ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, exp=excluded.exp",
+                          (self.name, WORKER_ID, now + LEADER_LEASE_SEC))
+                return True
+            return False
+
+    def _loop(self):
+        while True:
+            try:
+                got = self._try_acquire()
+            except Exception as e:
+                print("leader lease error:", e)
+                got = None  # 판단 보류(리더는 임대 만료 전까지 유지)
+            now = time.time()
+            if got:
+                self._renewed = now
+            if got and not self.is_leader:
+                self.is_leader, self.since = True, now
+                try:
+                    self.on_elected()
+                except Exception as e:
+                    print("on_elected error:", e)
+            elif self.is_leader and (got is False or now - self._renewed > LEADER_LEASE_SEC):
+                # 임대 상실: 리더 루프를 멈출 수 없으므로 프로세스를 내려 이중 실행을 막는다
+                print(f"[{WORKER_ID}] lost leadership → exit")
+                os._exit(3)
+            time.sleep(max(0.5, LEADER_LEASE_SEC / 3.0))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name=f"leader-{self.name}")
+            self._thread.start()
+
+    def status(self) -> Dict[str, Any]:
+        try:
+            row = _db().execute("SELECT owner, exp FROM leader WHERE name=?", (self.name,)).fetchone()
+        except Exception:
+            row = None
+        return {"worker": WORKER_ID, "leader": self.is_leader, "since": self.since,
+                "owner": row[0] if row else None, "lease_exp": row[1] if row else None}
@@ -0,0 +1,321 @@
+# shm_market.py
+# ------------------------------------------------------------
+# 선물/현물 봇 공용 시세·스펙 테이블 (multiprocessing.shared_memory)
+# - 같은 호스트에서 main.py / main_spot.py 를 함께 돌릴 때 사용
+# - 피더 1개(python shm_market.py)가 벌크 티커/스펙을 REST 로 받아 테이블에 기록
+#   → 봇은 심볼별 REST 호출 대신 공유 메모리를 읽음(REST 트래픽·메모리 감소, 두 봇이 같은 가격을 봄)
+# - 레이아웃: [헤더 64B][슬롯 96B × SHM_MARKET_SLOTS]
+#   헤더: magic, nslots, n_used, 피더 heartbeat
+#   슬롯: seq, symbol, market(0=선물,1=현물), price, ts, sizeStep, priceStep, minQty, minQuote, flags
+# - 심볼→슬롯: 피더가 추가 순서대로 배정(한 번 배정하면 불변). 리더는 n_used 까지 스캔해 로컬 dict 로 인덱싱
+# - 일관성: 슬롯별 seqlock. 쓰기 중 seq 홀수 → 리더는 seq 가 짝수이고 전후 동일할 때만 채택(락 없음)
+# - 테이블이 없거나 heartbeat 가 오래되면 None → 호출부가 기존 REST 경로로 폴백
+# ------------------------------------------------------------
+import os
+import sys
+import time
+import struct
+import threading
+from typing import Dict, Optional, Tuple
+
+SHM_MARKET_ENABLE = os.getenv("SHM_MARKET_ENABLE", "0") == "1"
+SHM_MARKET_NAME   = os.getenv("SHM_MARKET_NAME", "bitget_market")
+SHM_MARKET_SLOTS  = int(os.getenv("SHM_MARKET_SLOTS", "4096"))
+SHM_STALE_SEC     = float(os.getenv("SHM_STALE_SEC", "5"))       # 피더 heartbeat 허용 지연
+SHM_FEED_SEC      = float(os.getenv("SHM_FEED_SEC", "1.0"))      # 벌크 티커 주기
+SHM_SPEC_SEC      = float(os.getenv("SHM_SPEC_SEC", "600"))      # 스펙 갱신 주기
+SHM_FUT_PRODUCT   = os.getenv("SHM_FUT_PRODUCT", "USDT-FUTURES")
+
+BASE_URL = os.getenv("BITGET_BASE_URL", "https://api.bitget.com")
+
+FUTURES, SPOT = 0, 1
+
+MAGIC = b"BGMKT001"
+_HDR = struct.Struct("<8sIId")             # magic, nslots, n_used, heartbeat
+_HDR_SIZE = 64
+_SLOT = struct.Struct("<Q24sB7xddddddQ")   # seq, sym, mkt, px, ts, sizeStep, priceStep, minQty, minQuote, flags
+_SLOT_SIZE = 96
+_SEQ = struct.Struct("<Q")
+_BODY_OFF = 8                              # seq 다음부터가 본문
+_F_TRADABLE = 1
+
+assert _HDR.size <= _HDR_SIZE and _SLOT.size <= _SLOT_SIZE
+
+
+def _size(nslots: int) -> int:
+    return _HDR_SIZE + _SLOT_SIZE * int(nslots)
+
+
+def _slot_off(i: int) -> int:
+    return _HDR_SIZE + _SLOT_SIZE * i
+
+
+def _open(create: bool, nslots: int = 0):
+    from multiprocessing import shared_memory
+    if create:
+        try:
+            return shared_memory.SharedMemory(name=SHM_MARKET_NAME, create=True, size=_size(nslots)), True
+        except FileExistsError:
+            pass
+    try:
+        shm = shared_memory.SharedMemory(name=SHM_MARKET_NAME, create=False, track=False)  # 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=SHM_MARKET_NAME, create=False)
+        try:
+            # 3.12 이하: 붙기만 한 프로세스가 종료 시 세그먼트를 지우지 않도록 추적 해제
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm, False
+
+
+# ----------------------- 리더(봇 쪽) -----------------------
+class _Reader:
+    def __init__(self):
+        self.shm = None
+        self.buf = None
+        self.nslots = 0
+        self.index: Dict[Tuple[int, str], int] = {}
+        self.scanned = 0
+        self.next_try = 0.0
+        self.lock = threading.Lock()   # 인덱스 스캔/재부착만 보호(값 읽기는 락 없음 → 재부착으로 해제된 buf 는 예외로 걸러냄)
+        self.hits = 0
+        self.misses = 0
+        self.retries = 0
+
+    def _attach(self) -> bool:
+        now = time.time()
+        if now < self.next_try:
+            return False
+        self.next_try = now + 5.0
+        self._detach()
+        try:
+            shm, _ = _open(False)
+        except Exception:
+            return False
+        magic, nslots, _n, _hb = _HDR.unpack_from(shm.buf, 0)
+        if magic != MAGIC or shm.size < _size(nslots):
+            shm.close()
+            return False
+        self.shm, self.buf, self.nslots = shm, shm.buf, int(nslots)
+        self.index, self.scanned = {}, 0
+        return True
+
+    def _detach(self):
+        if self.shm is not None:
+            self.buf = None
+            try:
+                self.shm.close()
+            except Exception:
+                pass
+        self.shm, self.buf = None, None
+
+    def _live(self) -> bool:
+        if self.buf is None and not self._attach():
+            return False
+        _m, _ns, n_used, hb = _HDR.unpack_from(self.buf, 0)
+        if time.time() - hb > SHM_STALE_SEC:
+            self._attach()  # 피더 재시작으로 세그먼트가 바뀌었을 수 있음(5초 간격 재시도)
+            return False
+        if n_used > self.scanned:
+            for i in range(self.scanned, min(n_used, self.nslots)):
+                sym = _SLOT.unpack_from(self.buf, _slot_off(i))[1].rstrip(b"\0").decode()
+                mkt = self.buf[_slot_off(i) + 32]
+                self.index[(mkt, sym)] = i
+            self.scanned = n_used
+        return True
+
+    def read(self, mkt: int, sym: str) -> Optional[tuple]:
+        with self.lock:
+            if not self._live():
+                return None
+            i = self.index.get((mkt, sym))
+            buf = self.buf
+        if i is None:
+            self.misses += 1
+            return None
+        off = _slot_off(i)
+        try:
+            for _ in range(50):
+                s1 = _SEQ.unpack_from(buf, off)[0]
+                if s1 & 1:
+                    self.retries += 1
+                    continue
+                row = _SLOT.unpack_from(buf, off)
+                if _SEQ.unpack_from(buf, off)[0] == s1:
+                    self.hits += 1
+                    return row
+                self.retries += 1
+        except (ValueError, BufferError):
+            pass  # 읽는 도중 다른 스레드가 _attach→_detach 로 buf(memoryview)를 해제함 → 이번 조회는 미스
+        self.misses += 1
+        return None
+
+
+_R = _Reader()
+
+
+def get_price(mkt: int, symbol: str, max_age: float) -> Optional[float]:
+    if not SHM_MARKET_ENABLE:
+        return None
+    row = _R.read(mkt, symbol)
+    if not row or row[3] <= 0 or time.time() - row[4] > max_age:
+        return None
+    return row[3]
+
+
+def get_spec(mkt: int, symbol: str) -> Optional[dict]:
+    if not SHM_MARKET_ENABLE:
+        return None
+    row = _R.read(mkt, symbol)
+    if not row or row[5] <= 0:
+        return None
+    return {"sizeStep": row[5], "priceStep": row[6], "minQty": row[7], "minQuote": row[8],
+            "tradable": bool(row[9] & _F_TRADABLE)}
+
+
+def stats() -> dict:
+    hb = None
+    if _R.buf is not None:
+        try:
+            hb = _HDR.unpack_from(_R.buf, 0)[3]
+        except Exception:
+            hb = None
+    return {"enabled": SHM_MARKET_ENABLE, "name": SHM_MARKET_NAME, "attached": _R.buf is not None,
+            "symbols": len(_R.index), "heartbeat_age": round(time.time() - hb, 2) if hb else None,
+            "hits": _R.hits, "misses": _R.misses, "seq_retries": _R.retries}
+
+
+# ----------------------- 피더 -----------------------
+class Feeder:
+    """단일 작성자. 슬롯 배정/seqlock 쓰기/heartbeat"""
+
+    def __init__(self, nslots: int = SHM_MARKET_SLOTS):
+        self.shm, created = _open(True, nslots)
+        self.buf = self.shm.buf
+        magic, ns, n_used, _hb = _HDR.unpack_from(self.buf, 0)
+        if created or magic != MAGIC:
+            ns, n_used = nslots, 0
+            self.buf[:_size(ns)] = bytes(_size(ns))
+        self.nslots, self.n_used = int(ns), int(n_used)
+        self.slots: Dict[Tuple[int, str], int] = {}
+        for i in range(self.n_used):
+            row = _SLOT.unpack_from(self.buf, _slot_off(i))
+            self.slots[(row[2], row[1].rstrip(b"\0").decode())] = i
+        _HDR.pack_into(self.buf, 0, MAGIC, self.nslots, self.n_used, time.time())
+
+    def _slot(self, mkt: int, sym: str) -> Optional[int]:
+        i = self.slots.get((mkt, sym))
+        if i is None:
+            if self.n_used >= self.nslots or len(sym) > 24:
+                return None
+            i = self.n_used
+            _SLOT.pack_into(self.buf, _slot_off(i), 0, sym.encode(), mkt, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0)
+            self.slots[(mkt, sym)] = i
+            self.n_used += 1   # 심볼을 먼저 쓰고 n_used 를 올려야 리더가 빈 슬롯을 인덱싱하지 않음
+            _HDR.pack_into(self.buf, 0, MAGIC, self.nslots, self.n_used, time.time())
+        return i
+
+    def write(self, mkt: int, sym: str, px: Optional[float] = None, spec: Optional[dict] = None):
+        i = self._slot(mkt, sym)
+        if i is None:
+            return
+        off = _slot_off(i)
+        row = list(_SLOT.unpack_from(self.buf, off))
+        seq = row[0]
+        if px is not None:
+            row[3], row[4] = float(px), time.time()
+        if spec is not None:
+            row[5] = float(spec.get("sizeStep") or 0.0)
+            row[6] = float(spec.get("priceStep") or 0.0)
+            row[7] = float(spec.get("minQty") or 0.0)
+            row[8] = float(spec.get("minQuote") or 0.0)
+            row[9] = _F_TRADABLE if spec.get("tradable", True) else 0
+        _SEQ.pack_into(self.buf, off, seq + 1)                        # 홀수: 쓰기 중
+        _SLOT.pack_into(self.buf, off, seq + 1, *row[1:])
+        _SEQ.pack_into(self.buf, off, seq + 2)                        # 짝수: 완료
+
+    def beat(self):
+        _HDR.pack_into(self.buf, 0, MAGIC, self.nslots, self.n_used, time.time())
+
+
+def _f(x, d: float = 0.0) -> float:
+    try:
+        return float(x) if x not in (None, "", "null") else d
+    except Exception:
+        return d
+
+
+def _feed_prices(fd: Feeder, sess) -> int:
+    n = 0
+    for mkt, path, params in ((FUTURES, "/api/v2/mix/market/tickers", {"productType": SHM_FUT_PRODUCT}),
+                              (SPOT, "/api/v2/spot/market/tickers", None)):
+        try:
+            rows = sess.get(BASE_URL + path, params=params, timeout=8).json().get("data") or []
+        except Exception as e:
+            print("shm feed tickers fail:", mkt, e)
+            continue
+        for d in rows:
+            px = _f(d.get("lastPr") or d.get("close") or d.get("last"))
+            sym = str(d.get("symbol") or "").upper()
+            if sym and px > 0:
+                fd.write(mkt, sym, px=px)
+                n += 1
+    return n
+
+
+def _feed_specs(fd: Feeder, sess) -> int:
+    n = 0
+    try:
+        rows = sess.get(BASE_URL + "/api/v2/mix/market/contracts", params={"productType": SHM_FUT_PRODUCT},
+                        timeout=12).json().get("data") or []
+        for d in rows:
+            place = int(_f(d.get("pricePlace"), 2))
+            fd.write(FUTURES, str(d.get("symbol") or "").upper(), spec={
+                "sizeStep": _f(d.get("sizeMultiplier"), 0.001),
+                "priceStep": _f(d.get("priceEndStep"), 1.0) * 10 ** (-place),
+                "minQty": _f(d.get("minTradeNum")),
+                "minQuote": _f(d.get("minTradeUSDT")),
+                "tradable": str(d.get("symbolStatus") or "normal").lower() == "normal"})
+            n += 1
+    except Exception as e:
+        print("shm feed contracts fail:", e)
+    try:
+        rows = sess.get(BASE_URL + "/api/v2/spot/public/symbols", timeout=12).json().get("data") or []
+        for d in rows:
+            min_qt = _f(d.get("minTradeUSDT"), _f(d.get("minTradeAmount"), 1.0))
+            fd.write(SPOT, str(d.get("symbol") or "").upper(), spec={
+                "sizeStep": 10 ** (-int(_f(d.get("quantityPrecision"), 6))),
+                "priceStep": 10 ** (-int(_f(d.get("pricePrecision"), 6))),
+                "minQuote": min_qt if min_qt > 0 else 1.0,
+                "tradable": str(d.get("status") or "").lower() in ("online", "enable", "enabled", "true", "tradable")})
+            n += 1
+    except Exception as e:
+        print("shm feed spot symbols fail:", e)
+    return n
+
+
+def run_feeder():
+    import requests
+    fd = Feeder()
+    sess = requests.Session()
+    print(f"shm feeder: name={SHM_MARKET_NAME} slots={fd.nslots} used={fd.n_used}")
+    next_spec = 0.0
+    while True:
+        t0 = time.time()
+        if t0 >= next_spec:
+            print("shm specs:", _feed_specs(fd, sess))
+            next_spec = t0 + SHM_SPEC_SEC
+        if _feed_prices(fd, sess):
+            fd.beat()   # 가격을 하나도 못 받았으면 heartbeat 를 멈춰 리더가 REST 로 폴백하게 함
+        time.sleep(max(0.05, SHM_FEED_SEC - (time.time() - t0)))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "unlink":
+        s, _ = _open(False)
+        s.close()
+        s.unlink()
+    else:
+        run_feeder()
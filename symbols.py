@@ -0,0 +1,86 @@
+# symbols.py
+# ------------------------------------------------------------
+# 심볼 해석기 (선물/현물 공용)
+# - 원문 문자열 → 거래소 심볼 결과를 메모(dict)해 두고 적중 시 dict 조회 1번으로 끝(추가 할당 없음)
+# - 정규화: 대문자, 거래소 접두어(BINANCE:), TradingView 선물 접미어(.P), PERP/UMCBL/CMCBL, 구분자(/ - _ 공백) 제거
+# - 유사 심볼 추정: 상품 목록 갱신 시 정렬 리스트를 1회 만들고 bisect 로 접두어 구간만 탐색 → O(log n)
+# ------------------------------------------------------------
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional
+
+MEMO_MAX = 8192
+
+_SUFFIXES = ("UMCBL", "CMCBL", "PERP")
+_SEPARATORS = str.maketrans("", "", "/-_ \t")
+
+
+def normalize(raw: str) -> str:
+    s = (raw or "").strip().upper()
+    if ":" in s:                      # BINANCE:BTCUSDT.P → BTCUSDT.P
+        s = s.rsplit(":", 1)[1]
+    if "." in s:                      # BTCUSDT.P / BTCUSDT.PS → BTCUSDT
+        s = s.split(".", 1)[0]
+    s = s.translate(_SEPARATORS)
+    for suf in _SUFFIXES:
+        if s.endswith(suf) and len(s) > len(suf):
+            s = s[:-len(suf)]
+            break
+    return s
+
+
+class SymbolResolver:
+    def __init__(self, aliases: Optional[Dict[str, str]] = None):
+        self.aliases = aliases if aliases is not None else {}   # 호출측 dict 를 그대로 공유
+        self._memo: Dict[str, str] = {}
+        self._sorted: List[str] = []
+        self._lock = threading.Lock()
+
+    def resolve(self, raw: str) -> str:
+        hit = self._memo.get(raw)
+        if hit is not None:
+            return hit
+        a = self.aliases
+        s = a.get(raw) or normalize(raw)
+        s = a.get(s, s)
+        if len(self._memo) >= MEMO_MAX:
+            self._memo.clear()
+        self._memo[raw] = s
+        return s
+
+    def add_alias(self, src: str, dst: str):
+        with self._lock:
+            self.aliases[src] = dst
+            self._memo.clear()
+
+    def rebuild(self, symbols: Iterable[str]):
+        """상품 목록 갱신 시 호출: 접두어 인덱스 재구성"""
+        srt = sorted(set(symbols))
+        with self._lock:
+            self._sorted = srt
+
+    def __contains__(self, sym: str) -> bool:
+        srt = self._sorted
+        i = bisect.bisect_left(srt, sym)
+        return i < len(srt) and srt[i] == sym
+
+    def _first_with_prefix(self, prefix: str, quote: str, exclude: str) -> Optional[str]:
+        srt = self._sorted
+        i = bisect.bisect_left(srt, prefix)
+        while i < len(srt) and srt[i].startswith(prefix):
+            k = srt[i]
+            if k.endswith(quote) and k != exclude:
+                return k
+            i += 1
+        return None
+
+    def guess(self, base: str, quote: str = "USDT", min_prefix: int = 3) -> Optional[str]:
+        """유사 심볼: 기초코인 전체 접두어 → 앞 4글자 → 앞 3글자 순으로 첫 후보"""
+        pref = base[:-len(quote)] if base.endswith(quote) else base
+        if len(pref) < min_prefix:
+            return None
+        for p in (pref, pref[:4], pref[:3]):
+            k = self._first_with_prefix(p, quote, base)
+            if k:
+                return k
+        return None
@@ -1,4 +1,4 @@
-import os, requests
+import os, queue, threading, requests
 from dotenv import load_dotenv
 
 # Load .env if present (no error if absent)
@@ -24,6 +24,49 @@ CHAT_ID = (
 BASE    = f"https://api.telegram.org/bot{TOKEN}"
 _ANNOUNCED_OFF = False
 
+# Outbox: one sender thread + keep-alive session shared by every bot in the process (futures/spot)
+TELEGRAM_OUTBOX     = os.getenv("TELEGRAM_OUTBOX", "1") == "1"
+TELEGRAM_OUTBOX_MAX = int(os.getenv("TELEGRAM_OUTBOX_MAX", "500"))
+
+_SESSION = requests.Session()
+_OUTBOX: "queue.Queue" = queue.Queue(maxsize=TELEGRAM_OUTBOX_MAX)
+_SENDER = None
+_SENDER_LOCK = threading.Lock()
+_STATS = {"sent": 0, "failed": 0, "dropped": 0}
+
+def _post(base: str, chat_id: str, text: str):
+    try:
+        _SESSION.post(f"{base}/sendMessage", data={"chat_id": chat_id, "text": text}, timeout=10)
+        _STATS["sent"] += 1
+    except Exception as e:
+        _STATS["failed"] += 1
+        print("❌ Telegram send failed:", e)
+
+def _sender_loop():
+    while True:
+        base, chat_id, text = _OUTBOX.get()
+        _post(base, chat_id, text)
+
+def post_message(base: str, chat_id: str, text: str):
+    """Queue a message for (bot base url, chat). Falls back to a blocking send when the outbox is off."""
+    global _SENDER
+    if not TELEGRAM_OUTBOX:
+        _post(base, chat_id, text)
+        return
+    if _SENDER is None:
+        with _SENDER_LOCK:
+            if _SENDER is None:
+                _SENDER = threading.Thread(target=_sender_loop, daemon=True, name="tg-outbox")
+                _SENDER.start()
+    try:
+        _OUTBOX.put_nowait((base, chat_id, text))
+    except queue.Full:
+        _STATS["dropped"] += 1
+        print("[TG] outbox full, drop:", text[:200])
+
+def get_outbox_stats() -> dict:
+    return dict(_STATS, queued=_OUTBOX.qsize(), enabled=TELEGRAM_OUTBOX)
+
 def _announce_if_off():
     global _ANNOUNCED_OFF
     if not TOKEN or not CHAT_ID:
@@ -38,7 +81,4 @@ def send_telegram(text: str):
     if _announce_if_off():
         print("[TG]", text)
         return
-    try:
-        requests.post(f"{BASE}/sendMessage", data={"chat_id": CHAT_ID, "text": text}, timeout=10)
-    except Exception as e:
-        print("❌ Telegram send failed:", e)
+    post_message(BASE, CHAT_ID, text)
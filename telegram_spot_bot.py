@@ -1,5 +1,7 @@
 # telegram_spot_bot.py
-import os, requests
+import os
+
+from telegram_bot import post_message
 
 TG_TOKEN = os.getenv("TELEGRAM_TOKEN", "")
 TG_CHAT  = os.getenv("TELEGRAM_CHAT_ID", "")
@@ -7,8 +9,5 @@ TG_CHAT  = os.getenv("TELEGRAM_CHAT_ID", "")
 def send_telegram(msg: str):
     if not TG_TOKEN or not TG_CHAT: 
         return
-    try:
-        url = f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage"
-        requests.post(url, json={"chat_id": TG_CHAT, "text": msg})
-    except Exception:
-        pass
+    # 선물 봇과 같은 outbox(발송 스레드 1개 + keep-alive 세션) 사용
+    post_message(f"https://api.telegram.org/bot{TG_TOKEN}", TG_CHAT, msg)
@@ -0,0 +1,274 @@
+# tracing.py
+# ------------------------------------------------------------
+# 경량 추적(span) — 신호 1건이 어느 단계/HTTP 호출에서 시간을 썼는지
+# - 컨텍스트: contextvars(스레드/태스크별) → 동시 워커끼리 섞이지 않음
+#   · 큐 통과: 신호 dict 에 W3C traceparent 문자열(_trace)을 실어 보내고 워커가 이어 받는다
+#   · 스레드 풀: bind(fn) 로 현재 span 을 캡처(bitget_api.bind_account 가 함께 처리)
+# - 활성 추적이 없으면 span()/traced 는 아무것도 만들지 않는다(백그라운드 폴링은 추적 대상 아님)
+# - 샘플링: 루트에서 TRACE_SAMPLE 비율로 결정(헤드) + 세그먼트가 TRACE_SLOW_MS 이상이거나 오류면 항상 기록(테일)
+#   · 세그먼트 = 한 스레드에서 바깥쪽 span 하나와 그 하위 span 들. 세그먼트 루트가 끝날 때 한 번에 내보냄
+# - 출력: OTLP/JSON span 모양(줄당 span 1개)으로 회전 JSONL 파일(TRACE_FILE, 기본 TRADE_LOG_DIR/traces.jsonl)
+#   파일 쓰기는 백그라운드 스레드 1개 → 신호 경로는 큐 put 만
+# ------------------------------------------------------------
+import os
+import json
+import time
+import queue
+import random
+import threading
+import contextvars
+import functools
+import logging
+from logging.handlers import RotatingFileHandler
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+TRACE_ENABLE      = os.getenv("TRACE_ENABLE", "1") == "1"
+TRACE_SAMPLE      = float(os.getenv("TRACE_SAMPLE", "0.05"))     # 헤드 샘플 비율(0~1)
+TRACE_SLOW_MS     = float(os.getenv("TRACE_SLOW_MS", "1500"))    # 이 이상 걸린 세그먼트는 샘플과 무관하게 기록(0=끔)
+TRACE_FILE        = os.getenv("TRACE_FILE", "").strip() or (
+    os.path.join(os.getenv("TRADE_LOG_DIR", "").strip(), "traces.jsonl") if os.getenv("TRADE_LOG_DIR", "").strip() else "")
+TRACE_FILE_MAX_MB = float(os.getenv("TRACE_FILE_MAX_MB", "20"))
+TRACE_FILE_KEEP   = int(os.getenv("TRACE_FILE_KEEP", "3"))
+TRACE_QUEUE_MAX   = int(os.getenv("TRACE_QUEUE_MAX", "10000"))
+SERVICE_NAME      = os.getenv("TRACE_SERVICE_NAME", "fastapi-trading-bot")
+
+CARRIER_KEY = "_trace"   # 신호 dict 에 싣는 traceparent
+
+_KINDS = {"internal": "SPAN_KIND_INTERNAL", "server": "SPAN_KIND_SERVER", "client": "SPAN_KIND_CLIENT",
+          "consumer": "SPAN_KIND_CONSUMER", "producer": "SPAN_KIND_PRODUCER"}
+
+
+class _Remote:
+    """다른 스레드/큐에서 넘어온 부모(traceparent) — 세그먼트는 새로 시작"""
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attrs", "error", "sampled", "seg")
+
+    def __init__(self, name: str, parent, kind: str = "internal", start: Optional[float] = None):
+        if parent is None:
+            self.trace_id = "%032x" % random.getrandbits(128)
+            self.parent_id = ""
+            self.sampled = random.random() < TRACE_SAMPLE
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self.sampled = parent.sampled
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.name = name
+        self.kind = kind
+        self.start_ns = int(start * 1e9) if start else time.time_ns()
+        self.end_ns = 0
+        self.attrs: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        # 같은 스레드의 열린 부모가 있으면 그 세그먼트에 합류, 아니면 이 span 이 세그먼트 루트
+        seg = getattr(parent, "seg", None)
+        self.seg: List["Span"] = seg if seg is not None and not parent.end_ns else []
+        self.seg.append(self)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def end(self, at: Optional[float] = None):
+        if self.end_ns:
+            return
+        self.end_ns = int(at * 1e9) if at else time.time_ns()
+        if self.seg and self.seg[0] is self:
+            _flush(self)
+
+    @property
+    def ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+_CUR: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+_OUT: "queue.Queue" = queue.Queue(maxsize=TRACE_QUEUE_MAX)
+_WRITER: Optional[threading.Thread] = None
+_WLOCK = threading.Lock()
+_STATS = {"segments": 0, "written": 0, "spans": 0, "dropped": 0, "sampled": 0, "slow": 0, "error": 0}
+
+
+# ----------------------- 컨텍스트 -----------------------
+def current():
+    return _CUR.get()
+
+
+def current_trace_id() -> str:
+    sp = _CUR.get()
+    return sp.trace_id if sp is not None else ""
+
+
+def inject(data: Any):
+    """신호 dict 에 현재 추적 컨텍스트를 싣는다(큐/공유 큐 통과용)"""
+    sp = _CUR.get()
+    if sp is not None and isinstance(data, dict) and CARRIER_KEY not in data:
+        data[CARRIER_KEY] = sp.traceparent()
+
+
+def extract(data: Any) -> Optional[_Remote]:
+    tp = data.get(CARRIER_KEY) if isinstance(data, dict) else None
+    if not isinstance(tp, str):
+        return None
+    parts = tp.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return _Remote(parts[1], parts[2], parts[3] == "01")
+
+
+@contextmanager
+def span(name: str, parent=None, root: bool = False, kind: str = "internal",
+         start: Optional[float] = None, **attrs):
+    """
+    parent 미지정 → 현재 span 의 자식. 현재 span 도 없으면 root=True 일 때만 새 추적 시작(아니면 no-op, None)
+    start: 과거 시각(epoch 초)부터 시작한 span(예: 큐 대기)
+    """
+    if not TRACE_ENABLE:
+        yield None
+        return
+    if parent is None:
+        parent = _CUR.get()
+        if parent is None and not root:
+            yield None
+            return
+    sp = Span(name, parent, kind, start)
+    if attrs:
+        sp.attrs.update(attrs)
+    tok = _CUR.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _CUR.reset(tok)
+        sp.end()
+
+
+def record(name: str, start: float, end: float, **attrs):
+    """이미 끝난 구간(예: 큐 대기)을 현재 span 의 자식으로 기록"""
+    parent = _CUR.get()
+    if not TRACE_ENABLE or parent is None:
+        return
+    sp = Span(name, parent, "internal", start)
+    sp.attrs.update(attrs)
+    sp.end(end)
+
+
+def traced(name: Optional[str] = None, kind: str = "internal"):
+    """활성 추적 안에서 호출될 때만 자식 span 을 만드는 데코레이터"""
+    def deco(fn: Callable) -> Callable:
+        nm = name or fn.__name__
+        @functools.wraps(fn)
+        def _run(*args, **kwargs):
+            if _CUR.get() is None:
+                return fn(*args, **kwargs)
+            with span(nm, kind=kind):
+                return fn(*args, **kwargs)
+        return _run
+    return deco
+
+
+def bind(fn: Callable) -> Callable:
+    """현재 span 을 캡처해 다른 스레드(풀)에서도 같은 추적의 자식으로 실행"""
+    sp = _CUR.get()
+    if sp is None:
+        return fn
+    def _run(*args, **kwargs):
+        tok = _CUR.set(sp)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _CUR.reset(tok)
+    return _run
+
+
+# ----------------------- 내보내기 -----------------------
+def _attr(k: str, v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"key": k, "value": {"boolValue": v}}
+    if isinstance(v, int):
+        return {"key": k, "value": {"intValue": str(v)}}
+    if isinstance(v, float):
+        return {"key": k, "value": {"doubleValue": v}}
+    return {"key": k, "value": {"stringValue": str(v)}}
+
+
+def _otlp(sp: Span, reason: str) -> Dict[str, Any]:
+    attrs = [_attr(k, v) for k, v in sp.attrs.items() if v is not None]
+    attrs.append(_attr("sampling.reason", reason))
+    return {
+        "resource": {"attributes": [_attr("service.name", SERVICE_NAME)]},
+        "traceId": sp.trace_id, "spanId": sp.span_id, "parentSpanId": sp.parent_id,
+        "name": sp.name, "kind": _KINDS.get(sp.kind, "SPAN_KIND_INTERNAL"),
+        "startTimeUnixNano": str(sp.start_ns), "endTimeUnixNano": str(sp.end_ns or time.time_ns()),
+        "attributes": attrs,
+        "status": {"code": "STATUS_CODE_ERROR", "message": sp.error} if sp.error else {"code": "STATUS_CODE_UNSET"},
+    }
+
+
+def _flush(root: Span):
+    _STATS["segments"] += 1
+    spans = root.seg
+    if any(s.error for s in spans):
+        reason = "error"
+    elif root.sampled:
+        reason = "sampled"
+    elif TRACE_SLOW_MS > 0 and root.ms >= TRACE_SLOW_MS:
+        reason = "slow"
+    else:
+        return
+    _STATS[reason] += 1
+    if not TRACE_FILE:
+        return
+    _ensure_writer()
+    try:
+        _OUT.put_nowait((reason, list(spans)))
+    except queue.Full:
+        _STATS["dropped"] += 1
+
+
+def _ensure_writer():
+    global _WRITER
+    if _WRITER and _WRITER.is_alive():
+        return
+    with _WLOCK:
+        if _WRITER and _WRITER.is_alive():
+            return
+        _WRITER = threading.Thread(target=_write_loop, name="trace-writer", daemon=True)
+        _WRITER.start()
+
+
+def _write_loop():
+    d = os.path.dirname(TRACE_FILE)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    h = RotatingFileHandler(TRACE_FILE, maxBytes=int(TRACE_FILE_MAX_MB * 1024 * 1024),
+                            backupCount=TRACE_FILE_KEEP, encoding="utf-8")
+    h.setFormatter(logging.Formatter("%(message)s"))
+    while True:
+        reason, spans = _OUT.get()
+        try:
+            for sp in spans:
+                h.emit(logging.makeLogRecord({"msg": json.dumps(_otlp(sp, reason), separators=(",", ":"))}))
+            _STATS["written"] += 1
+            _STATS["spans"] += len(spans)
+        except Exception as e:
+            print("trace write error:", e)
+
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": TRACE_ENABLE, "sample": TRACE_SAMPLE, "slow_ms": TRACE_SLOW_MS, "file": TRACE_FILE or None,
+            "queue": _OUT.qsize(), **_STATS}
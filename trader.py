@@ -1,12 +1,22 @@
 # trader.py
 # -*- coding: utf-8 -*-
-import os, time, threading
-from typing import Dict, Optional
+import os, time, threading, heapq, itertools, random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 from bitget_api import (
     convert_symbol, get_last_price, get_open_positions,
     place_market_order, place_reduce_by_size, get_symbol_spec, round_down_step,
+    wait_position_size, place_market_order_by_size, get_position_mode,
+    flash_close_position, get_positions_snapshot, fetch_open_positions, Position, ORDER_UNKNOWN_CODES,
+    AccountLocal, account_names, current_account_name, bind_account,
 )
+import indicators
+import orderbook
+import tracing
+from reconcile import diff_tables, DriftTracker
+from pos_state import PosRecord, StateTable, POS_STATE_EVICT_SEC
 
 # 텔레그램 래퍼 (없어도 동작)
 try:
@@ -15,6 +25,12 @@ except Exception:
     def send_telegram(msg: str):
         print("[TG]", msg)
 
+# 멀티 계정이면 알림에 계정명 표기
+if len(account_names()) > 1:
+    _send_telegram_raw = send_telegram
+    def send_telegram(msg: str):
+        _send_telegram_raw(f"[{current_account_name()}] {msg}")
+
 # ============================================================================
 # ENV
 # ============================================================================
@@ -38,7 +54,17 @@ STOP_ROE_LONG       = float(os.getenv("STOP_ROE_LONG", "-10"))  # % (음수)
 STOP_ROE_SHORT      = float(os.getenv("STOP_ROE_SHORT", "-7"))   # % (음수)
 STOP_ROE_COOLDOWN   = float(os.getenv("STOP_ROE_COOLDOWN", "20"))
 
-RECON_INTERVAL_SEC = float(os.getenv("RECON_INTERVAL_SEC", "40"))
+RECON_INTERVAL_SEC = float(os.getenv("RECON_INTERVAL_SEC", "40"))   # 첫 재시도 지연 = 백오프 기준
+RECON_BACKOFF_MAX_SEC = float(os.getenv("RECON_BACKOFF_MAX_SEC", "600"))
+RECON_JITTER       = float(os.getenv("RECON_JITTER", "0.2"))         # ±20%
+RECON_MAX_ATTEMPTS = int(os.getenv("RECON_MAX_ATTEMPTS", "8"))       # 실제 주문 시도 횟수 상한
+
+# 스냅샷 diff 리컨실(로컬 포지션 상태 ↔ 거래소 전체)
+RECON_DIFF_ENABLE    = os.getenv("RECON_DIFF_ENABLE", "1") == "1"
+RECON_DIFF_SEC       = float(os.getenv("RECON_DIFF_SEC", "15"))
+RECON_DIFF_MAX_AGE   = float(os.getenv("RECON_DIFF_MAX_AGE", "3"))    # 워치독이 게시한 스냅샷 재사용 허용 나이
+RECON_DIFF_GRACE_SEC = float(os.getenv("RECON_DIFF_GRACE_SEC", "10")) # 갓 생성된 로컬 항목은 remove 보류
+RECON_DIFF_TOL       = float(os.getenv("RECON_DIFF_TOL", "0.01"))     # 수량 상대 오차 허용
 TP_EPSILON_RATIO   = float(os.getenv("TP_EPSILON_RATIO", "0.001"))
 
 MAX_OPEN_POSITIONS = int(os.getenv("MAX_OPEN_POSITIONS", "40"))
@@ -68,6 +94,19 @@ SHORT_TRAIL_ENABLE = os.getenv("SHORT_TRAIL_ENABLE", "1") == "1"
 SHORT_TRAIL_ARM_PCT   = float(os.getenv("SHORT_TRAIL_ARM_PCT", "7.0"))    # +7% 도달 시 무장
 SHORT_TRAIL_EXIT_PCT  = float(os.getenv("SHORT_TRAIL_EXIT_PCT", "-1.0"))  # -1% 찍히면 종료
 
+# [추가] 리버설 네팅 — 원웨이: (기존+신규) 단일 주문, 헤지: 청산/진입 동시 전송
+REVERSAL_NETTING = os.getenv("REVERSAL_NETTING", "1") == "1"
+
+# 보유 구성이 그대로여도 지표 트랙을 다시 맞추는 주기(부착 실패 재시도용)
+INDICATOR_RESYNC_SEC = float(os.getenv("INDICATOR_RESYNC_SEC", "30"))
+
+# [추가] 일괄 청산(mass exit) — 스냅샷 1회 → 병렬 청산 → 확인 스냅샷 1회 → 잔여는 리컨실러
+MASS_EXIT_CONCURRENCY  = int(os.getenv("MASS_EXIT_CONCURRENCY", "8"))
+MASS_EXIT_MAX_RPS      = float(os.getenv("MASS_EXIT_MAX_RPS", "10"))      # 주문 전송 속도 상한(레이트리밋 예산)
+MASS_EXIT_FLASH        = os.getenv("MASS_EXIT_FLASH", "1") == "1"         # flash close 우선, 실패 시 reduce
+MASS_EXIT_CONFIRM_WAIT = float(os.getenv("MASS_EXIT_CONFIRM_WAIT", "3.0"))     # 0 확인 최대 대기
+MASS_EXIT_CONFIRM_POLL = float(os.getenv("MASS_EXIT_CONFIRM_POLL", "0.5"))     # 확인 스냅샷 간격(주기당 조회 1회)
+
 def _env_float(name: str, default: float) -> float:
     try:
         return float(os.getenv(name, str(default)))
@@ -79,71 +118,120 @@ def _env_bool(name: str, default: bool) -> bool:
     return v in ("1", "true", "yes", "on")
 
 # ============================================================================
-# 상태/락
+# 상태/락 — 포지션/펜딩/가드 상태는 계정별(AccountLocal: 현재 계정 기준으로 위임)
 # ============================================================================
-_CAPACITY = {"blocked": False, "last_count": 0, "short_blocked": False, "short_count": 0, "ts": 0.0}
+_CAPACITY = AccountLocal(lambda n: {"blocked": False, "last_count": 0, "short_blocked": False, "short_count": 0, "ts": 0.0})
 _CAP_LOCK = threading.Lock()
 
-position_data: Dict[str, dict] = {}
-_POS_LOCK = threading.RLock()
-
-_KEY_LOCKS: Dict[str, threading.RLock] = {}
-_KEY_LOCKS_LOCK = threading.Lock()
+# 포지션별 상태: (심볼, 사이드)당 레코드 1개 — 로컬 포지션/키 락/STOP·ROE 쿨다운/트레일/진입 가드
+class _FutState(PosRecord):
+    __slots__ = ("entry_usd", "entry_price", "size", "ts", "seeded", "be_armed", "be_entry",
+                 "stop_ts", "roe_close_ts", "roe_dbg_sent", "trail_armed", "trail_peak",
+                 "busy_ts", "ok_ts", "miss_warned")
+
+    def __init__(self, symbol: str, side: str, lock):
+        super().__init__(symbol, side, lock)
+        self.entry_usd = self.entry_price = self.ts = 0.0
+        self.size: Optional[float] = None      # None = 수량 미상(리컨실러가 채움)
+        self.seeded = self.be_armed = False
+        self.be_entry = 0.0
+        self.stop_ts = self.roe_close_ts = 0.0
+        self.roe_dbg_sent = False               # ROE 디버그 1회 전송 표식
+        self.trail_armed = self.trail_peak = 0.0  # SHORT TRAIL: 무장 시각 / 최대 ROE(%)
+        self.busy_ts = self.ok_ts = 0.0         # 진입 인플라이트 / 최근 성공
+        self.miss_warned = False
+
+# 종료 후 보존 시간은 쿨다운/중복 가드 TTL 보다 짧으면 안 된다
+_STATES = AccountLocal(lambda n: StateTable(_FutState, evict_sec=max(
+    POS_STATE_EVICT_SEC, ENTRY_DUP_TTL_SEC, ENTRY_INFLIGHT_TTL_SEC, STOP_ROE_COOLDOWN, STOP_COOLDOWN_SEC)))
 
 def _key(symbol: str, side: str) -> str:
     return f"{symbol}_{side}"
 
-def _lock_for(key: str):
-    with _KEY_LOCKS_LOCK:
-        if key not in _KEY_LOCKS:
-            _KEY_LOCKS[key] = threading.RLock()
-    return _KEY_LOCKS[key]
+def _st(symbol: str, side: str) -> _FutState:
+    return _STATES.cur().ensure(symbol, side)
+
+def _st_get(symbol: str, side: str) -> Optional[_FutState]:
+    return _STATES.cur().get(symbol, side)
+
+def _open_local(rec: _FutState, entry_usd: float, entry_price: float, now: float,
+                size: Optional[float] = None, seeded: bool = False):
+    with rec.lock:
+        rec.entry_usd, rec.entry_price, rec.ts = entry_usd, entry_price, now
+        rec.size, rec.seeded = size, seeded
+        rec.be_armed, rec.be_entry = False, 0.0
+        rec.stop_ts = 0.0
+        rec.trail_armed = rec.trail_peak = 0.0
+        rec.opened(now)
+        _STATES.cur().adopt(rec)   # 주문 왕복 중 evict 됐으면 다시 등록
+
+def _close_local(rec: Optional[_FutState], now: Optional[float] = None, ok: bool = False, cool: bool = False):
+    """로컬 포지션 종료 표시. ok=재진입 중복 가드, cool=ROE STOP 쿨다운 시작"""
+    if rec is None:
+        return
+    now = now or time.time()
+    with rec.lock:
+        rec.closed(now)
+        rec.trail_armed = rec.trail_peak = 0.0
+        if ok: rec.ok_ts = now
+        if cool: rec.roe_close_ts = now
 
 def _local_open_count() -> int:
-    with _POS_LOCK:
-        return len(position_data)
+    return len(_STATES.cur().open_records())
 
 def _local_has_any(symbol: str) -> bool:
     symbol = convert_symbol(symbol)
-    with _POS_LOCK:
-        for k in position_data.keys():
-            if k.startswith(symbol + "_"):
-                return True
+    t = _STATES.cur()
+    for side in ("long", "short"):
+        rec = t.get(symbol, side)
+        if rec is not None and rec.open:
+            return True
     return False
 
 # STOP 쿨다운(연타 방지)
-_STOP_FIRED: Dict[str, float] = {}
-_STOP_LOCK = threading.Lock()
-def _should_fire_stop(key: str) -> bool:
+def _should_fire_stop(rec: _FutState) -> bool:
     now = time.time()
-    with _STOP_LOCK:
-        last = _STOP_FIRED.get(key, 0.0)
-        if now - last < STOP_COOLDOWN_SEC:
+    with rec.lock:
+        if now - rec.stop_ts < STOP_COOLDOWN_SEC:
             return False
-        _STOP_FIRED[key] = now
+        rec.stop_ts = now
         return True
 
-_last_roe_close_ts: Dict[str, float] = {}
-
-# [추가] ROE 디버그 1회 전송 표식
-_ROE_DBG_SENT: Dict[str, bool] = {}
-
-# [추가] SHORT TRAIL 상태 (심볼_사이드별)
-#  - armed: ARM 임계치 도달 후 True
-#  - peak:  지금까지의 최대 ROE(%) (정보용)
-_SHORT_TRAIL: Dict[str, Dict[str, float]] = {}
-_TRAIL_LOCK = threading.Lock()
-
 # ============================================================================
 # Pending
 # ============================================================================
-_PENDING = {"entry": {}, "close": {}, "tp": {}}
+_PENDING = AccountLocal(lambda n: {"entry": {}, "close": {}, "tp": {}})
 _PENDING_LOCK = threading.RLock()
 
 def _pending_key_entry(symbol: str, side: str) -> str: return f"{_key(symbol, side)}:entry"
 def _pending_key_close(symbol: str, side: str) -> str: return f"{_key(symbol, side)}:close"
 def _pending_key_tp3(symbol: str, side: str)   -> str: return f"{_key(symbol, side)}:tp3"
 
+# 재시도 스케줄: (due, seq, typ, pkey) 최소 힙. 완료/재예약된 항목은 pop 시 버림
+# 계정별 {"heap": [...], "cv": Condition} — 계정마다 리컨실러 스레드가 따로 돈다
+_RETRY = AccountLocal(lambda n: {"heap": [], "cv": threading.Condition(_PENDING_LOCK)})
+_RETRY_SEQ = itertools.count()
+
+def _retry_delay(attempts: int) -> float:
+    base = min(RECON_BACKOFF_MAX_SEC, RECON_INTERVAL_SEC * (2 ** max(0, int(attempts))))
+    return max(0.5, base * (1.0 + random.uniform(-RECON_JITTER, RECON_JITTER)))
+
+def _schedule_retry(typ: str, pkey: str, delay: Optional[float] = None):
+    rt = _RETRY.cur()
+    with rt["cv"]:
+        item = _PENDING.get(typ, {}).get(pkey)
+        if item is None:
+            return
+        due = time.time() + (_retry_delay(item.get("attempts", 0)) if delay is None else max(0.0, delay))
+        item["due"] = due
+        heapq.heappush(rt["heap"], (due, next(_RETRY_SEQ), typ, pkey))
+        rt["cv"].notify()
+
+def _pending_add(typ: str, pkey: str, item: dict):
+    with _PENDING_LOCK:
+        _PENDING[typ][pkey] = item
+        _schedule_retry(typ, pkey)
+
 def _mark_done(typ: str, pkey: str, note: str = ""):
     with _PENDING_LOCK:
         _PENDING.get(typ, {}).pop(pkey, None)
@@ -151,13 +239,15 @@ def _mark_done(typ: str, pkey: str, note: str = ""):
         send_telegram(f"✅ pending done [{typ}] {pkey} {note}")
 
 def get_pending_snapshot() -> Dict[str, Dict]:
-    with _PENDING_LOCK, _CAP_LOCK, _POS_LOCK:
+    with _PENDING_LOCK, _CAP_LOCK:
         return {
             "counts": {k: len(v) for k, v in _PENDING.items()},
             "entry_keys": list(_PENDING["entry"].keys()),
             "close_keys": list(_PENDING["close"].keys()),
             "tp_keys": list(_PENDING["tp"].keys()),
             "interval": RECON_INTERVAL_SEC,
+            "scheduled": len(_RETRY["heap"]),
+            "next_due_in": (round(_RETRY["heap"][0][0] - time.time(), 1) if _RETRY["heap"] else None),
             "debug": RECON_DEBUG,
             "capacity": {
                 "blocked": _CAPACITY["blocked"],
@@ -168,7 +258,8 @@ def get_pending_snapshot() -> Dict[str, Dict]:
                 "interval": CAP_CHECK_SEC,
                 "ts": _CAPACITY["ts"],
             },
-            "local_keys": list(position_data.keys()),
+            "local_keys": [r.key for r in _STATES.cur().open_records()],
+            "states": _STATES.cur().stats(),
         }
 
 # ============================================================================
@@ -185,21 +276,24 @@ def _to_float(x) -> float:
     except Exception:
         return 0.0
 
-def _get_remote(symbol: str, side: Optional[str] = None):
+def _get_remote(symbol: str, side: Optional[str] = None, positions: Optional[List[Position]] = None):
     symbol = convert_symbol(symbol)
-    for p in get_open_positions():
-        s = (p.get("side") or p.get("holdSide") or p.get("positionSide") or "").lower()
-        if p.get("symbol") == symbol and (side is None or s == side):
+    for p in (get_open_positions() if positions is None else positions):
+        if p.symbol == symbol and (side is None or p.side == side):
             return p
     return None
 
-def _get_remote_any_side(symbol: str):
+def _get_remote_any_side(symbol: str, positions: Optional[List[Position]] = None):
     symbol = convert_symbol(symbol)
-    for p in get_open_positions():
-        if p.get("symbol") == symbol and _to_float(p.get("size")) > 0:
+    for p in (get_open_positions() if positions is None else positions):
+        if p.symbol == symbol and p.size > 0:
             return p
     return None
 
+def wait_until_flat(symbol: str, side: str, timeout: float = 5.0) -> bool:
+    """(symbol, side) 원격 포지션이 0이 될 때까지 대기(포지션 갱신 알림 기반, 고정 sleep 없음)"""
+    return wait_position_size(convert_symbol(symbol), side.lower(), 0.0, timeout)
+
 # PnL/ROE
 def _pnl_usdt(entry: float, exit: float, notional: float, side: str) -> float:
     pct = (exit - entry) / entry if side == "long" else (entry - exit) / entry
@@ -227,20 +321,18 @@ def _calc_roe_pct(entry_price: float, mark_price: float, side: str, leverage: fl
     except Exception:
         return 0.0
 
-def _calc_roe_from_exchange_fields(p: dict, entry: float, last: float, side: str, fallback_lev: float) -> float:
-    # 1) 거래소 제공 값 우선
-    margin  = _to_float(p.get("margin") or p.get("marginSize") or p.get("isolatedMargin") or 0.0)
-    upnl    = _to_float(p.get("unrealizedPnl") or p.get("unrealisedPnl") or 0.0)
-    lev_pos = _to_float(p.get("leverage") or p.get("marginLeverage") or 0.0)
-    if margin > 0:
-        return (upnl / margin) * 100.0
+def _calc_roe_from_exchange_fields(p: Position, entry: float, last: float, side: str, fallback_lev: float) -> float:
+    # 1) 거래소 제공 값 우선(증거금/미실현손익 — 파서가 float 로 변환해 둠)
+    roe = p.roe_pct()
+    if roe is not None:
+        return roe
     # 2) 포지션/환경 레버리지로 산출
-    lev = lev_pos if lev_pos > 0 else fallback_lev
+    lev = p.leverage if p.leverage > 0 else fallback_lev
     roe = _calc_roe_pct(entry, last, side, lev)
     if roe != 0.0:
         return roe
     # 3) 최후: notional/증거금 추정
-    size = _to_float(p.get("size") or p.get("positionAmt") or 0.0)
+    size = p.size
     if size > 0 and entry > 0:
         notional = entry * size
         margin_est = max(1e-9, notional / max(1.0, lev if lev > 0 else fallback_lev))
@@ -248,12 +340,27 @@ def _calc_roe_from_exchange_fields(p: dict, entry: float, last: float, side: str
         return (pnl / margin_est) * 100.0
     return 0.0
 
+def seed_local_positions(positions: List[Position]) -> int:
+    """기동 직후 원격 포지션을 로컬 상태로 적재(재시작으로 비어 있는 로컬 상태 복구). 추가 건수 반환"""
+    added = 0
+    now = time.time()
+    for p in positions or []:
+        symbol, side = p.symbol, p.side
+        rec = _st(symbol, side)
+        with rec.lock:
+            if rec.open:
+                continue
+            entry = p.entry_price
+            _open_local(rec, entry * p.size, entry, now, seeded=True)
+        added += 1
+    return added
+
 # ============================================================================
 # 용량 가드
 # ============================================================================
-def _total_open_positions_now() -> int:
+def _total_open_positions_now(positions: Optional[List[Position]] = None) -> int:
     try:
-        return len(get_open_positions()) + _local_open_count()
+        return len(get_open_positions() if positions is None else positions) + _local_open_count()
     except:
         return _local_open_count()
 
@@ -302,133 +409,309 @@ def _capacity_loop():
         time.sleep(CAP_CHECK_SEC)
 
 def start_capacity_guard():
-    threading.Thread(target=_capacity_loop, name="capacity-guard", daemon=True).start()
+    threading.Thread(target=bind_account(_capacity_loop), name=f"capacity-guard-{current_account_name()}", daemon=True).start()
 
 # ============================================================================
 # 진입 인플라이트/중복 가드
 # ============================================================================
-_ENTRY_BUSY: Dict[str, float] = {}
-_RECENT_OK: Dict[str, float]  = {}
-_ENTRY_G_LOCK = threading.Lock()
+# 레코드 필드 1개 대입/읽기라 별도 락 없음
+def _set_busy(rec: _FutState):
+    rec.busy_ts = time.time()
+
+def _clear_busy(rec: _FutState):
+    rec.busy_ts = 0.0
 
-def _set_busy(key: str):
-    with _ENTRY_G_LOCK:
-        _ENTRY_BUSY[key] = time.time()
+def _is_busy(rec: Optional[_FutState]) -> bool:
+    return rec is not None and (time.time() - rec.busy_ts) < ENTRY_INFLIGHT_TTL_SEC
 
-def _clear_busy(key: str):
-    with _ENTRY_G_LOCK:
-        _ENTRY_BUSY.pop(key, None)
+def _mark_recent_ok(rec: _FutState):
+    rec.ok_ts = time.time()
 
-def _is_busy(key: str) -> bool:
-    with _ENTRY_G_LOCK:
-        ts = _ENTRY_BUSY.get(key, 0.0)
-    return (time.time() - ts) < ENTRY_INFLIGHT_TTL_SEC
+def _recent_ok(rec: Optional[_FutState]) -> bool:
+    return rec is not None and (time.time() - rec.ok_ts) < ENTRY_DUP_TTL_SEC
+
+# ============================================================================
+# 프리트레이드 컨텍스트 / 진입 지연 분해
+#  - 신호당 1회: positions/price/mode/spec 를 병렬 조회 → 승인·사이징·주문 단계에 그대로 전달
+# ============================================================================
+_IO_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="trader-io")
 
-def _mark_recent_ok(key: str):
-    with _ENTRY_G_LOCK:
-        _RECENT_OK[key] = time.time()
+ENTRY_LAT_KEEP = int(os.getenv("ENTRY_LAT_KEEP", "200"))
+_ENTRY_LAT = AccountLocal(lambda n: deque(maxlen=ENTRY_LAT_KEEP))
+_ENTRY_LAT_LOCK = threading.Lock()
 
-def _recent_ok(key: str) -> bool:
-    with _ENTRY_G_LOCK:
-        ts = _RECENT_OK.get(key, 0.0)
-    return (time.time() - ts) < ENTRY_DUP_TTL_SEC
+@tracing.traced("trader.pretrade")
+def pretrade_context(symbol: str) -> dict:
+    """진입 경로 1회 프리페치(포지션/가격/모드/스펙) — 플립 판단과 진입이 같은 ctx 를 공유"""
+    t0 = time.time()
+    symbol = convert_symbol(symbol)
+    f_pos  = _IO_POOL.submit(bind_account(get_open_positions))
+    f_px   = _IO_POOL.submit(tracing.bind(get_last_price), symbol)
+    f_mode = _IO_POOL.submit(bind_account(get_position_mode), symbol)
+    spec   = get_symbol_spec(symbol)
+    ctx = {"symbol": symbol, "spec": spec, "positions": None, "price": 0.0, "mode": None,
+           "lat": {}, "t0": t0}
+    try: ctx["positions"] = f_pos.result()
+    except Exception as e: print("pretrade positions error:", e)
+    try: ctx["price"] = _to_float(f_px.result())
+    except Exception as e: print("pretrade price error:", e)
+    try: ctx["mode"] = f_mode.result()
+    except Exception: pass
+    ctx["lat"]["prefetch"] = (time.time() - t0) * 1000.0
+    return ctx
+
+def _lat_mark(ctx: dict, stage: str, since: float) -> float:
+    now = time.time()
+    ctx["lat"][stage] = (now - since) * 1000.0
+    return now
+
+def _record_entry_latency(ctx: dict, symbol: str, side: str, outcome: str):
+    ctx["lat"]["total"] = (time.time() - ctx["t0"]) * 1000.0
+    row = {"ts": ctx["t0"], "symbol": symbol, "side": side, "outcome": outcome,
+           **{k: round(v, 1) for k, v in ctx["lat"].items()}}
+    with _ENTRY_LAT_LOCK:
+        _ENTRY_LAT.cur().append(row)
+    sp = tracing.current()
+    if sp is not None:
+        sp.set(outcome=outcome, **{f"lat.{k}_ms": round(v, 1) for k, v in ctx["lat"].items()})
+    if TRACE_LOG:
+        parts = " ".join(f"{k}={v:.0f}ms" for k, v in ctx["lat"].items())
+        send_telegram(f"⏱️ entry {symbol} {side} {outcome} {parts}")
+
+def _pctl(vals: List[float], q: float) -> float:
+    if not vals: return 0.0
+    v = sorted(vals)
+    return v[min(len(v) - 1, int(round(q * (len(v) - 1))))]
+
+def get_entry_latency_snapshot() -> dict:
+    with _ENTRY_LAT_LOCK:
+        rows = list(_ENTRY_LAT.cur())
+    stages = ("prefetch", "admission", "order", "total")
+    summary = {}
+    for st in stages:
+        vals = [r[st] for r in rows if st in r]
+        summary[st] = {"n": len(vals), "p50": _pctl(vals, 0.50), "p95": _pctl(vals, 0.95), "max": max(vals) if vals else 0.0}
+    return {"summary_ms": summary, "recent": rows[-30:]}
 
 # ============================================================================
 # 주문
 # ============================================================================
-def enter_position(symbol: str, usdt_amount: float, side: str = "long", leverage: float = None):
+@tracing.traced("trader.enter")
+def enter_position(symbol: str, usdt_amount: float, side: str = "long", leverage: float = None,
+                   ctx: Optional[dict] = None):
+    """ctx: 호출부가 이미 만든 pretrade_context(같은 심볼, 그 사이 포지션 변화 없음)면 재조회하지 않는다"""
     symbol = convert_symbol(symbol); side = side.lower()
-    key    = _key(symbol, side)
+    rec    = _st(symbol, side)
     lev    = float(leverage or _env_float("LEVERAGE", LEVERAGE))
     pkey   = _pending_key_entry(symbol, side)
-    trace  = os.getenv("CURRENT_TRACE_ID", "")
+    trace  = tracing.current_trace_id()
 
     if TRACE_LOG:
         send_telegram(f"🔎 ENTRY request trace={trace} {symbol} {side} amt={usdt_amount}")
 
-    if _is_busy(key) or _recent_ok(key):
-        if RECON_DEBUG: send_telegram(f"⏸️ skip entry (busy/recent) {key}")
+    if _is_busy(rec) or _recent_ok(rec):
+        if RECON_DEBUG: send_telegram(f"⏸️ skip entry (busy/recent) {rec.key}")
         return
 
-    if not _strict_try_reserve(side):
+    if ctx is None or ctx.get("symbol") != symbol:
+        ctx = pretrade_context(symbol)
+    positions = ctx["positions"]
+    t_adm = time.time()
+
+    if not _strict_try_reserve(side, positions):
         st = capacity_status()
         send_telegram(f"🧱 STRICT HOLD {symbol} {side} {st['last_count']}/{MAX_OPEN_POSITIONS}")
+        _lat_mark(ctx, "admission", t_adm); _record_entry_latency(ctx, symbol, side, "strict_hold")
         return
 
+    outcome = "aborted"
     try:
         if not can_enter_now(side):
             st = capacity_status()
             send_telegram(f"⏳ ENTRY HOLD (periodic) {symbol} {side} {st['last_count']}/{MAX_OPEN_POSITIONS}")
+            outcome = "cap_hold"
             return
 
-        with _PENDING_LOCK:
-            _PENDING["entry"][pkey] = {
-                "symbol": symbol, "side": side, "amount": usdt_amount,
-                "leverage": lev, "created": time.time(), "last_try": 0.0, "attempts": 0
-            }
+        _pending_add("entry", pkey, {
+            "symbol": symbol, "side": side, "amount": usdt_amount,
+            "leverage": lev, "created": time.time(), "last_try": 0.0, "attempts": 0
+        })
         if RECON_DEBUG: send_telegram(f"📌 pending add [entry] {pkey}")
 
-        with _lock_for(key):
-            if _local_has_any(symbol) or _get_remote_any_side(symbol) or _recent_ok(key):
-                _mark_done("entry", pkey, "(exists/recent)"); return
+        with rec.op:
+            if _local_has_any(symbol) or _get_remote_any_side(symbol, positions) or _recent_ok(rec):
+                _mark_done("entry", pkey, "(exists/recent)"); outcome = "exists"; return
 
-            _set_busy(key)
+            _set_busy(rec)
 
-            last = _to_float(get_last_price(symbol))
+            last = ctx["price"]
             if last <= 0:
                 if TRACE_LOG: send_telegram(f"❗ ticker_fail {symbol} trace={trace}")
+                outcome = "ticker_fail"
                 return
+            t_ord = _lat_mark(ctx, "admission", t_adm)
 
             resp = place_market_order(
                 symbol, usdt_amount,
                 side=("buy" if side == "long" else "sell"),
-                leverage=lev, reduce_only=False
+                leverage=lev, reduce_only=False,
+                price=last, spec=ctx["spec"],
             )
+            _lat_mark(ctx, "order", t_ord)
             code = str(resp.get("code", "")) if isinstance(resp, dict) else ""
             if TRACE_LOG:
                 send_telegram(f"📦 order_resp code={code} {symbol} {side} trace={trace}")
 
             if code == "00000":
-                with _POS_LOCK:
-                    position_data[key] = {
-                        "symbol": symbol, "side": side,
-                        "entry_usd": usdt_amount, "ts": time.time(),
-                        "entry_price": last
-                    }
-                with _STOP_LOCK:
-                    _STOP_FIRED.pop(key, None)
-
-                # [추가] 숏 트레일 상태 초기화
-                if side == "short":
-                    with _TRAIL_LOCK:
-                        _SHORT_TRAIL[key] = {"armed": 0.0, "peak": 0.0}
-
+                outcome = "ok"
+                # STOP 쿨다운/숏 트레일 상태도 함께 초기화
+                _open_local(rec, usdt_amount, last, time.time())
                 _mark_done("entry", pkey)
-                _mark_recent_ok(key)
+                _mark_recent_ok(rec)
                 send_telegram(
                     f"🚀 ENTRY {side.upper()} {symbol}\n"
                     f"• Notional≈ {usdt_amount} USDT\n• Lvg: {lev}x"
                 )
             elif code.startswith("LOCAL_MIN_QTY") or code.startswith("LOCAL_BAD_QTY"):
+                outcome = "skip_qty"
                 _mark_done("entry", pkey, "(minQty/badQty)")
                 send_telegram(f"⛔ ENTRY 스킵 {symbol} {side} → {resp}")
+            elif code in ORDER_UNKNOWN_CODES:
+                # 접수 여부 미상 → pending 유지, 리컨실러가 원격 포지션을 보고 완료/재시도 판정
+                outcome = "unknown"
+                send_telegram(f"❔ ENTRY 결과 미상 {symbol} {side} ({code}) → 리컨실러 확인")
             else:
+                outcome = "order_fail"
                 if TRACE_LOG: send_telegram(f"❌ order_fail resp={resp} trace={trace}")
     finally:
-        _clear_busy(key)
+        _clear_busy(rec)
         _strict_release(side)
+        if "admission" not in ctx["lat"]:
+            _lat_mark(ctx, "admission", t_adm)
+        _record_entry_latency(ctx, symbol, side, outcome)
 
+# ============================================================================
+# 리버설 네팅 (반대 포지션 → 한 번의 주문 왕복으로 플립)
+# ============================================================================
+
+def _is_ok_resp(resp) -> bool:
+    return isinstance(resp, dict) and str(resp.get("code", "")) == "00000"
+
+def _resp_or_exc(fn, *args) -> dict:
+    """주문 호출(또는 풀 future.result) 예외를 not-ok 응답으로 — 한쪽 예외가 다른 쪽 결과/상태 기록을 막지 않도록"""
+    try:
+        return fn(*args)
+    except Exception as e:
+        print("flip order error:", e)
+        return {"code": "LOCAL_EXCEPTION", "msg": str(e)}
+
+@tracing.traced("trader.flip")
+def reverse_position(symbol: str, usdt_amount: float, side: str = "long", leverage: float = None,
+                     ctx: Optional[dict] = None) -> bool:
+    """
+    반대 포지션 보유 중 진입 신호 → 플립.
+      - one_way: 신규 방향으로 (기존 수량 + 신규 수량) 단일 시장가 주문(거래소에서 네팅)
+      - hedge  : 기존 청산(reduce)과 신규 진입을 동시에 전송
+    처리했으면 True. 반대 포지션이 없거나 원웨이 단일 주문이 거절되면 False(기존 preclear→enter 경로로).
+    ctx: pretrade_context — 넘기면 그대로 쓰고(False 일 때 호출부가 enter_position 에 다시 넘김), 없으면 여기서 조회
+    """
+    if not REVERSAL_NETTING:
+        return False
+    symbol = convert_symbol(symbol); side = side.lower()
+    opp    = "short" if side == "long" else "long"
+    rec_new, rec_old = _st(symbol, side), _st(symbol, opp)
+    lev    = float(leverage or _env_float("LEVERAGE", LEVERAGE))
+
+    if ctx is None or ctx.get("symbol") != symbol:
+        ctx = pretrade_context(symbol)
+    opp_pos, same = None, False
+    for p in ctx["positions"] or []:
+        if p.symbol != symbol or p.size <= 0:
+            continue
+        ps = p.side
+        if ps == opp: opp_pos = p
+        elif ps == side: same = True
+    if not opp_pos or same:
+        return False
+
+    if _is_busy(rec_new) or _recent_ok(rec_new):
+        if RECON_DEBUG: send_telegram(f"⏸️ skip flip (busy/recent) {rec_new.key}")
+        return True
+
+    last = ctx["price"]
+    if last <= 0:
+        return False
+    step     = _to_float(ctx["spec"].get("sizeStep", 0.001)) or 0.001
+    new_size = max(step, round_down_step(float(usdt_amount) / last, step))
+    old_size = opp_pos.size
+    mode     = ctx["mode"] or get_position_mode(symbol)
+    side_bs  = "buy" if side == "long" else "sell"
+
+    t0 = time.time()
+    r1, r2 = sorted((rec_old, rec_new), key=lambda r: r.key)
+    with r1.op, r2.op:
+        _set_busy(rec_new)
+        try:
+            if mode == "hedge":
+                f_close = _IO_POOL.submit(bind_account(place_reduce_by_size), symbol, old_size, opp)
+                f_open  = _IO_POOL.submit(bind_account(place_market_order_by_size),
+                                          symbol, new_size, side_bs, lev, ctx["spec"], last)
+                r_close, r_open = _resp_or_exc(f_close.result), _resp_or_exc(f_open.result)
+                close_ok, open_ok = _is_ok_resp(r_close), _is_ok_resp(r_open)
+            else:
+                r_open = r_close = _resp_or_exc(place_market_order_by_size, symbol, old_size + new_size,
+                                                side_bs, lev, ctx["spec"], last)
+                close_ok = open_ok = _is_ok_resp(r_open)
+                if not open_ok:
+                    if TRACE_LOG: send_telegram(f"❌ flip order_fail {symbol} {opp}->{side} → {r_open}")
+                    if str(r_open.get("code", "")) not in ORDER_UNKNOWN_CODES + ("LOCAL_EXCEPTION",):
+                        return False
+                    # 접수 여부 미상(결과 미수신/예외) → preclear/재진입으로 넘기지 않고
+                    # 아래 pending(close+entry)으로 리컨실러 판정
+        finally:
+            _clear_busy(rec_new)
+    ms = (time.time() - t0) * 1000.0
+
+    # 응답 기준으로 로컬 상태 갱신
+    now = time.time()
+    if close_ok:
+        _close_local(rec_old, now, ok=True, cool=True)
+        _mark_done("close", _pending_key_close(symbol, opp))
+    else:
+        _pending_add("close", _pending_key_close(symbol, opp), {
+            "symbol": symbol, "side": opp, "reason": "flip",
+            "created": now, "last_try": 0.0, "attempts": 0
+        })
+    if open_ok:
+        _open_local(rec_new, usdt_amount, last, now)
+        _mark_recent_ok(rec_new)
+    else:
+        _pending_add("entry", _pending_key_entry(symbol, side), {
+            "symbol": symbol, "side": side, "amount": usdt_amount,
+            "leverage": lev, "created": now, "last_try": 0.0, "attempts": 0
+        })
+
+    entry_old = opp_pos.entry_price
+    realized  = _pnl_usdt(entry_old, last, entry_old * old_size, opp) if (close_ok and entry_old > 0) else 0.0
+    send_telegram(
+        f"🔄 FLIP {opp.upper()}→{side.upper()} {symbol} ({mode}, {ms:.0f}ms)\n"
+        f"• Close: {old_size} {'OK' if close_ok else 'FAIL→pending'}\n"
+        f"• Open: {new_size} {'OK' if open_ok else 'FAIL→pending'} (≈{usdt_amount} USDT, {lev}x)\n"
+        f"• Realized≈ {realized:+.2f} USDT"
+    )
+    return True
+
+@tracing.traced("trader.take_profit")
 def take_partial_profit(symbol: str, pct: float, side: str = "long"):
     symbol = convert_symbol(symbol); side = side.lower()
-    key = _key(symbol, side)
-    with _lock_for(key):
+    with _st(symbol, side).op:
         p = _get_remote(symbol, side)
-        if not p or _to_float(p.get("size")) <= 0:
+        if not p or p.size <= 0:
             send_telegram(f"⚠️ TP 스킵: 원격 포지션 없음 {_key(symbol, side)}")
             return
 
         size_step = _to_float(get_symbol_spec(symbol).get("sizeStep", 0.001))
-        cur_size  = _to_float(p.get("size"))
+        cur_size  = p.size
         pct       = max(0.0, min(1.0, float(pct)))
         cut_size  = round_down_step(cur_size * pct, size_step)
         if cut_size <= 0:
@@ -438,8 +721,8 @@ def take_partial_profit(symbol: str, pct: float, side: str = "long"):
         if abs(pct - 1.0) < 1e-9 and TP3_CLOSE_IMMEDIATE:
             resp = place_reduce_by_size(symbol, cur_size, side)
             if str(resp.get("code", "")) == "00000":
-                exit_price = _to_float(get_last_price(symbol)) or _to_float(p.get("entry_price"))
-                entry = _to_float(p.get("entry_price"))
+                exit_price = _to_float(get_last_price(symbol)) or p.entry_price
+                entry = p.entry_price
                 realized = _pnl_usdt(entry, exit_price, entry * cur_size, side)
                 send_telegram(
                     f"🤑 TP3 FULL CLOSE {side.upper()} {symbol}\n"
@@ -457,45 +740,45 @@ def take_partial_profit(symbol: str, pct: float, side: str = "long"):
         else:
             send_telegram(f"❌ TP 실패 {symbol} {side} → {resp}")
 
-def close_position(symbol: str, side: str = "long", reason: str = "manual"):
+@tracing.traced("trader.close")
+def close_position(symbol: str, side: str = "long", reason: str = "manual") -> bool:
+    """청산. 거래소 기준 정리 확인(성공 응답 또는 원격 포지션 없음)이면 True, 실패/pending 만 남긴 경우 False"""
     symbol = convert_symbol(symbol); req_side = side.lower()
     key_req  = _key(symbol, req_side)
     pkey     = _pending_key_close(symbol, req_side)
 
-    with _PENDING_LOCK:
-        _PENDING["close"][pkey] = {
-            "symbol": symbol, "side": req_side, "reason": reason,
-            "created": time.time(), "last_try": 0.0, "attempts": 0
-        }
+    _pending_add("close", pkey, {
+        "symbol": symbol, "side": req_side, "reason": reason,
+        "created": time.time(), "last_try": 0.0, "attempts": 0
+    })
     if RECON_DEBUG: send_telegram(f"📌 pending add [close] {pkey}")
 
     if CLOSE_IMMEDIATE:
-        p = _get_remote(symbol, req_side) or _get_remote_any_side(symbol)
-        if not p or _to_float(p.get("size")) <= 0:
-            with _POS_LOCK: position_data.pop(key_req, None)
+        positions = fetch_open_positions()
+        if positions is None:
+            # 조회 실패를 '원격 없음'으로 보면 열린 포지션을 청산 완료로 처리하게 됨 → pending 유지
+            send_telegram(f"⚠️ CLOSE 보류: 포지션 조회 실패 {key_req} ({reason}) → 리컨실러 재시도")
+            return False
+        p = _get_remote(symbol, req_side, positions) or _get_remote_any_side(symbol, positions)
+        if not p or p.size <= 0:
+            _close_local(_st_get(symbol, req_side))
             _mark_done("close", pkey, "(no-remote)")
             send_telegram(f"⚠️ CLOSE 스킵: 원격 포지션 없음 {key_req} ({reason})")
-            return
+            return True
 
-        pos_side = (p.get("side") or p.get("holdSide") or p.get("positionSide") or "").lower()
-        key_real = _key(symbol, pos_side)
-        with _lock_for(key_real):
-            size = _to_float(p.get("size"))
+        pos_side = p.side
+        rec_real = _st(symbol, pos_side)
+        with rec_real.op:
+            size = p.size
             resp = place_reduce_by_size(symbol, size, pos_side)
-            exit_price = _to_float(get_last_price(symbol)) or _to_float(p.get("entry_price"))
+            exit_price = _to_float(get_last_price(symbol)) or p.entry_price
             success = str(resp.get("code", "")) == "00000"
             if success:
-                entry = _to_float(p.get("entry_price"))
+                entry = p.entry_price
                 realized = _pnl_usdt(entry, exit_price, entry * size, pos_side)
-                with _POS_LOCK: position_data.pop(key_real, None)
-
-                # [추가] 숏 트레일 상태 정리
-                with _TRAIL_LOCK:
-                    _SHORT_TRAIL.pop(key_real, None)
-
+                # 숏 트레일 정리 + ROE 쿨다운은 성공시에만
+                _close_local(rec_real, ok=True, cool=True)
                 _mark_done("close", pkey)
-                _mark_recent_ok(key_real)
-                _last_roe_close_ts[key_real] = time.time()  # 성공시에만 쿨다운
                 send_telegram(
                     f"✅ CLOSE {pos_side.upper()} {symbol} ({reason})\n"
                     f"• Exit: {exit_price}\n"
@@ -504,11 +787,14 @@ def close_position(symbol: str, side: str = "long", reason: str = "manual"):
                 )
             else:
                 send_telegram(f"❌ CLOSE 실패 {symbol} {pos_side} → {resp}")
+            return success
+    return False
 
+@tracing.traced("trader.reduce")
 def reduce_by_contracts(symbol: str, contracts: float, side: str = "long"):
     symbol = convert_symbol(symbol); side = side.lower()
     key    = _key(symbol, side)
-    with _lock_for(key):
+    with _st(symbol, side).op:
         step = _to_float(get_symbol_spec(symbol).get("sizeStep", 0.001))
         qty  = round_down_step(_to_float(contracts), step)
         if qty <= 0:
@@ -520,25 +806,135 @@ def reduce_by_contracts(symbol: str, contracts: float, side: str = "long"):
         else:
             send_telegram(f"❌ Reduce 실패 {key} → {resp}")
 
+# ============================================================================
+# 일괄 청산 (mass exit / kill-switch)
+# ============================================================================
+_MX_RATE_LOCK = threading.Lock()
+_mx_next_slot = [0.0]
+
+def _mx_rate_gate():
+    """전송 슬롯을 1/MASS_EXIT_MAX_RPS 간격으로 배정(스레드 간 공유)"""
+    if MASS_EXIT_MAX_RPS <= 0: return
+    with _MX_RATE_LOCK:
+        now = time.time()
+        slot = max(now, _mx_next_slot[0])
+        _mx_next_slot[0] = slot + 1.0 / MASS_EXIT_MAX_RPS
+    if slot > now:
+        time.sleep(slot - now)
+
+def _mass_close_one(p: dict) -> dict:
+    symbol = p.symbol; side = p.side
+    size   = p.size
+    out = {"symbol": symbol, "side": side, "size": size, "ok": False, "via": "", "code": ""}
+    try:
+        if MASS_EXIT_FLASH:
+            _mx_rate_gate()
+            resp = flash_close_position(symbol, side)
+            out.update(via="flash", code=str(resp.get("code", "")))
+            if _is_ok_resp(resp):
+                out["ok"] = True; return out
+        _mx_rate_gate()
+        resp = place_reduce_by_size(symbol, size, side)
+        out.update(via=(out["via"] + "+reduce").lstrip("+"), code=str(resp.get("code", "")))
+        out["ok"] = _is_ok_resp(resp)
+    except Exception as e:
+        out["code"] = f"EXC:{e}"
+    return out
+
+def _mass_confirm(results: List[dict], t0: float, deadline: float) -> List[Optional[float]]:
+    """
+    주기당 스냅샷 1회로 남은 대상을 한꺼번에 확인(레이트 예산을 청산 주문에 남김).
+    대상별 확인 시각(t0 기준 ms), 미확인(마감/조회 실패)이면 None — 조회 실패(None)는 아무것도 확인하지 않는다
+    """
+    flat_ms: List[Optional[float]] = [None] * len(results)
+    left = set(range(len(results)))
+    while left:
+        positions = fetch_open_positions()
+        now = time.time()
+        if positions is not None:
+            held = {(p.symbol, p.side) for p in positions if p.size > 0}
+            for i in list(left):
+                if (results[i]["symbol"], results[i]["side"]) not in held:
+                    flat_ms[i] = (now - t0) * 1000.0
+                    left.discard(i)
+        if not left or now >= deadline:
+            break
+        time.sleep(min(max(0.05, MASS_EXIT_CONFIRM_POLL), max(0.0, deadline - now)))
+    return flat_ms
+
+def close_all_positions(reason: str = "massExit", symbols: Optional[List[str]] = None, side: Optional[str] = None) -> dict:
+    """
+    보유 포지션 전체(또는 symbols/side 필터)를 병렬 청산.
+    스냅샷 1회로 대상 확정 → 레이트 예산 내 동시 전송 → 확인 스냅샷(주기당 1회, 마감까지) → 미확인은 close pending 으로 리컨실러 재시도.
+    """
+    t0 = time.time()
+    want = {convert_symbol(x) for x in symbols} if symbols else None
+    sd   = side.lower() if side else None
+    positions = fetch_open_positions()
+    if positions is None:
+        send_telegram(f"❌ MASS EXIT ({reason}): 포지션 조회 실패 → 대상 확정 불가")
+        return {"reason": reason, "targets": None, "flat": False, "error": "positions_fetch_failed", "results": []}
+    targets = [p for p in positions
+               if p.size > 0
+               and (want is None or p.symbol in want)
+               and (sd is None or p.side == sd)]
+    if not targets:
+        send_telegram(f"🧹 MASS EXIT ({reason}): 보유 포지션 없음")
+        return {"reason": reason, "targets": 0, "sent_ms": 0.0, "flat": True, "time_to_flat_ms": 0.0, "results": []}
+
+    with ThreadPoolExecutor(max_workers=max(1, MASS_EXIT_CONCURRENCY), thread_name_prefix="mass-exit") as ex:
+        results = list(ex.map(bind_account(_mass_close_one), targets))
+    sent_ms = (time.time() - t0) * 1000.0
+
+    flat_ms = _mass_confirm(results, t0, time.time() + max(0.0, MASS_EXIT_CONFIRM_WAIT))
+    confirm_ms = (time.time() - t0) * 1000.0
+
+    stragglers = []
+    now = time.time()
+    for r, fm in zip(results, flat_ms):
+        k = _key(r["symbol"], r["side"])
+        r["flat_ms"] = round(fm, 1) if fm is not None else None
+        if fm is None:
+            stragglers.append(k)
+            _pending_add("close", _pending_key_close(r["symbol"], r["side"]), {
+                "symbol": r["symbol"], "side": r["side"], "reason": reason,
+                "created": now, "last_try": 0.0, "attempts": 0
+            })
+            continue
+        _close_local(_st_get(r["symbol"], r["side"]), now, cool=True)
+        _mark_done("close", _pending_key_close(r["symbol"], r["side"]))
+
+    flat = not stragglers
+    report = {
+        "reason": reason, "targets": len(targets), "sent_ms": round(sent_ms, 1),
+        "flat": flat, "time_to_flat_ms": round(max(flat_ms), 1) if flat else None,
+        "stragglers": stragglers, "results": results,
+    }
+    send_telegram(
+        f"🧹 MASS EXIT ({reason}) {len(targets)}개\n"
+        f"• 전송 {sent_ms:.0f}ms / 확인 {confirm_ms:.0f}ms\n"
+        + ("• FLAT ✅" if flat else f"• 잔여 {len(stragglers)}개 → 리컨실러 재시도: {', '.join(stragglers[:10])}")
+    )
+    return report
+
 # ============================================================================
 # 보조
 # ============================================================================
 def _sweep_full_close(symbol: str, side: str, reason: str, max_retry: int = 5, sleep_s: float = 0.3):
     for _ in range(max_retry):
         p = _get_remote(symbol, side)
-        size = _to_float(p.get("size")) if p else 0.0
+        size = p.size if p else 0.0
         if size <= 0:
             return True
         place_reduce_by_size(symbol, size, side)
         time.sleep(sleep_s)
     p = _get_remote(symbol, side)
-    return (not p) or _to_float(p.get("size")) <= 0
+    return (not p) or p.size <= 0
 
 # ============================================================================
 # 워치독 (손절)
 # ============================================================================
 _HEARTBEAT_SENT_ONCE = False
-_ENTRY_MISS_WARNED = set()
 _last_dbg_ts = 0.0
 _last_sample = {}
 
@@ -546,10 +942,13 @@ def _watchdog_loop():
     global _HEARTBEAT_SENT_ONCE, _last_dbg_ts, _last_sample
     try: send_telegram("🟢 watchdog started (RECON_DEBUG=1이면 디버그/하트비트 출력)")
     except: pass
+    held_h, held_sync_ts = None, 0.0  # 보유 구성 해시(Position.h 조합) — 바뀔 때만 지표 동기화
 
     while True:
         try:
             pos_list = get_open_positions()
+            states = _STATES.cur()
+            tick_ts = time.time()
 
             # 디버그(레이트 리미트)
             if os.getenv("RECON_DEBUG", "0") == "1":
@@ -568,92 +967,75 @@ def _watchdog_loop():
             if RECON_DEBUG and not pos_list:
                 send_telegram("💤 watchdog: open positions = 0")
 
+            held = []  # 로컬 지표 엔진 대상 (symbol, side, entry)
             for p in pos_list:
-                side_raw = (p.get("side") or p.get("holdSide") or p.get("positionSide")
-                            or p.get("openType") or "").strip().lower()
-                if side_raw in ("buy", "long", "open_long"): side = "long"
-                elif side_raw in ("sell", "short", "open_short", "sellshort"): side = "short"
-                else: side = side_raw
-
-                symbol = p.get("symbol")
-                size   = _to_float(p.get("size") or p.get("positionAmt") or 0.0)
-                entry  = _to_float(p.get("entry_price") or p.get("avgPrice") or p.get("openAvgPrice")
-                                   or p.get("holdAvgPrice") or p.get("openPrice") or p.get("avgEntryPrice") or 0.0)
-
-                if not symbol or side not in ("long", "short") or size <= 0:
-                    continue
+                # 파서가 사이드/수량/평단을 정규화·float 변환해 둠(size>0, side=long|short 보장)
+                symbol, side, size, entry = p.symbol, p.side, p.size, p.entry_price
 
-                key = _key(symbol, side)
+                rec = states.ensure(symbol, side)
+                rec.touch(tick_ts)
 
-                # entry=0 보정 시도
+                # entry=0 보정 시도(로컬 진입가)
+                if entry <= 0 and rec.open:
+                    entry = rec.entry_price
                 if entry <= 0:
-                    with _POS_LOCK:
-                        entry_local = _to_float(position_data.get(key, {}).get("entry_price"))
-                    if entry_local > 0:
-                        entry = entry_local
-                    if entry <= 0:
-                        entry = _to_float(p.get("avgOpenPrice") or p.get("averageOpenPrice")
-                                          or p.get("avgEntryPrice") or p.get("openPrice") or 0.0)
-                if entry <= 0:
-                    if RECON_DEBUG and key not in _ENTRY_MISS_WARNED:
-                        _ENTRY_MISS_WARNED.add(key)
+                    if RECON_DEBUG and not rec.miss_warned:
+                        rec.miss_warned = True
                         send_telegram(f"⚠️ skip {symbol} {side}: entry<=0 raw={p}")
                     continue
                 else:
-                    _ENTRY_MISS_WARNED.discard(key)
+                    rec.miss_warned = False
+                held.append((symbol, side, entry))
 
                 last = _to_float(get_last_price(symbol))
                 if not last:
                     if RECON_DEBUG: send_telegram(f"❗ last price fail {symbol}")
                     continue
 
+                lev_env = _env_float("DEFAULT_LEVERAGE", _env_float("LEVERAGE", LEVERAGE))
+                roe_val = _calc_roe_from_exchange_fields(p, entry, last, side, lev_env)
+
                 # ── ROE STOP (보강)
                 if _env_bool("STOP_USE_ROE", STOP_USE_ROE):
-                    lev_env   = _env_float("DEFAULT_LEVERAGE", _env_float("LEVERAGE", LEVERAGE))
-                    roe_val   = _calc_roe_from_exchange_fields(p, entry, last, side, lev_env)
                     thr       = _env_float("STOP_ROE_LONG", STOP_ROE_LONG) if side == "long" \
                                 else _env_float("STOP_ROE_SHORT", STOP_ROE_SHORT)
 
                     # [변경] ROE 디버그 — 재가동 후 종목/사이드당 1회만 전송(스팸 방지)
                     should_dbg = True
                     if ROE_DBG_ONCE:
-                        should_dbg = not _ROE_DBG_SENT.get(key, False)
+                        should_dbg = not rec.roe_dbg_sent
                     if should_dbg and (roe_val <= (thr + abs(thr) * (ROE_LOG_SLACK_PCT/100.0)) or RECON_DEBUG):
-                        lev_disp  = _to_float(p.get("leverage") or p.get("marginLeverage") or lev_env)
+                        lev_disp  = p.leverage or lev_env
                         try:
                             send_telegram(f"🧪 ROE dbg {symbol} {side} ROE={roe_val:.2f}% thr={thr:.2f}% lev={lev_disp}x")
                         except: pass
-                        _ROE_DBG_SENT[key] = True  # 1회 전송 표시
+                        rec.roe_dbg_sent = True  # 1회 전송 표시
 
                     now = time.time()
-                    last_ok = _last_roe_close_ts.get(key, 0.0)
+                    last_ok = rec.roe_close_ts
                     cool    = _env_float("STOP_ROE_COOLDOWN", STOP_ROE_COOLDOWN)
 
                     if roe_val <= thr and (now - last_ok) >= cool:
                         send_telegram(f"⛔ ROE STOP {side.upper()} {symbol} (ROE {roe_val:.2f}% ≤ {thr:.2f}%)")
                         close_position(symbol, side=side, reason="roeStop")
                         # 트레일 상태도 정리
-                        with _TRAIL_LOCK:
-                            _SHORT_TRAIL.pop(key, None)
+                        rec.trail_armed = rec.trail_peak = 0.0
                         continue
 
                 # [추가] SHORT TRAIL: 숏에서 +ARM% 돌파 후 -EXIT% 도달 시 종료
                 if side == "short" and SHORT_TRAIL_ENABLE:
-                    roe_val = _calc_roe_from_exchange_fields(
-                        p, entry, last, side, _env_float("DEFAULT_LEVERAGE", _env_float("LEVERAGE", LEVERAGE))
-                    )
-                    with _TRAIL_LOCK:
-                        st = _SHORT_TRAIL.get(key) or {"armed": 0.0, "peak": 0.0}
-                        if roe_val > st.get("peak", 0.0):
-                            st["peak"] = roe_val
+                    with rec.lock:
+                        if roe_val > rec.trail_peak:
+                            rec.trail_peak = roe_val
                         # ARM 달성
-                        if st.get("armed", 0.0) == 0.0 and roe_val >= SHORT_TRAIL_ARM_PCT:
-                            st["armed"] = time.time()
-                            try:
-                                send_telegram(f"🧷 SHORT TRAIL ARMED {symbol} (ROE {roe_val:.2f}% ≥ {SHORT_TRAIL_ARM_PCT:.2f}%)")
-                            except: pass
-                        _SHORT_TRAIL[key] = st
-                        armed = st.get("armed", 0.0) > 0.0
+                        just_armed = rec.trail_armed == 0.0 and roe_val >= SHORT_TRAIL_ARM_PCT
+                        if just_armed:
+                            rec.trail_armed = time.time()
+                        armed = rec.trail_armed > 0.0
+                    if just_armed:
+                        try:
+                            send_telegram(f"🧷 SHORT TRAIL ARMED {symbol} (ROE {roe_val:.2f}% ≥ {SHORT_TRAIL_ARM_PCT:.2f}%)")
+                        except: pass
                     if armed and roe_val <= SHORT_TRAIL_EXIT_PCT:
                         try:
                             send_telegram(
@@ -661,15 +1043,14 @@ def _watchdog_loop():
                             )
                         except: pass
                         close_position(symbol, side=side, reason="shortTrail")
-                        with _TRAIL_LOCK:
-                            _SHORT_TRAIL.pop(key, None)
+                        rec.trail_armed = rec.trail_peak = 0.0
                         continue
 
                 # 가격 기반 STOP
                 adverse      = _adverse_move_ratio(entry, last, side)
                 px_threshold = PX_STOP_DROP_LONG if side == "long" else PX_STOP_DROP_SHORT
                 if adverse >= px_threshold:
-                    if _should_fire_stop(key):
+                    if _should_fire_stop(rec):
                         send_telegram(
                             f"⛔ PRICE STOP {side.upper()} {symbol} "
                             f"(adverse {adverse*100:.2f}% ≥ {px_threshold*100:.2f}%)"
@@ -680,10 +1061,27 @@ def _watchdog_loop():
                 # 마진 기반 STOP (백업)
                 loss_ratio = _loss_ratio_on_margin(entry, last, size, side, leverage=_env_float("LEVERAGE", LEVERAGE))
                 if loss_ratio >= STOP_PCT:
-                    if _should_fire_stop(key):
+                    if _should_fire_stop(rec):
                         send_telegram(f"⛔ MARGIN STOP {symbol} {side.upper()} (loss/margin ≥ {int(STOP_PCT*100)}%)")
                         close_position(symbol, side=side, reason="emergencyStop")
 
+            h = hash(tuple(p.h for p in pos_list))
+            if h != held_h:
+                # 보유 심볼 로컬 호가창 구독 갱신(계정별)
+                orderbook.set_held([p.symbol for p in pos_list], current_account_name())
+            try:
+                # 같은 전략이므로 로컬 지표는 기본 계정 보유분 기준(신호는 main 에서 전 계정으로 팬아웃)
+                if current_account_name() == account_names()[0] and \
+                        (h != held_h or tick_ts - held_sync_ts >= INDICATOR_RESYNC_SEC):
+                    held_sync_ts = tick_ts
+                    indicators.sync_held(held)
+            except Exception as e:
+                print("indicator sync error:", e)
+            held_h = h
+
+            # 닫힌 지 오래된 상태 레코드 정리(내부에서 주기 제한)
+            states.sweep(tick_ts)
+
             # 하트비트는 재가동 직후 1회
             if os.getenv("RECON_DEBUG", "0") == "1" and not _HEARTBEAT_SENT_ONCE:
                 try: send_telegram("💓 watchdog heartbeat")
@@ -705,17 +1103,13 @@ def _breakeven_watchdog():
     while True:
         try:
             for p in get_open_positions():
-                symbol = p.get("symbol")
-                side   = (p.get("side") or p.get("holdSide") or p.get("positionSide") or "").lower()
-                entry  = _to_float(p.get("entry_price"))
-                size   = _to_float(p.get("size"))
-                if not symbol or side not in ("long", "short") or entry <= 0 or size <= 0:
+                symbol, side = p.symbol, p.side
+                if p.entry_price <= 0:
                     continue
-                key = _key(symbol, side)
-                with _POS_LOCK:
-                    st = position_data.get(key, {}) or {}
-                    be_armed = bool(st.get("be_armed"))
-                    be_entry = _to_float(st.get("be_entry"))
+                rec = _st_get(symbol, side)
+                if rec is None or not rec.open: continue
+                with rec.lock:
+                    be_armed, be_entry = rec.be_armed, rec.be_entry
                 if not (be_armed and be_entry > 0): continue
                 last = _to_float(get_last_price(symbol))
                 if not last: continue
@@ -728,126 +1122,222 @@ def _breakeven_watchdog():
             print("breakeven watchdog error:", e)
         time.sleep(0.8)
 
+def _retry_entry(pkey: str, item: dict, positions: List[Position]):
+    sym, side = item["symbol"], item["side"]
+    rec = _st(sym, side)
+    if _local_has_any(sym) or _get_remote_any_side(sym, positions) or _recent_ok(rec):
+        _mark_done("entry", pkey, "(exists/recent)"); return
+    if _is_busy(rec): return
+    if not _strict_try_reserve(side, positions):
+        if TRACE_LOG:
+            st = capacity_status()
+            send_telegram(f"⏸️ retry_hold STRICT {sym} {side} {st['last_count']}/{MAX_OPEN_POSITIONS}")
+        return
+    try:
+        if not can_enter_now(side): return
+        with rec.op:
+            now = time.time()
+            _set_busy(rec)
+            amt, lev = item["amount"], item["leverage"]
+            if RECON_DEBUG or TRACE_LOG:
+                send_telegram(f"🔁 retry_entry {sym} {side} attempt={item.get('attempts', 0) + 1}")
+            resp = place_market_order(sym, amt, side=("buy" if side == "long" else "sell"),
+                                      leverage=lev, reduce_only=False)
+            item["last_try"] = now
+            item["attempts"] = item.get("attempts", 0) + 1
+            code = str(resp.get("code", "")) if isinstance(resp, dict) else ""
+            if code == "00000":
+                _mark_done("entry", pkey)
+                _open_local(rec, amt, _to_float(get_last_price(sym)) or 0.0, time.time())
+                _mark_recent_ok(rec)
+                send_telegram(f"🔁 ENTRY 재시도 성공 {side.upper()} {sym}")
+            elif code.startswith("LOCAL_MIN_QTY") or code.startswith("LOCAL_BAD_QTY"):
+                _mark_done("entry", pkey, "(minQty/badQty)")
+                send_telegram(f"⛔ ENTRY 재시도 스킵 {sym} {side} → {resp}")
+    finally:
+        _clear_busy(rec); _strict_release(side)
+
+def _retry_close(pkey: str, item: dict, positions: List[Position]):
+    sym, side = item["symbol"], item["side"]
+    p = _get_remote(sym, side, positions) or _get_remote_any_side(sym, positions)
+    if not p or p.size <= 0:
+        _mark_done("close", pkey, "(no-remote)")
+        _close_local(_st_get(sym, side))
+        return
+    with _st(sym, side).op:
+        if RECON_DEBUG: send_telegram(f"🔁 retry [close] {pkey}")
+        size = p.size
+        side_real = p.side
+        resp = place_reduce_by_size(sym, size, side_real)
+        item["last_try"] = time.time()
+        item["attempts"] = item.get("attempts", 0) + 1
+        if str(resp.get("code", "")) == "00000":
+            ok = _sweep_full_close(sym, side_real, "reconcile")
+            if ok:
+                _mark_done("close", pkey)
+                _close_local(_st_get(sym, side_real))
+                send_telegram(f"🔁 CLOSE 재시도 성공 {side_real.upper()} {sym}")
+
+def _retry_tp(pkey: str, item: dict, positions: List[Position]):
+    sym, side = item["symbol"], item["side"]
+    p = _get_remote(sym, side, positions)
+    if not p or p.size <= 0:
+        _mark_done("tp", pkey, "(no-remote)"); return
+    cur_size  = p.size
+    init_size = _to_float(item.get("init_size") or cur_size)
+    cut_size  = _to_float(item.get("cut_size") or cur_size)
+    size_step = _to_float(item.get("size_step", 0.001))
+    achieved  = max(0.0, init_size - cur_size)
+    eps = max(size_step * 2.0, init_size * TP_EPSILON_RATIO)
+    if achieved + eps >= cut_size:
+        _mark_done("tp", pkey); return
+    remain = round_down_step(cut_size - achieved, size_step)
+    if remain <= 0:
+        _mark_done("tp", pkey); return
+    with _st(sym, side).op:
+        if RECON_DEBUG: send_telegram(f"🔁 retry [tp3] {pkey} remain≈{remain}")
+        resp = place_reduce_by_size(sym, remain, side)
+        item["last_try"] = time.time()
+        item["attempts"] = item.get("attempts", 0) + 1
+        if str(resp.get("code", "")) == "00000":
+            send_telegram(f"🔁 TP3 재시도 감축 {side.upper()} {sym} remain≈{remain}")
+
+_RETRY_HANDLERS = {"entry": _retry_entry, "close": _retry_close, "tp": _retry_tp}
+
+def _pop_due_retries() -> List[tuple]:
+    """가장 이른 due 까지 대기 후, 만기 항목만 꺼냄 (전체 스캔 없음)"""
+    rt = _RETRY.cur(); heap, cv = rt["heap"], rt["cv"]
+    with cv:
+        while True:
+            now = time.time()
+            if heap and heap[0][0] <= now:
+                break
+            cv.wait((heap[0][0] - now) if heap else None)
+        due = []
+        while heap and heap[0][0] <= now:
+            d, _, typ, pkey = heapq.heappop(heap)
+            item = _PENDING.get(typ, {}).get(pkey)
+            if item is None or item.get("due") != d:
+                continue  # 완료됐거나 다시 예약된 항목
+            due.append((typ, pkey, item))
+        return due
+
 def _reconciler_loop():
     try: send_telegram("🟢 reconciler started")
     except: pass
     while True:
-        time.sleep(RECON_INTERVAL_SEC)
+        due = _pop_due_retries()
+        if not due:
+            continue
         try:
-            # ENTRY 재시도
-            with _PENDING_LOCK:
-                entry_items = list(_PENDING["entry"].items())
-            for pkey, item in entry_items:
-                sym, side = item["symbol"], item["side"]
-                key = _key(sym, side)
-                if _local_has_any(sym) or _get_remote_any_side(sym) or _recent_ok(key):
-                    _mark_done("entry", pkey, "(exists/recent)"); continue
-                if _is_busy(key): continue
-                if not _strict_try_reserve(side):
-                    if TRACE_LOG:
-                        st = capacity_status()
-                        send_telegram(f"⏸️ retry_hold STRICT {sym} {side} {st['last_count']}/{MAX_OPEN_POSITIONS}")
-                    continue
-                try:
-                    if not can_enter_now(side): continue
-                    with _lock_for(key):
-                        now = time.time()
-                        if now - item.get("last_try", 0.0) < RECON_INTERVAL_SEC - 1: continue
-                        _set_busy(key)
-                        amt, lev = item["amount"], item["leverage"]
-                        if RECON_DEBUG or TRACE_LOG:
-                            send_telegram(f"🔁 retry_entry {sym} {side} attempt={item.get('attempts', 0) + 1}")
-                        resp = place_market_order(sym, amt, side=("buy" if side == "long" else "sell"),
-                                                  leverage=lev, reduce_only=False)
-                        item["last_try"] = now
-                        item["attempts"] = item.get("attempts", 0) + 1
-                        code = str(resp.get("code", "")) if isinstance(resp, dict) else ""
-                        if code == "00000":
-                            _mark_done("entry", pkey)
-                            with _POS_LOCK:
-                                position_data[key] = {"symbol": sym, "side": side, "entry_usd": amt,
-                                                      "ts": time.time(), "entry_price": _to_float(get_last_price(sym)) or 0.0}
-                            _mark_recent_ok(key)
-                            # 숏 트레일 초기화
-                            if side == "short":
-                                with _TRAIL_LOCK:
-                                    _SHORT_TRAIL[key] = {"armed": 0.0, "peak": 0.0}
-                            send_telegram(f"🔁 ENTRY 재시도 성공 {side.upper()} {sym}")
-                        elif code.startswith("LOCAL_MIN_QTY") or code.startswith("LOCAL_BAD_QTY"):
-                            _mark_done("entry", pkey, "(minQty/badQty)")
-                            send_telegram(f"⛔ ENTRY 재시도 스킵 {sym} {side} → {resp}")
-                finally:
-                    _clear_busy(key); _strict_release(side)
-
-            # CLOSE 재시도
-            with _PENDING_LOCK:
-                close_items = list(_PENDING["close"].items())
-            for pkey, item in close_items:
-                sym, side = item["symbol"], item["side"]
-                key = _key(sym, side)
-                p = _get_remote(sym, side) or _get_remote_any_side(sym)
-                if not p or _to_float(p.get("size")) <= 0:
-                    _mark_done("close", pkey, "(no-remote)")
-                    with _POS_LOCK: position_data.pop(key, None)
-                    # 트레일 정리
-                    with _TRAIL_LOCK:
-                        _SHORT_TRAIL.pop(key, None)
-                    continue
-                with _lock_for(key):
-                    now = time.time()
-                    if now - item.get("last_try", 0.0) < RECON_INTERVAL_SEC - 1: continue
-                    if RECON_DEBUG: send_telegram(f"🔁 retry [close] {pkey}")
-                    size = _to_float(p.get("size"))
-                    side_real = (p.get("side") or p.get("holdSide") or p.get("positionSide") or "").lower()
-                    resp = place_reduce_by_size(sym, size, side_real)
-                    item["last_try"] = now
-                    item["attempts"] = item.get("attempts", 0) + 1
-                    if str(resp.get("code", "")) == "00000":
-                        ok = _sweep_full_close(sym, side_real, "reconcile")
-                        if ok:
-                            _mark_done("close", pkey)
-                            with _POS_LOCK: position_data.pop(_key(sym, side_real), None)
-                            with _TRAIL_LOCK: _SHORT_TRAIL.pop(_key(sym, side_real), None)
-                            send_telegram(f"🔁 CLOSE 재시도 성공 {side_real.upper()} {sym}")
-
-            # TP3 재시도 (유지)
+            positions = fetch_open_positions()  # 사이클당 1회 스냅샷 공유
+            if positions is None:
+                raise RuntimeError("positions fetch failed")
+        except Exception as e:
+            print("reconciler snapshot error:", e)
+            for typ, pkey, _ in due:
+                _schedule_retry(typ, pkey)
+            continue
+        for typ, pkey, item in due:
+            try:
+                _RETRY_HANDLERS[typ](pkey, item, positions)
+            except Exception as e:
+                print("reconciler error:", typ, pkey, e)
             with _PENDING_LOCK:
-                tp_items = list(_PENDING["tp"].items())
-            for pkey, item in tp_items:
-                sym, side = item["symbol"], item["side"]
-                key = _key(sym, side)
-                p = _get_remote(sym, side)
-                if not p or _to_float(p.get("size")) <= 0:
-                    _mark_done("tp", pkey, "(no-remote)"); continue
-                cur_size  = _to_float(p.get("size"))
-                init_size = _to_float(item.get("init_size") or cur_size)
-                cut_size  = _to_float(item.get("cut_size") or cur_size)
-                size_step = _to_float(item.get("size_step", 0.001))
-                achieved  = max(0.0, init_size - cur_size)
-                eps = max(size_step * 2.0, init_size * TP_EPSILON_RATIO)
-                if achieved + eps >= cut_size:
-                    _mark_done("tp", pkey); continue
-                remain = round_down_step(cut_size - achieved, size_step)
-                if remain <= 0:
-                    _mark_done("tp", pkey); continue
-                with _lock_for(key):
-                    now = time.time()
-                    if now - item.get("last_try", 0.0) < RECON_INTERVAL_SEC - 1: continue
-                    if RECON_DEBUG: send_telegram(f"🔁 retry [tp3] {pkey} remain≈{remain}")
-                    resp = place_reduce_by_size(sym, remain, side)
-                    item["last_try"] = now
-                    item["attempts"] = item.get("attempts", 0) + 1
-                    if str(resp.get("code", "")) == "00000":
-                        send_telegram(f"🔁 TP3 재시도 감축 {side.upper()} {sym} remain≈{remain}")
+                if _PENDING.get(typ, {}).get(pkey) is not item:
+                    continue  # 완료 또는 새 항목으로 교체(교체 시 이미 예약됨)
+                if item.get("attempts", 0) >= RECON_MAX_ATTEMPTS:
+                    _PENDING[typ].pop(pkey, None)
+                    gave_up = True
+                else:
+                    _schedule_retry(typ, pkey)
+                    gave_up = False
+            if gave_up:
+                send_telegram(f"⛔ 재시도 중단 [{typ}] {pkey} (attempts={item.get('attempts')})")
+
+# ============================================================================
+# 스냅샷 diff 리컨실
+# ============================================================================
+DRIFT = AccountLocal(lambda n: DriftTracker(f"futures:{n}"))
+
+def _remote_index(positions: List[Position]) -> Dict[str, Position]:
+    return {_key(p.symbol, p.side): p for p in positions or []}
+
+def reconcile_positions(positions: Optional[List[Position]] = None) -> List[dict]:
+    """
+    로컬 포지션 상태 전체를 거래소 스냅샷 1회와 비교해 add/remove/resize 를 한 번에 반영. 적용된 이벤트 반환
+    스냅샷 조회 실패 시 이번 사이클은 건너뜀(실패를 '보유 없음'으로 보고 로컬 테이블을 지우지 않도록)
+    """
+    t0 = time.time()
+    if positions is None:
+        positions = get_positions_snapshot(RECON_DIFF_MAX_AGE)
+        if positions is None:
+            DRIFT.cur().record_error()
+            return []
+    remote = _remote_index(positions)
+    with _PENDING_LOCK:
+        closing = {k[:-len(":close")] for k in _PENDING["close"]}
+    states = _STATES.cur()
+    recs = {r.key: r for r in states.open_records()}
+    local = {k: (r.size or None) for k, r in recs.items()}
+    events = diff_tables(local, {k: p.size for k, p in remote.items()}, RECON_DIFF_TOL)
+    applied: List[dict] = []
+    skipped = 0
+    now = time.time()
+    for ev in events:
+        k = ev["key"]; kind = ev["kind"]
+        sym, side = k.rsplit("_", 1)
+        if kind == "add":
+            rec = states.ensure(sym, side)
+            if k in closing or _is_busy(rec):
+                skipped += 1; continue
+            p = remote[k]
+            entry, size = p.entry_price, p.size
+            with rec.lock:
+                if rec.open:   # 그 사이 진입 완료
+                    skipped += 1; continue
+                _open_local(rec, entry * size, entry, now, size=size, seeded=True)
+        elif kind == "remove":
+            rec = recs[k]
+            if _is_busy(rec) or _recent_ok(rec) or now - rec.ts < RECON_DIFF_GRACE_SEC + RECON_DIFF_MAX_AGE:
+                skipped += 1; continue
+            _close_local(rec, now)
+        else:
+            p, rec = remote[k], recs[k]
+            with rec.lock:
+                rec.size = p.size
+                if p.entry_price > 0:
+                    rec.entry_price = p.entry_price
+        applied.append(dict(ev, symbol=sym, side=side))
+    # 수량 미상 로컬 항목은 조용히 채움(드리프트 아님)
+    for k, l in local.items():
+        if l is None and k in remote:
+            recs[k].size = remote[k].size
+    DRIFT.cur().record(applied, skipped, len(local), len(remote), (time.time() - t0) * 1000.0)
+    return applied
+
+def get_drift_stats() -> dict:
+    return DRIFT.cur().snapshot()
+
+def _drift_loop():
+    while True:
+        time.sleep(RECON_DIFF_SEC)
+        try:
+            applied = reconcile_positions()
+            structural = [ev for ev in applied if ev["kind"] != "resize"]
+            if structural:
+                send_telegram("🧭 drift " + ", ".join(f"{ev['kind']} {ev['symbol']} {ev['side']}" for ev in structural[:10])
+                              + (f" (+{len(structural) - 10})" if len(structural) > 10 else ""))
         except Exception as e:
-            print("reconciler error:", e)
+            DRIFT.cur().record_error()
+            print("drift reconcile error:", e)
 
 # STRICT 예약 — 숏만 대상
-_RESERVE = {"short": 0}
+_RESERVE = AccountLocal(lambda n: {"short": 0})
 _RES_LOCK = threading.Lock()
-def _strict_try_reserve(side: str) -> bool:
+def _strict_try_reserve(side: str, positions: Optional[List[Position]] = None) -> bool:
     if side == "long" and LONG_BYPASS_CAP: return True
-    total = _total_open_positions_now()
+    total = _total_open_positions_now(positions)
     with _RES_LOCK:
         effective = total + _RESERVE["short"]
         if effective >= MAX_OPEN_POSITIONS: return False
@@ -860,11 +1350,16 @@ def _strict_release(side: str):
 # ============================================================================
 # 외부 호출
 # ============================================================================
+# 백그라운드 루프는 호출 시점의 계정으로 고정해 띄운다(main 이 계정마다 use_account 로 호출)
 def start_watchdogs():
-    threading.Thread(target=_watchdog_loop, name="emergency-stop-watchdog", daemon=True).start()
+    acct = current_account_name()
+    threading.Thread(target=bind_account(_watchdog_loop), name=f"emergency-stop-watchdog-{acct}", daemon=True).start()
     if BE_ENABLE:
-        threading.Thread(target=_breakeven_watchdog, name="breakeven-watchdog", daemon=True).start()
+        threading.Thread(target=bind_account(_breakeven_watchdog), name=f"breakeven-watchdog-{acct}", daemon=True).start()
     start_capacity_guard()
 
 def start_reconciler():
-    threading.Thread(target=_reconciler_loop, name="reconciler", daemon=True).start()
+    acct = current_account_name()
+    threading.Thread(target=bind_account(_reconciler_loop), name=f"reconciler-{acct}", daemon=True).start()
+    if RECON_DIFF_ENABLE:
+        threading.Thread(target=bind_account(_drift_loop), name=f"drift-reconciler-{acct}", daemon=True).start()
@@ -2,7 +2,8 @@
 import os
 import time
 import threading
-from typing import Dict, Optional
+from collections import deque
+from typing import Any, Dict, Optional
 
 from bitget_api_spot import (
     convert_symbol,
@@ -12,7 +13,14 @@ from bitget_api_spot import (
     get_symbol_spec_spot,
     round_down_step,
     get_last_price_spot,
+    get_all_tickers_spot,
+    get_spot_balances,
+    get_order_fill_spot,
+    order_id_of,
+    apply_fill_balance,
 )
+from reconcile import diff_tables, DriftTracker
+from pos_state import PosRecord, StateTable
 
 # Telegram
 try:
@@ -33,7 +41,7 @@ TP3_PCT = float(os.getenv("TP3_PCT", "0.30"))
 MAX_OPEN_COINS = int(os.getenv("MAX_OPEN_COINS", "60"))
 CAP_CHECK_SEC  = float(os.getenv("CAP_CHECK_SEC", "10"))
 
-# 잔고 fresh 재시도
+# 잔고 fresh 재시도 (체결 정보를 못 받았을 때만 쓰는 폴백)
 BALANCE_RETRY       = int(os.getenv("BALANCE_RETRY", "10"))
 BALANCE_RETRY_DELAY = float(os.getenv("BALANCE_RETRY_DELAY", "2"))
 
@@ -45,38 +53,50 @@ AUTO_SL_PCT       = _auto_sl_pct_env if _auto_sl_pct_env < 0 else -abs(_auto_sl_
 AUTO_SL_POLL_SEC  = float(os.getenv("AUTO_SL_POLL_SEC", "3"))   # 가격 폴링 주기
 AUTO_SL_GRACE_SEC = float(os.getenv("AUTO_SL_GRACE_SEC", "5"))  # 진입 직후 유예
 
+# 잔고 스냅샷 diff 리컨실
+RECON_DIFF_ENABLE    = os.getenv("RECON_DIFF_ENABLE", "1") == "1"
+RECON_DIFF_SEC       = float(os.getenv("RECON_DIFF_SEC", "30"))
+RECON_DIFF_GRACE_SEC = float(os.getenv("RECON_DIFF_GRACE_SEC", "10"))
+RECON_DIFF_TOL       = float(os.getenv("RECON_DIFF_TOL", "0.01"))
+
 # --------------------- State / Locks ---------------------
-_POS_LOCK = threading.RLock()
+# 코인별 상태 레코드 1개(보유 캐시 + 평단 + autoSL 무장). 보유 수량 > 0 이면 open
+class _SpotState(PosRecord):
+    __slots__ = ("qty", "mark_ts", "entry_px", "entry_qty", "entry_time", "sl_armed")
 
-# 최근 체결/보유 캐시
-held_marks_ts:  Dict[str, float] = {}  # symbol -> last buy ts
-held_marks_qty: Dict[str, float] = {}  # symbol -> cached base qty
+    def __init__(self, symbol: str, side: str, lock):
+        super().__init__(symbol, side, lock)
+        self.qty = self.mark_ts = 0.0          # 캐시된 보유 수량 / 마지막 갱신 시각
+        self.entry_px = self.entry_qty = 0.0   # 평단(USDT) / 마지막 진입 이후 누적 수량
+        self.entry_time = 0.0
+        self.sl_armed = False                  # autoSL 가능 상태(유예후 True)
 
-# 엔트리 기준가(평단) 추정용
-entry_px:   Dict[str, float] = {}       # symbol -> avg entry price (USDT)
-entry_qty:  Dict[str, float] = {}       # symbol -> qty accumulated after last entry
-entry_time: Dict[str, float] = {}       # symbol -> timestamp of last entry
-_sl_armed:  Dict[str, bool]  = {}       # symbol -> autoSL 가능 상태(유예후 True)
+_STATES = StateTable(_SpotState)
 
 # 용량가드
 _CAP = {"blocked": False, "last_count": 0, "ts": 0.0}
 _CAP_LOCK = threading.Lock()
 
+# 최근 체결(주문별 실제 수량/평단)
+_FILL_LOG: deque = deque(maxlen=100)
+
 # 자동 손절 스레드 제어
 _ASL_ON   = False
 _ASL_THRD: Optional[threading.Thread] = None
+_ASL_STATS: Dict[str, Any] = {"sweeps": 0, "last_ms": 0.0, "max_ms": 0.0, "overruns": 0, "held": 0,
+                              "bulk": 0, "fallback": 0, "triggers": 0, "ts": 0.0}
 
 
 # --------------------- Capacity Guard ---------------------
 def _count_open_coins() -> int:
-    with _POS_LOCK:
-        return sum(1 for _, q in held_marks_qty.items() if q > 0)
+    return sum(1 for r in _STATES.records() if r.qty > 0)
 
 def start_capacity_guard():
     def _loop():
         prev_blocked = None
         while True:
             try:
+                _STATES.sweep()  # 닫힌 지 오래된 레코드 정리(내부에서 주기 제한)
                 cnt = _count_open_coins()
                 blocked = cnt >= MAX_OPEN_COINS
                 now = time.time()
@@ -99,19 +119,28 @@ def capacity_status():
 
 
 # --------------------- Cache helpers ---------------------
+def _set_qty(rec: _SpotState, qty: float, now: float):
+    with rec.lock:
+        rec.mark_ts = now
+        rec.qty = max(0.0, float(qty))
+        if rec.qty > 0:
+            rec.opened(now)
+            _STATES.adopt(rec)   # 체결 조회 대기 중 evict 됐으면 다시 등록
+        else:
+            rec.closed(now)
+
 def _cache_qty(symbol: str, qty: float):
-    with _POS_LOCK:
-        held_marks_ts[symbol] = time.time()
-        held_marks_qty[symbol] = max(0.0, float(qty))
+    _set_qty(_STATES.ensure(symbol), qty, time.time())
 
 def _clear_cache(symbol: str):
-    with _POS_LOCK:
-        held_marks_ts.pop(symbol, None)
-        held_marks_qty.pop(symbol, None)
-        entry_px.pop(symbol, None)
-        entry_qty.pop(symbol, None)
-        entry_time.pop(symbol, None)
-        _sl_armed.pop(symbol, None)
+    rec = _STATES.get(symbol)
+    if rec is None:
+        return
+    with rec.lock:
+        rec.qty = rec.mark_ts = 0.0
+        rec.entry_px = rec.entry_qty = rec.entry_time = 0.0
+        rec.sl_armed = False
+        rec.closed(time.time())
 
 def _refresh_free_qty(symbol: str) -> float:
     """fresh 잔고 API를 리트라이로 재조회"""
@@ -126,6 +155,46 @@ def _refresh_free_qty(symbol: str) -> float:
     return float(free)
 
 
+def seed_holdings(held: Dict[str, float]) -> int:
+    """기동 직후 잔고 기준 보유 코인을 캐시에 적재(평단 미상 → autoSL 대상 아님). 추가 건수 반환"""
+    added = 0
+    for sym, qty in (held or {}).items():
+        if qty <= 0:
+            continue
+        rec = _STATES.ensure(sym)
+        with rec.lock:
+            if rec.qty > 0:
+                continue
+            _set_qty(rec, qty, time.time())
+        added += 1
+    return added
+
+
+# --------------------- Fills ---------------------
+def _fill_of(symbol: str, resp: Dict[str, Any], side: str) -> Optional[Dict[str, Any]]:
+    """주문 응답 → 체결 결과(수량/평단). 못 받으면 None (호출부가 잔고로 폴백)"""
+    fill = get_order_fill_spot(symbol, order_id_of(resp))
+    if not fill or fill["qty"] <= 0:
+        return None
+    _FILL_LOG.append(dict(fill, symbol=symbol, side=side, ts=time.time()))
+    apply_fill_balance(symbol, side, fill)
+    return fill
+
+def get_recent_fills(n: int = 30) -> list:
+    return list(_FILL_LOG)[-n:]
+
+def _held_qty(symbol: str) -> float:
+    """로컬 보유 수량(체결 기반). 모르면 잔고 1회 조회로 보충"""
+    rec = _STATES.get(symbol)
+    cached = rec.qty if rec is not None else 0.0
+    if cached > 0:
+        return cached
+    free = float(get_spot_free_qty(symbol, fresh=True))
+    if free > 0:
+        _cache_qty(symbol, free)
+    return free
+
+
 # --------------------- Trading (Entry / Sell / Close) ---------------------
 def enter_spot(symbol: str, usdt_amount: float):
     symbol = convert_symbol(symbol)
@@ -137,42 +206,44 @@ def enter_spot(symbol: str, usdt_amount: float):
     if TRACE_LOG:
         send_telegram(f"[SPOT] ENTRY req {symbol} amt={usdt_amount}")
 
-    # 엔트리 전 free 잔고
-    before = _refresh_free_qty(symbol)
-
+    # 체결 조회 실패 시 증가분 계산 기준(캐시에 없던 기존 보유분까지 포함한 주문 전 잔고)
+    pre_free = float(get_spot_free_qty(symbol))
     resp = place_spot_market_buy(symbol, usdt_amount)
     code = str(resp.get("code", ""))
     if code in ("00000", "0"):
-        # 엔트리 후 free 잔고
-        after = _refresh_free_qty(symbol)
-        _cache_qty(symbol, after)
-
-        # 매수된 수량 추정
-        bought = max(0.0, after - before)
-        px_now = get_last_price_spot(symbol) or 0.0
-        avg_px = 0.0
-        if bought > 0:
-            # 금액/수량으로 평단 추정
-            avg_px = max(0.0, float(usdt_amount) / bought)
-        elif px_now > 0:
-            avg_px = px_now
-
-        with _POS_LOCK:
+        rec = _STATES.ensure(symbol)
+        fill = _fill_of(symbol, resp, "buy")
+        if fill:
+            # 체결 기준: 실제 증가 수량(수수료 차감)과 체결 평단
+            bought, avg_px = fill["net_qty"], fill["avg_px"]
+            with rec.lock:
+                after = rec.qty + bought
+                _set_qty(rec, after, time.time())
+        else:
+            # 체결 조회 실패 시에만 잔고 폴백(금액/현재가로 평단 근사)
+            after = _refresh_free_qty(symbol)
+            with rec.lock:
+                bought = max(0.0, after - pre_free)
+                _set_qty(rec, after, time.time())
+            avg_px = get_last_price_spot(symbol) or 0.0
+
+        with rec.lock:
             # 누적 진입을 고려해 가중평균 업데이트
-            prev_qty = entry_qty.get(symbol, 0.0)
-            prev_px  = entry_px.get(symbol, 0.0)
-            if prev_qty > 0 and avg_px > 0 and bought > 0:
+            prev_qty, prev_px = rec.entry_qty, rec.entry_px
+            if prev_qty > 0 and prev_px > 0 and avg_px > 0 and bought > 0:
                 new_qty = prev_qty + bought
-                entry_px[symbol]  = (prev_px * prev_qty + avg_px * bought) / new_qty
-                entry_qty[symbol] = new_qty
-            else:
-                if avg_px > 0:
-                    entry_px[symbol]  = avg_px
-                    entry_qty[symbol] = bought if bought > 0 else after
-            entry_time[symbol] = time.time()
-            _sl_armed[symbol]  = False  # 유예기간 후 True로 전환
-
-        send_telegram(f"[SPOT] BUY {symbol} approx {usdt_amount} USDT (qty~{bought or after})")
+                rec.entry_px  = (prev_px * prev_qty + avg_px * bought) / new_qty
+                rec.entry_qty = new_qty
+            elif avg_px > 0:
+                rec.entry_px  = avg_px
+                rec.entry_qty = bought if bought > 0 else after
+            rec.entry_time = time.time()
+            rec.sl_armed   = False  # 유예기간 후 True로 전환
+
+        if fill:
+            send_telegram(f"[SPOT] BUY {symbol} {bought:.6g} @ {avg_px:.6g} ({fill['quote']:.2f} USDT)")
+        else:
+            send_telegram(f"[SPOT] BUY {symbol} approx {usdt_amount} USDT (qty~{bought or after})")
     elif code in ("LOCAL_SYMBOL_REMOVED",):
         send_telegram(f"[SPOT] BUY skip (removed) {symbol}")
         _clear_cache(symbol)
@@ -183,13 +254,17 @@ def enter_spot(symbol: str, usdt_amount: float):
 def _sell_pct(symbol: str, pct: float, tag: str):
     symbol = convert_symbol(symbol)
 
-    cached = float(held_marks_qty.get(symbol, 0.0))
-    free   = _refresh_free_qty(symbol)
-
-    base_qty = max(0.0, min(cached if cached > 0 else float("inf"), free))
-    if base_qty <= 0:
+    held = _held_qty(symbol)
+    if held <= 0:
+        send_telegram(f"[SPOT] {tag} skip (no free balance) {symbol}")
+        return
+    # 로컬 수량이 실제 잔고보다 클 수 있음(수동 매도/수수료) → fresh 잔고로 상한
+    free = _refresh_free_qty(symbol)
+    if free <= 0:
+        _clear_cache(symbol)
         send_telegram(f"[SPOT] {tag} skip (no free balance) {symbol}")
         return
+    base_qty = min(held, free)
 
     step = float(get_symbol_spec_spot(symbol).get("qtyStep", 1e-6))
     qty  = round_down_step(base_qty * pct, step)
@@ -199,10 +274,25 @@ def _sell_pct(symbol: str, pct: float, tag: str):
 
     resp = place_spot_market_sell_qty(symbol, qty)
     code = str(resp.get("code", ""))
+    if code not in ("00000", "0", "LOCAL_SYMBOL_REMOVED"):
+        # 주문 사이 잔고가 줄었을 수 있음 → 잔고 1회 확인 후 재시도
+        free = float(get_spot_free_qty(symbol, fresh=True))
+        if 0 < free < base_qty:
+            base_qty = free
+            qty = round_down_step(base_qty * pct, step)
+            if qty > 0:
+                resp = place_spot_market_sell_qty(symbol, qty)
+                code = str(resp.get("code", ""))
     if code in ("00000", "0"):
-        remaining = max(0.0, cached - qty) if cached > 0 else max(0.0, free - qty)
-        _cache_qty(symbol, remaining)
-        send_telegram(f"[SPOT] {tag} {symbol} qty~{qty} ({int(pct*100)}%)")
+        fill = _fill_of(symbol, resp, "sell")
+        sold = fill["qty"] if fill else qty
+        rec = _STATES.ensure(symbol)
+        with rec.lock:
+            _set_qty(rec, base_qty - sold, time.time())
+            if rec.entry_qty > 0:
+                rec.entry_qty = max(0.0, rec.entry_qty - sold)
+        px = f" @ {fill['avg_px']:.6g}" if fill else ""
+        send_telegram(f"[SPOT] {tag} {symbol} qty~{sold:.6g}{px} ({int(pct*100)}%)")
     elif code in ("LOCAL_SYMBOL_REMOVED",):
         send_telegram(f"[SPOT] {tag} skip (removed) {symbol}")
         _clear_cache(symbol)
@@ -225,30 +315,37 @@ def close_spot(symbol: str, reason: str = "manual"):
     """
     symbol = convert_symbol(symbol)
 
-    cached = float(held_marks_qty.get(symbol, 0.0))
-    free   = _refresh_free_qty(symbol)
-    base_qty = max(0.0, max(cached, free))  # 전량 종료는 더 큰 쪽
-
+    base_qty = _held_qty(symbol)
     if base_qty <= 0:
         _clear_cache(symbol)
         send_telegram(f"[SPOT] CLOSE skip (no free balance) {symbol} ({reason})")
         return
 
-    # 청산 전 가격 스냅샷 (시장가이므로 근사치로 표기)
-    exit_px = get_last_price_spot(symbol) or 0.0
-    ent_px  = float(entry_px.get(symbol, 0.0))
-    realized = (exit_px - ent_px) * base_qty if (exit_px > 0 and ent_px > 0) else 0.0
-
     resp = place_spot_market_sell_qty(symbol, base_qty)
     code = str(resp.get("code", ""))
+    if code not in ("00000", "0", "LOCAL_SYMBOL_REMOVED"):
+        # 로컬 수량이 실제 잔고와 어긋났을 수 있음 → 잔고 1회 확인 후 재시도
+        free = float(get_spot_free_qty(symbol, fresh=True))
+        if free > 0 and abs(free - base_qty) > 1e-12:
+            base_qty = free
+            resp = place_spot_market_sell_qty(symbol, base_qty)
+            code = str(resp.get("code", ""))
     if code in ("00000", "0"):
+        fill = _fill_of(symbol, resp, "sell")
+        rec = _STATES.get(symbol)
+        ent_px = rec.entry_px if rec is not None else 0.0
         _clear_cache(symbol)
+        if fill:
+            exit_px, size = fill["avg_px"], fill["qty"]
+        else:
+            exit_px, size = get_last_price_spot(symbol) or 0.0, base_qty
+        realized = (exit_px - ent_px) * size if (exit_px > 0 and ent_px > 0) else 0.0
         # 예쁜 메시지
         lines = [
             f"✅ CLOSE LONG {symbol}",
             f"• Exit: {exit_px:.6g}" if exit_px > 0 else "• Exit: market",
-            f"• Size: {base_qty:.6g}",
-            f"• Realized≈ {realized:.2f} USDT"
+            f"• Size: {size:.6g}",
+            f"• Realized{'' if fill else '≈'} {realized:.2f} USDT"
         ]
         send_telegram("\n".join(lines))
     elif code in ("LOCAL_SYMBOL_REMOVED",):
@@ -258,45 +355,140 @@ def close_spot(symbol: str, reason: str = "manual"):
         send_telegram(f"[SPOT] CLOSE fail {symbol} -> {resp}")
 
 
+# --------------------- Snapshot diff reconcile ---------------------
+DRIFT = DriftTracker("spot")
+_DUST: Dict[str, float] = {}  # symbol -> 먼지로 판정한 수량(수량이 바뀔 때만 재판정)
+
+def _is_dust(symbol: str, qty: float) -> bool:
+    if _DUST.get(symbol) == qty:
+        return True
+    px = get_last_price_spot(symbol) or 0.0
+    if px > 0 and qty * px < float(get_symbol_spec_spot(symbol).get("minQuote", 1.0)):
+        _DUST[symbol] = qty
+        return True
+    _DUST.pop(symbol, None)
+    return False
+
+def reconcile_holdings(balances: Optional[Dict[str, float]] = None) -> list:
+    """로컬 보유 수량 전체를 잔고 스냅샷 1회와 비교해 add/remove/resize 를 한 번에 반영. 적용된 이벤트 반환"""
+    t0 = time.time()
+    if balances is None:
+        balances = get_spot_balances(force=True)
+    remote = {c + "USDT": float(q) for c, q in (balances or {}).items() if c != "USDT" and float(q or 0) > 0}
+    local = {r.symbol: r.qty for r in _STATES.records() if r.mark_ts > 0}
+    # 원격에만 있는 먼지 잔고는 보유로 보지 않음(가격 조회는 락 밖에서)
+    for sym in [k for k in remote if k not in local or local[k] <= 0]:
+        if _is_dust(sym, remote[sym]):
+            remote.pop(sym)
+
+    applied, skipped = [], 0
+    # 가격 조회 사이 변경분 반영 후 diff
+    local = {r.symbol: r.qty for r in _STATES.records() if r.mark_ts > 0}
+    now = time.time()
+    for ev in diff_tables(local, remote, RECON_DIFF_TOL):
+        sym = ev["key"]
+        rec = _STATES.ensure(sym)
+        with rec.lock:
+            if ev["kind"] == "remove":
+                if now - rec.mark_ts < RECON_DIFF_GRACE_SEC:
+                    skipped += 1; continue
+                _clear_cache(sym)
+            elif ev["kind"] == "add":
+                # 평단 미상 → autoSL 대상 아님(seed_holdings 와 동일)
+                _set_qty(rec, remote[sym], now)
+            else:
+                rec.qty = float(remote[sym])
+        applied.append(dict(ev, symbol=sym))
+    DRIFT.record(applied, skipped, len(local), len(remote), (time.time() - t0) * 1000.0)
+    return applied
+
+def get_drift_stats() -> dict:
+    return DRIFT.snapshot()
+
+def start_drift_reconciler():
+    if not RECON_DIFF_ENABLE:
+        return
+    def _loop():
+        while True:
+            time.sleep(RECON_DIFF_SEC)
+            try:
+                applied = reconcile_holdings()
+                structural = [ev for ev in applied if ev["kind"] != "resize"]
+                if structural:
+                    send_telegram("[SPOT] drift " + ", ".join(f"{ev['kind']} {ev['symbol']}" for ev in structural[:10])
+                                  + (f" (+{len(structural) - 10})" if len(structural) > 10 else ""))
+            except Exception as e:
+                DRIFT.record_error()
+                print("[spot] drift reconcile error:", e)
+    threading.Thread(target=_loop, daemon=True, name="spot-drift").start()
+
+
 # --------------------- Auto Stop-Loss thread ---------------------
+def _auto_sl_sweep() -> list:
+    """보유 코인 전체를 전 심볼 티커 1회로 평가. 발동 대상 [(symbol, pnl_pct)] 반환"""
+    now = time.time()
+    cands = []
+    for r in _STATES.open_records():
+        if r.entry_time <= 0 or r.entry_px <= 0:
+            continue
+        # 유예기간
+        if not r.sl_armed:
+            if (now - r.entry_time) < AUTO_SL_GRACE_SEC:
+                continue
+            r.sl_armed = True
+        cands.append((r.symbol, r.entry_px))
+    if not cands:
+        return []
+
+    tick = get_all_tickers_spot()
+    hits, n_bulk, n_fb = [], 0, 0
+    for s, ent_px in cands:
+        px = tick.get(s)
+        if px:
+            n_bulk += 1
+        else:
+            # 벌크 응답에 없을 때만 심볼 단건 조회
+            px = get_last_price_spot(s, retries=1) or 0.0
+            n_fb += 1
+        if px > 0:
+            pnl_pct = (px / ent_px - 1.0) * 100.0
+            if pnl_pct <= AUTO_SL_PCT:
+                hits.append((s, pnl_pct))
+    _ASL_STATS.update(held=len(cands), bulk=n_bulk, fallback=n_fb)
+    return hits
+
+
 def _auto_sl_loop():
     # –3% 이하 떨어지면 즉시 전량 종료
     while _ASL_ON:
+        t0 = time.time()
         try:
-            now = time.time()
-            with _POS_LOCK:
-                symbols = [s for s, q in held_marks_qty.items() if q > 0]
-
-            for s in symbols:
+            hits = _auto_sl_sweep()
+            ms = (time.time() - t0) * 1000.0
+            _ASL_STATS["sweeps"] += 1
+            _ASL_STATS["last_ms"] = round(ms, 1)
+            _ASL_STATS["max_ms"] = max(_ASL_STATS["max_ms"], round(ms, 1))
+            _ASL_STATS["ts"] = t0
+            if ms > AUTO_SL_POLL_SEC * 1000.0:
+                _ASL_STATS["overruns"] += 1
+            for s, pnl_pct in hits:
                 try:
-                    ent_ts = entry_time.get(s, 0.0)
-                    if ent_ts <= 0:
-                        continue
-                    # 유예기간
-                    if not _sl_armed.get(s, False):
-                        if (now - ent_ts) >= AUTO_SL_GRACE_SEC:
-                            _sl_armed[s] = True
-                        else:
-                            continue
-
-                    ent_px = entry_px.get(s, 0.0)
-                    if ent_px <= 0:
-                        continue
-                    px = get_last_price_spot(s) or 0.0
-                    if px <= 0:
-                        continue
-                    pnl_pct = (px / ent_px - 1.0) * 100.0
-                    if pnl_pct <= AUTO_SL_PCT:
-                        # 즉시 전량 종료
-                        send_telegram(f"[SPOT] autoSL trigger {s} pnl≈{pnl_pct:.2f}% (th={AUTO_SL_PCT}%)")
-                        close_spot(s, reason="autoSL")
-                        # close_spot 안에서 캐시가 정리됨
-                except Exception:
-                    pass
-
+                    # 즉시 전량 종료
+                    _ASL_STATS["triggers"] += 1
+                    send_telegram(f"[SPOT] autoSL trigger {s} pnl≈{pnl_pct:.2f}% (th={AUTO_SL_PCT}%)")
+                    close_spot(s, reason="autoSL")
+                    # close_spot 안에서 캐시가 정리됨
+                except Exception as e:
+                    print("[spot] autoSL close error:", s, e)
         except Exception as e:
             print("[spot] autoSL error:", e)
-        time.sleep(max(0.5, AUTO_SL_POLL_SEC))
+        # 주기는 스윕 시작 기준(스윕 시간만큼 늦어지지 않게)
+        time.sleep(max(0.5, AUTO_SL_POLL_SEC - (time.time() - t0)))
+
+
+def get_auto_sl_stats() -> dict:
+    return dict(_ASL_STATS, enabled=AUTO_SL_ENABLE, running=_ASL_ON, threshold_pct=AUTO_SL_PCT,
+                poll_sec=AUTO_SL_POLL_SEC)
 
 
 def start_auto_stoploss():
@@ -315,7 +507,7 @@ def start_auto_stoploss():
 class _CompatPosStore:
     """
     기존 DD 모니터 등이 `pos_store.pos` 를 기대하는 경우가 있어
-    현재 내부 캐시(held_marks_*)를 읽어 같은 인터페이스로 노출한다.
+    현재 내부 상태 레코드를 읽어 같은 인터페이스로 노출한다.
     """
     def __init__(self):
         self.version = 2  # 단순 표기
@@ -323,15 +515,7 @@ class _CompatPosStore:
     @property
     def pos(self) -> Dict[str, Dict[str, float]]:
         # { "SYMBOL": {"qty": <free>, "ts": <last_ts>} } 형태로 제공
-        with _POS_LOCK:
-            keys = set(held_marks_qty.keys()) | set(held_marks_ts.keys())
-            return {
-                s: {
-                    "qty": float(held_marks_qty.get(s, 0.0)),
-                    "ts":  float(held_marks_ts.get(s, 0.0)),
-                }
-                for s in keys
-            }
+        return {r.symbol: {"qty": r.qty, "ts": r.mark_ts} for r in _STATES.records() if r.mark_ts > 0}
 
 # 외부에서 import 하는 이름
 pos_store = _CompatPosStore()